@@ -79,6 +79,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # 事务开始时就获取写锁，并发写入时排队等待，避免读锁升级为写锁时直接报database is locked
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,  # 等待写锁的最长时间(秒)
+        },
     }
 }
 
@@ -131,3 +136,47 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # 用户认证设置
 LOGIN_URL = '/dictation/home/'  # 未登录用户将被重定向到听写首页
 LOGIN_REDIRECT_URL = '/dictation/home/'  # 登录成功后重定向到听写首页
+
+# TTS音频缓存设置
+TTS_CACHE_DIR = BASE_DIR / 'tts_cache'  # 缓存目录
+TTS_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 缓存容量上限(字节)，超出后按LRU淘汰
+TTS_PRERENDER_ON_START = True  # 开始听写时是否在后台预生成整个词书的音频
+TTS_PRERENDER_WORKERS = 4  # 后台预生成线程数
+TTS_BUNDLE_RETRY_SECONDS = 2  # 词书音频包尚未生成完时建议页面多久后重试(秒)
+TTS_OFFLINE_WORKERS = 1  # pyttsx3离线引擎常驻工作进程数
+TTS_OFFLINE_TIMEOUT = 30  # 离线引擎单次生成超时(秒)
+TTS_DAEMON_ADDRESS = None  # 独立合成服务地址，如 str(BASE_DIR / 'tts_daemon.sock')；为None时在Django进程内生成
+TTS_DAEMON_WAIT = 5  # 等待合成服务返回的最长时间(秒)，超时返回202和轮询地址
+TTS_DAEMON_CONCURRENCY = 4  # 合成服务同时调用引擎的数量
+TTS_DAEMON_MAX_QUEUE = 200  # 合成服务排队任务上限，超出返回503
+TTS_ENABLE_FAKE_ENGINE = DEBUG  # 启用模拟引擎(engine='fake')，用于本地压测
+TTS_FAKE_ENGINE_LATENCY = 0.2  # 模拟引擎的生成延迟(秒)
+TTS_ENGINE_FALLBACK = True  # 请求的引擎失败或熔断时按耗时降级到其他引擎，最后使用离线引擎
+TTS_CIRCUIT_FAILURE_THRESHOLD = 3  # 引擎连续失败多少次后熔断
+TTS_CIRCUIT_RESET_SECONDS = 30  # 熔断后多久放行一次探测请求(秒)
+TTS_ENGINES = [  # 注册的TTS引擎类，依赖的第三方库在第一次使用时才导入
+    'tts.engines.EdgeTTSEngine',
+    'tts.engines.GTTSEngine',
+    'tts.engines.Pyttsx3Engine',
+]
+TTS_CHUNK_MIN_CHARS = 60  # 超过该长度的文本按句子拆分后并发生成，每句单独缓存
+TTS_CHUNK_MAX_CHARS = 200  # 拆分后每段的最大长度，超长的句子按分句拆分
+TTS_CHUNK_WORKERS = 4  # 同一文本的分段并发生成数
+TTS_ADMISSION_MAX_CONCURRENT = 8  # 每个进程同时合成音频的请求上限
+TTS_ADMISSION_MAX_WAITING = 32  # 等待合成名额的请求上限，超出直接返回503
+TTS_ADMISSION_WAIT_SECONDS = 3  # 等待合成名额的期限(秒)，预计或实际超过期限返回503
+TTS_ADMISSION_CLIENT_RATE = 2  # 每个客户端每秒可触发的合成次数(缓存命中不计)，超出返回429
+TTS_ADMISSION_CLIENT_BURST = 20  # 每个客户端允许的突发合成次数
+TTS_FAKE_ENGINE_FAILURE_RATE = 0  # 模拟引擎的失败比例(0~1)，按文本哈希确定
+
+# 听写答题记录延迟写入设置
+DICTATION_WRITE_BEHIND = False  # 听写记录、学习记录和用户进度先写入缓冲区和磁盘日志，再批量写入数据库
+DICTATION_WRITE_BEHIND_BATCH_SIZE = 100  # 缓冲区攒够多少条记录后写入数据库
+DICTATION_WRITE_BEHIND_INTERVAL_MS = 200  # 缓冲区最长多久写入一次数据库(毫秒)
+DICTATION_WRITE_BEHIND_JOURNAL_DIR = BASE_DIR / 'answer_journal'  # 磁盘日志目录，进程崩溃后未写入的记录从这里重放
+DICTATION_WRITE_BEHIND_FSYNC = False  # 每条记录写入日志后是否fsync；关闭时能应对进程崩溃，开启后也能应对断电
+DICTATION_PROGRESS_SHARDS = 4  # 每个用户每个单词的进度计数分成几行，并发答题时分散写入
+DICTATION_CHART_MAX_POINTS = 120  # 学习趋势图默认最多返回的点数，历史更长时在服务端降采样
+
+# 学习概要缓存设置
+LEARNING_SUMMARY_CACHE_TIMEOUT = 300  # 学习概要（掌握程度分布、今日待复习、计划单词数）的缓存时间(秒)；多进程部署时CACHES需使用共享缓存（如Redis）才能及时失效
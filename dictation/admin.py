@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import DictationSession, DictationRecord, UserProgress
+from .models import DictationSession, DictationRecord, UserProgress, DailyLearningStat
 
 @admin.register(DictationSession)
 class DictationSessionAdmin(admin.ModelAdmin):
@@ -31,20 +31,23 @@ class DictationRecordAdmin(admin.ModelAdmin):
 
 @admin.register(UserProgress)
 class UserProgressAdmin(admin.ModelAdmin):
-    list_display = ['word', 'total_attempts', 'correct_attempts', 'accuracy_rate', 
-                   'mastery_level', 'last_practiced']
-    list_filter = ['mastery_level', 'last_practiced']
-    search_fields = ['word__word']
+    list_display = ['word', 'user', 'shard', 'total_attempts', 'correct_attempts', 'accuracy_rate',
+                   'last_practiced']
+    list_filter = ['last_practiced', 'user']
+    search_fields = ['word__word', 'user__username']
     readonly_fields = ['accuracy_rate']
     
     fieldsets = (
         ('单词信息', {
-            'fields': ('word',)
+            'fields': ('word', 'user', 'shard')
         }),
         ('练习统计', {
-            'fields': ('total_attempts', 'correct_attempts', 'accuracy_rate')
-        }),
-        ('掌握程度', {
-            'fields': ('mastery_level', 'last_practiced')
+            'fields': ('total_attempts', 'correct_attempts', 'accuracy_rate', 'last_practiced')
         }),
     )
+
+@admin.register(DailyLearningStat)
+class DailyLearningStatAdmin(admin.ModelAdmin):
+    list_display = ['user', 'date', 'attempts', 'correct', 'accuracy_rate', 'total_time']
+    list_filter = ['date', 'user']
+    search_fields = ['user__username']
@@ -0,0 +1,114 @@
+from datetime import date
+
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import DailyLearningStat
+
+# 学习趋势图的数据：按日/周/月汇总每日统计，点数超过上限时在服务端降采样。
+# 单词数量按等长时间段求和，正确率用LTTB保留曲线的起伏，返回的点数与历史长短无关。
+
+CHART_GRANULARITIES = {
+    'day': None,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+CHART_MIN_POINTS = 10
+CHART_MAX_POINTS = 1000
+
+
+def auto_granularity(start, end, max_points):
+    """按时间跨度选择能在max_points个点内显示的最细粒度"""
+    days = (end - start).days + 1
+    if days <= max_points:
+        return 'day'
+    if days / 7 <= max_points:
+        return 'week'
+    return 'month'
+
+
+def load_series(stats, granularity):
+    """按粒度汇总，返回按日期排序的[(日期, 单词数, 正确数)]"""
+    trunc = CHART_GRANULARITIES[granularity]
+    if trunc is None:
+        return list(stats.order_by('date').values_list('date', 'attempts', 'correct'))
+    return list(
+        stats.annotate(period=trunc('date')).values('period').annotate(
+            attempts=Sum('attempts'), correct=Sum('correct')
+        ).order_by('period').values_list('period', 'attempts', 'correct')
+    )
+
+
+def sum_buckets(points, max_points):
+    """把(日期, 数量)按等长的时间段求和，每段用起始日期表示，最多max_points段"""
+    if len(points) <= max_points:
+        return list(points)
+    first = points[0][0].toordinal()
+    width = -(-(points[-1][0].toordinal() - first + 1) // max_points)
+    buckets = {}
+    for day, value in points:
+        key = (day.toordinal() - first) // width
+        buckets[key] = buckets.get(key, 0) + value
+    return [(date.fromordinal(first + key * width), total) for key, total in sorted(buckets.items())]
+
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets降采样，points为按x排序的(x, y)，保留首尾两点"""
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    selected = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        next_bucket = points[next_start:next_end]
+        avg_x = sum(x for x, _ in next_bucket) / len(next_bucket)
+        avg_y = sum(y for _, y in next_bucket) / len(next_bucket)
+
+        # 当前桶中与上一个选中点、下一个桶平均点组成的三角形面积最大的点
+        ax, ay = points[selected]
+        selected = max(
+            range(int(i * every) + 1, int((i + 1) * every) + 1),
+            key=lambda j: abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+        )
+        sampled.append(points[selected])
+    sampled.append(points[-1])
+    return sampled
+
+
+def chart_series(user, granularity='auto', start=None, end=None, max_points=120):
+    """学习趋势图数据：[start, end]内的单词数量和正确率，各自最多max_points个点"""
+    stats = DailyLearningStat.objects.filter(user=user)
+    extent = stats.aggregate(first=Min('date'), last=Max('date'))
+    result = {
+        'first': extent['first'].isoformat() if extent['first'] else None,
+        'last': extent['last'].isoformat() if extent['last'] else None,
+        'granularity': granularity,
+        'total_points': 0,
+        'downsampled': False,
+        'count': [],
+        'accuracy': [],
+    }
+    if extent['first'] is None:
+        return result
+
+    start = max(start or extent['first'], extent['first'])
+    end = min(end or extent['last'], extent['last'])
+    if granularity == 'auto':
+        granularity = auto_granularity(start, end, max_points)
+    result['granularity'] = granularity
+    rows = load_series(stats.filter(date__gte=start, date__lte=end), granularity)
+    result['total_points'] = len(rows)
+    result['downsampled'] = len(rows) > max_points
+
+    counts = sum_buckets([(day, attempts) for day, attempts, _ in rows], max_points)
+    accuracy = lttb([
+        (day.toordinal(), round(correct / attempts * 100, 1) if attempts else 0)
+        for day, attempts, correct in rows
+    ], max_points)
+    result['count'] = [[day.isoformat(), total] for day, total in counts]
+    result['accuracy'] = [[date.fromordinal(x).isoformat(), y] for x, y in accuracy]
+    return result
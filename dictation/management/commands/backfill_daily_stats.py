@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from dictation.models import DailyLearningStat, DictationRecord
+
+
+class Command(BaseCommand):
+    help = '根据已有的听写记录重新生成每日学习统计（会覆盖已有的统计，请在没有用户答题时运行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='只重新生成该用户名的统计')
+
+    def handle(self, *args, **options):
+        records = DictationRecord.objects.filter(session__user__isnull=False)
+        stats = DailyLearningStat.objects.all()
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"用户不存在: {options['user']}")
+            records = records.filter(session__user=user)
+            stats = stats.filter(user=user)
+
+        # 按用户和本地日期汇总
+        rows = records.annotate(
+            date=TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+        ).values('session__user_id', 'date').annotate(
+            attempts=Count('id'),
+            correct=Count('id', filter=Q(is_correct=True)),
+            total_time=Sum('time_taken')
+        ).order_by()
+
+        with transaction.atomic():
+            stats.delete()
+            created = DailyLearningStat.objects.bulk_create([
+                DailyLearningStat(
+                    user_id=row['session__user_id'],
+                    date=row['date'],
+                    attempts=row['attempts'],
+                    correct=row['correct'],
+                    total_time=row['total_time'] or 0,
+                )
+                for row in rows
+            ], batch_size=500)
+
+        self.stdout.write(f'已生成{len(created)}条每日学习统计')
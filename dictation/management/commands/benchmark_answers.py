@@ -0,0 +1,140 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from dictation.models import DictationSession, DictationRecord
+from dictation.services import record_answer
+from dictation.writebehind import get_answer_buffer, shutdown_answer_buffer
+from vocabulary.models import Word, WordList, WordListWord
+
+
+def create_fixtures(clients, word_count):
+    """创建压测用的词书、用户和听写会话，返回(单词列表, [(会话, 用户)])"""
+    word_list = WordList.objects.create(name='压测词书')
+    words = Word.objects.bulk_create([
+        Word(word=f'word{i}', translation=f'单词{i}') for i in range(word_count)
+    ])
+    WordListWord.objects.bulk_create([
+        WordListWord(word_list=word_list, word=word, order=i) for i, word in enumerate(words)
+    ])
+    sessions = []
+    for i in range(clients):
+        user = User.objects.create_user(f'bench{i}-{time.monotonic_ns()}')
+        session = DictationSession.objects.create(
+            word_list=word_list, user=user, session_name=f'压测{i}', total_words=len(words)
+        )
+        session.build_queue([word.id for word in words])
+        sessions.append((session, user))
+    return words, sessions
+
+
+def run_clients(sessions, words, answers, seed):
+    """每个会话一个线程并发提交答案，返回(耗时秒, 成功数, 失败数)"""
+    counters = {'ok': 0, 'errors': 0}
+    counters_lock = threading.Lock()
+    per_client = answers // len(sessions)
+
+    def client(index, session, user):
+        rng = random.Random(seed + index)
+        ok = errors = 0
+        try:
+            for i in range(per_client):
+                word = words[i % len(words)]
+                answer = word.word if rng.random() < 0.7 else word.word + 'x'
+                try:
+                    record_answer(session, word, answer, rng.randint(1, 10), user)
+                    ok += 1
+                except Exception:
+                    errors += 1
+                    # 开始事务失败后连接状态不确定，换一个新连接
+                    connection.close()
+        finally:
+            connections.close_all()
+            with counters_lock:
+                counters['ok'] += ok
+                counters['errors'] += errors
+
+    threads = [
+        threading.Thread(target=client, args=(index, session, user))
+        for index, (session, user) in enumerate(sessions)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, counters['ok'], counters['errors']
+
+
+class Command(BaseCommand):
+    help = '在临时数据库中对比同步写入和延迟写入两种模式下每秒可记录的听写答案数(JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--answers', type=int, default=2000, help='每种模式提交的答案总数')
+        parser.add_argument('--clients', type=int, default=8, help='并发提交的会话数')
+        parser.add_argument('--words', type=int, default=50, help='词书中的单词数')
+        parser.add_argument('--batch-size', type=int, default=100, help='延迟写入的批量大小')
+        parser.add_argument('--interval-ms', type=int, default=200, help='延迟写入的最长间隔(毫秒)')
+        parser.add_argument('--fsync', action='store_true', help='延迟写入日志时每条记录都fsync')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory(prefix='answer-bench-') as temp_dir:
+            # 使用临时的SQLite文件，不影响正式数据库；多个线程共享同一个文件才能体现写锁竞争
+            connection.settings_dict['TEST']['NAME'] = os.path.join(temp_dir, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                result = self.run(options, temp_dir)
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.stdout.write(json.dumps(result, ensure_ascii=False, indent=2))
+
+    def run(self, options, temp_dir):
+        result = {}
+        modes = (
+            ('sync', {'DICTATION_WRITE_BEHIND': False}),
+            ('write_behind', {
+                'DICTATION_WRITE_BEHIND': True,
+                'DICTATION_WRITE_BEHIND_BATCH_SIZE': options['batch_size'],
+                'DICTATION_WRITE_BEHIND_INTERVAL_MS': options['interval_ms'],
+                'DICTATION_WRITE_BEHIND_FSYNC': options['fsync'],
+                'DICTATION_WRITE_BEHIND_JOURNAL_DIR': os.path.join(temp_dir, 'journal'),
+            }),
+        )
+        for name, overrides in modes:
+            with override_settings(**overrides):
+                words, sessions = create_fixtures(options['clients'], options['words'])
+                records_before = DictationRecord.objects.count()
+                buffer = get_answer_buffer() if overrides['DICTATION_WRITE_BEHIND'] else None
+
+                elapsed, ok, errors = run_clients(sessions, words, options['answers'], options['seed'])
+                if buffer is not None:
+                    # 计时包含把剩余记录写入数据库
+                    flush_started = time.perf_counter()
+                    shutdown_answer_buffer()
+                    final_flush = time.perf_counter() - flush_started
+                    elapsed += final_flush
+
+                result[name] = {
+                    'answers': ok,
+                    'errors': errors,
+                    'seconds': round(elapsed, 3),
+                    'answers_per_sec': round(ok / elapsed, 1) if elapsed else None,
+                    'records_written': DictationRecord.objects.count() - records_before,
+                }
+                if buffer is not None:
+                    result[name]['final_flush_ms'] = round(final_flush * 1000, 1)
+                    result[name]['buffer'] = buffer.stats()
+
+        if result['sync']['answers_per_sec'] and result['write_behind']['answers_per_sec']:
+            result['speedup'] = round(result['write_behind']['answers_per_sec'] / result['sync']['answers_per_sec'], 2)
+        return result
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from dictation.writebehind import recover_journal
+
+
+class Command(BaseCommand):
+    help = '把进程崩溃前留在延迟写入日志中的听写记录写入数据库'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--journal-dir', help='日志目录，默认使用DICTATION_WRITE_BEHIND_JOURNAL_DIR')
+
+    def handle(self, *args, **options):
+        journal_dir = options['journal_dir'] or getattr(
+            settings, 'DICTATION_WRITE_BEHIND_JOURNAL_DIR', settings.BASE_DIR / 'answer_journal'
+        )
+        recovered = recover_journal(str(journal_dir))
+        self.stdout.write(f'已重放{recovered}条听写记录')
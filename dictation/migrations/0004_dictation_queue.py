@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictation', '0003_dictationsession_skipped_words'),
+        ('vocabulary', '0003_alter_word_word'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dictationsession',
+            name='queue_cursor',
+            field=models.IntegerField(default=0, verbose_name='当前队列位置'),
+        ),
+        migrations.AddField(
+            model_name='dictationsession',
+            name='queue_length',
+            field=models.IntegerField(default=0, verbose_name='队列长度'),
+        ),
+        migrations.CreateModel(
+            name='DictationQueueItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.IntegerField(verbose_name='位置')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queue_items', to='dictation.dictationsession', verbose_name='听写会话')),
+                ('word', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='vocabulary.word', verbose_name='单词')),
+            ],
+            options={
+                'verbose_name': '听写队列项',
+                'verbose_name_plural': '听写队列项',
+                'ordering': ['position'],
+                'unique_together': {('session', 'position')},
+            },
+        ),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations, models
+
+
+def move_skipped_words_to_queue(apps, schema_editor):
+    """把skipped_words中的单词ID追加到听写队列末尾"""
+    DictationSession = apps.get_model('dictation', 'DictationSession')
+    DictationQueueItem = apps.get_model('dictation', 'DictationQueueItem')
+    DictationRecord = apps.get_model('dictation', 'DictationRecord')
+
+    for session in DictationSession.objects.filter(is_completed=False).exclude(skipped_words=''):
+        skipped_word_ids = [int(id) for id in session.skipped_words.strip(',').split(',') if id]
+        items = []
+        length = session.queue_length
+
+        # 还没有队列的旧会话先生成常规部分（不含已答对和已跳过的单词）
+        if not length:
+            correct_word_ids = DictationRecord.objects.filter(
+                session=session, is_correct=True
+            ).values_list('word_id', flat=True)
+            word_ids = session.word_list.words.filter(is_active=True).exclude(
+                id__in=correct_word_ids
+            ).exclude(id__in=skipped_word_ids).order_by('wordlistword__order').values_list('id', flat=True)
+            for word_id in word_ids:
+                items.append(DictationQueueItem(session=session, position=length, word_id=word_id))
+                length += 1
+
+        for word_id in skipped_word_ids:
+            items.append(DictationQueueItem(session=session, position=length, word_id=word_id, is_skip=True))
+            length += 1
+
+        DictationQueueItem.objects.bulk_create(items, batch_size=500)
+        session.queue_length = length
+        session.save(update_fields=['queue_length'])
+
+
+def move_queue_to_skipped_words(apps, schema_editor):
+    """回滚：把尚未听写的跳过单词写回skipped_words"""
+    DictationSession = apps.get_model('dictation', 'DictationSession')
+    DictationQueueItem = apps.get_model('dictation', 'DictationQueueItem')
+
+    for session in DictationSession.objects.filter(is_completed=False):
+        items = DictationQueueItem.objects.filter(
+            session=session, is_skip=True, position__gt=session.queue_cursor
+        ).order_by('position')
+        word_ids = list(items.values_list('word_id', flat=True))
+        if not word_ids:
+            continue
+        # 跳过的单词总是追加在队列末尾，删除后队列仍然连续
+        items.delete()
+        session.skipped_words = ','.join(map(str, word_ids)) + ','
+        session.queue_length -= len(word_ids)
+        session.save(update_fields=['skipped_words', 'queue_length'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictation', '0004_dictation_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dictationqueueitem',
+            name='is_skip',
+            field=models.BooleanField(default=False, verbose_name='是否为跳过的单词'),
+        ),
+        migrations.AddIndex(
+            model_name='dictationqueueitem',
+            index=models.Index(fields=['session', 'is_skip', 'position'], name='dictation_queue_skip_idx'),
+        ),
+        migrations.RunPython(move_skipped_words_to_queue, move_queue_to_skipped_words),
+        migrations.RemoveField(
+            model_name='dictationsession',
+            name='skipped_words',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictation', '0005_skip_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dictationrecord',
+            name='event_id',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True, verbose_name='写入事件ID'),
+        ),
+    ]
@@ -0,0 +1,123 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# 与dictation.models.PROGRESS_MASTERY_LEVELS相同，迁移中不引用当前模型代码
+MASTERY_LEVELS = [(90, 4), (80, 3), (60, 2), (30, 1)]
+
+
+def split_progress_by_user(apps, schema_editor):
+    """按听写记录把每个单词一行的进度拆分到各用户，无法归属的次数留在user为空的行"""
+    UserProgress = apps.get_model('dictation', 'UserProgress')
+    DictationRecord = apps.get_model('dictation', 'DictationRecord')
+
+    # 原来每个单词理论上只有一行，重复的行合并
+    legacy = {}
+    for progress in UserProgress.objects.all():
+        total, correct, last = legacy.get(progress.word_id, (0, 0, progress.last_practiced))
+        legacy[progress.word_id] = (
+            total + progress.total_attempts,
+            correct + progress.correct_attempts,
+            max(last, progress.last_practiced),
+        )
+
+    rows = []
+    attributed = {}
+    history = DictationRecord.objects.exclude(user_answer='[已跳过]').filter(
+        session__user__isnull=False
+    ).values('word_id', 'session__user_id').annotate(
+        total=models.Count('id'),
+        correct=models.Count('id', filter=models.Q(is_correct=True)),
+        last=models.Max('created_at'),
+    ).order_by()
+    for row in history:
+        rows.append(UserProgress(
+            word_id=row['word_id'],
+            user_id=row['session__user_id'],
+            shard=0,
+            total_attempts=row['total'],
+            correct_attempts=row['correct'],
+            last_practiced=row['last'],
+        ))
+        total, correct = attributed.get(row['word_id'], (0, 0))
+        attributed[row['word_id']] = (total + row['total'], correct + row['correct'])
+
+    for word_id, (total, correct, last) in legacy.items():
+        attributed_total, attributed_correct = attributed.get(word_id, (0, 0))
+        remaining = total - attributed_total
+        if remaining > 0:
+            rows.append(UserProgress(
+                word_id=word_id,
+                user_id=None,
+                shard=0,
+                total_attempts=remaining,
+                correct_attempts=min(remaining, max(0, correct - attributed_correct)),
+                last_practiced=last,
+            ))
+
+    UserProgress.objects.all().delete()
+    UserProgress.objects.bulk_create(rows, batch_size=500)
+
+
+def merge_progress_by_word(apps, schema_editor):
+    """回滚：把各用户、各分片的次数合并回每个单词一行"""
+    UserProgress = apps.get_model('dictation', 'UserProgress')
+
+    rows = []
+    for row in UserProgress.objects.values('word_id').annotate(
+        total=models.Sum('total_attempts'),
+        correct=models.Sum('correct_attempts'),
+        last=models.Max('last_practiced'),
+    ).order_by():
+        mastery_level = 0
+        for threshold, level in MASTERY_LEVELS:
+            if row['correct'] * 100 >= row['total'] * threshold:
+                mastery_level = level
+                break
+        rows.append(UserProgress(
+            word_id=row['word_id'],
+            total_attempts=row['total'],
+            correct_attempts=row['correct'],
+            last_practiced=row['last'],
+            mastery_level=mastery_level,
+        ))
+
+    UserProgress.objects.all().delete()
+    UserProgress.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictation', '0006_dictationrecord_event_id'),
+        ('vocabulary', '0003_alter_word_word'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprogress',
+            name='shard',
+            field=models.IntegerField(default=0, verbose_name='分片'),
+        ),
+        migrations.AddField(
+            model_name='userprogress',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='用户'),
+        ),
+        migrations.RunPython(split_progress_by_user, merge_progress_by_word),
+        migrations.AlterUniqueTogether(
+            name='userprogress',
+            unique_together={('word', 'user', 'shard')},
+        ),
+        migrations.AddIndex(
+            model_name='userprogress',
+            index=models.Index(fields=['user', 'word'], name='dictation_progress_user_idx'),
+        ),
+        migrations.RemoveField(
+            model_name='userprogress',
+            name='mastery_level',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictation', '0007_sharded_user_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dictationsession',
+            name='result_snapshot',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='结果快照'),
+        ),
+    ]
@@ -15,7 +15,9 @@ class DictationSession(models.Model):
     end_time = models.DateTimeField('结束时间', null=True, blank=True)
     is_completed = models.BooleanField('是否完成', default=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='用户', null=True)
-    skipped_words = models.TextField('跳过的单词ID列表', blank=True, default='')
+    queue_cursor = models.IntegerField('当前队列位置', default=0)
+    queue_length = models.IntegerField('队列长度', default=0)
+    result_snapshot = models.JSONField('结果快照', null=True, blank=True, editable=False)
     
     class Meta:
         verbose_name = '听写会话'
@@ -38,6 +40,59 @@ class DictationSession(models.Model):
         if self.end_time:
             return self.end_time - self.start_time
         return timezone.now() - self.start_time
+    
+    def build_queue(self, word_ids):
+        """按顺序生成听写队列，之后每一步只需移动游标"""
+        DictationQueueItem.objects.bulk_create(
+            [DictationQueueItem(session=self, position=i, word_id=word_id) for i, word_id in enumerate(word_ids)],
+            batch_size=500
+        )
+        self.queue_cursor = 0
+        self.queue_length = len(word_ids)
+        self.save(update_fields=['queue_cursor', 'queue_length'])
+    
+    def ensure_queue(self):
+        """为没有队列的旧会话补建队列（跳过已正确回答的单词）"""
+        if self.queue_length or self.is_completed:
+            return
+        correct_word_ids = DictationRecord.objects.filter(session=self, is_correct=True).values_list('word_id', flat=True)
+        word_ids = self.word_list.words.filter(is_active=True).exclude(
+            id__in=correct_word_ids
+        ).order_by('wordlistword__order').values_list('id', flat=True)
+        self.build_queue(list(word_ids))
+    
+    def current_queue_item(self):
+        """当前游标处的队列项，队列已走完时返回None"""
+        if self.queue_cursor >= self.queue_length:
+            return None
+        return DictationQueueItem.objects.select_related('word').filter(
+            session=self, position=self.queue_cursor
+        ).first()
+    
+    def remaining_skipped(self):
+        """当前单词之后还有多少个跳过的单词"""
+        return DictationQueueItem.objects.filter(
+            session=self, is_skip=True, position__gt=self.queue_cursor
+        ).count()
+
+class DictationQueueItem(models.Model):
+    """听写队列项，会话开始时按词书顺序生成"""
+    session = models.ForeignKey(DictationSession, on_delete=models.CASCADE, related_name='queue_items', verbose_name='听写会话')
+    position = models.IntegerField('位置')
+    word = models.ForeignKey(Word, on_delete=models.CASCADE, verbose_name='单词')
+    is_skip = models.BooleanField('是否为跳过的单词', default=False)
+    
+    class Meta:
+        verbose_name = '听写队列项'
+        verbose_name_plural = '听写队列项'
+        ordering = ['position']
+        unique_together = ['session', 'position']
+        indexes = [
+            models.Index(fields=['session', 'is_skip', 'position'], name='dictation_queue_skip_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.session_id} - {self.position}"
 
 class DictationRecord(models.Model):
     """听写记录模型"""
@@ -48,6 +103,7 @@ class DictationRecord(models.Model):
     time_taken = models.IntegerField('用时(秒)', default=0)
     created_at = models.DateTimeField('创建时间', default=timezone.now)
     learning_record = models.ForeignKey(WordLearningRecord, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='学习记录')
+    event_id = models.CharField('写入事件ID', max_length=32, null=True, blank=True, unique=True, editable=False)
     
     class Meta:
         verbose_name = '听写记录'
@@ -55,43 +111,41 @@ class DictationRecord(models.Model):
     
     def __str__(self):
         return f"{self.word.word} - {'正确' if self.is_correct else '错误'}"
-    
-    def save(self, *args, **kwargs):
-        """保存时更新学习记录"""
-        super().save(*args, **kwargs)
-        
-        # 如果没有关联的学习记录且会话有用户，则创建或更新学习记录
-        if not self.learning_record and self.session.user:
-            # 尝试查找现有学习记录
-            learning_record, created = WordLearningRecord.objects.get_or_create(
-                word=self.word,
-                user=self.session.user,
-                defaults={
-                    'next_review_date': timezone.now()
-                }
-            )
-            
-            # 更新学习记录
-            learning_record.update_mastery(self.is_correct)
-            
-            # 关联学习记录
-            self.learning_record = learning_record
-            super().save(update_fields=['learning_record'])
+
+# 用户进度的掌握程度：准确率达到阈值(%)时的等级，都达不到为0
+PROGRESS_MASTERY_LEVELS = [(90, 4), (80, 3), (60, 2), (30, 1)]
+
+def progress_mastery_level(correct_attempts, total_attempts):
+    """按准确率计算用户进度的掌握程度"""
+    for threshold, level in PROGRESS_MASTERY_LEVELS:
+        if correct_attempts * 100 >= total_attempts * threshold:
+            return level
+    return 0
 
 class UserProgress(models.Model):
-    """用户进度模型"""
+    """用户进度模型
+
+    每个用户每个单词的次数分散在多个分片行中，每次答题随机累加其中一行，
+    同一单词的并发提交不会都等待同一行；读取时用summary按单词汇总各分片。
+    user为空的行是匿名会话和升级前无法归属到用户的历史次数。
+    """
     word = models.ForeignKey(Word, on_delete=models.CASCADE, verbose_name='单词')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, verbose_name='用户')
+    shard = models.IntegerField('分片', default=0)
     total_attempts = models.IntegerField('总尝试次数', default=0)
     correct_attempts = models.IntegerField('正确次数', default=0)
     last_practiced = models.DateTimeField('最后练习时间', default=timezone.now)
-    mastery_level = models.IntegerField('掌握程度', default=0)  # 0-4
     
     class Meta:
         verbose_name = '用户进度'
         verbose_name_plural = '用户进度'
+        unique_together = ['word', 'user', 'shard']
+        indexes = [
+            models.Index(fields=['user', 'word'], name='dictation_progress_user_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.word.word} - {self.mastery_level}"
+        return f"{self.word.word} - {self.shard}"
     
     @property
     def accuracy_rate(self):
@@ -99,3 +153,52 @@ class UserProgress(models.Model):
         if self.total_attempts == 0:
             return 0
         return round((self.correct_attempts / self.total_attempts) * 100, 2)
+    
+    @classmethod
+    def summary(cls, user=None, word_ids=None):
+        """汇总各分片，返回{单词ID: {总尝试次数, 正确次数, 最后练习时间, 准确率, 掌握程度}}
+
+        user为None时汇总匿名和历史次数。
+        """
+        rows = cls.objects.filter(user=user)
+        if word_ids is not None:
+            rows = rows.filter(word_id__in=word_ids)
+        totals = {}
+        for row in rows.values('word_id').annotate(
+            total=models.Sum('total_attempts'),
+            correct=models.Sum('correct_attempts'),
+            last=models.Max('last_practiced')
+        ).order_by():
+            totals[row['word_id']] = {
+                'total_attempts': row['total'],
+                'correct_attempts': row['correct'],
+                'last_practiced': row['last'],
+                'accuracy_rate': round(row['correct'] / row['total'] * 100, 2) if row['total'] else 0,
+                'mastery_level': progress_mastery_level(row['correct'], row['total']),
+            }
+        return totals
+
+class DailyLearningStat(models.Model):
+    """每个用户每天的听写统计，答题时累加，进度报告按天读取"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='用户')
+    date = models.DateField('日期')
+    attempts = models.IntegerField('答题次数', default=0)
+    correct = models.IntegerField('正确次数', default=0)
+    total_time = models.IntegerField('总用时(秒)', default=0)
+    
+    class Meta:
+        verbose_name = '每日学习统计'
+        verbose_name_plural = '每日学习统计'
+        ordering = ['date']
+        unique_together = ['user', 'date']
+    
+    def __str__(self):
+        return f"{self.user} - {self.date}"
+    
+    @property
+    def accuracy_rate(self):
+        """准确率"""
+        if self.attempts == 0:
+            return 0
+        return round((self.correct / self.attempts) * 100, 1)
+
@@ -0,0 +1,155 @@
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from vocabulary.models import WordLearningRecord
+from vocabulary.summary import invalidate_learning_summary
+from .models import DictationSession, DictationQueueItem, DictationRecord, UserProgress, DailyLearningStat
+from .writebehind import buffer_event, make_event, write_behind_enabled
+
+SESSION_COUNTER_FIELDS = ['completed_words', 'correct_count', 'wrong_count', 'queue_cursor', 'queue_length']
+
+def update_session(session, word, advance, require_advance=False, **counters):
+    """用F表达式累加会话计数，advance为True且word是当前单词时游标前移一位，返回游标是否前移
+
+    游标只在仍指向该单词时移动（同一会话在多个页面中同时提交时只会前移一次）。
+    require_advance为True时游标没有前移就不累加计数。
+    更新后重新读取计数，保证session中的值是数据库中的最新值。
+    """
+    values = {field: F(field) + amount for field, amount in counters.items()}
+    sessions = DictationSession.objects.filter(pk=session.pk)
+    updated = 0
+    if advance:
+        current = DictationQueueItem.objects.filter(session=OuterRef('pk'), position=OuterRef('queue_cursor'), word=word)
+        updated = sessions.filter(Exists(current)).update(queue_cursor=F('queue_cursor') + 1, **values)
+    if not updated and values and not require_advance:
+        sessions.update(**values)
+    session.refresh_from_db(fields=SESSION_COUNTER_FIELDS)
+    return bool(updated)
+
+def progress_shard():
+    """随机选择一个用户进度分片"""
+    return random.randrange(max(1, getattr(settings, 'DICTATION_PROGRESS_SHARDS', 4)))
+
+def increment_counters(model, lookup, increments, **fields):
+    """用F表达式累加lookup对应行的计数，行不存在时创建"""
+    rows = model.objects.filter(**lookup)
+    values = {field: F(field) + amount for field, amount in increments.items()}
+    values.update(fields)
+    if rows.update(**values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **increments, **fields)
+    except IntegrityError:
+        # 并发提交同时创建了这一行
+        rows.update(**values)
+
+def update_user_progress(word, user, is_correct):
+    """在随机的一个分片上累加该用户该单词的练习次数"""
+    increment_counters(
+        UserProgress,
+        {'word': word, 'user': user if user.is_authenticated else None, 'shard': progress_shard()},
+        {'total_attempts': 1, 'correct_attempts': 1 if is_correct else 0},
+        last_practiced=timezone.now()
+    )
+
+def update_daily_stat(user, is_correct, time_taken):
+    """累加用户当天（本地日期）的听写统计"""
+    if not user.is_authenticated:
+        return
+    increment_counters(
+        DailyLearningStat,
+        {'user': user, 'date': timezone.localdate()},
+        {'attempts': 1, 'correct': 1 if is_correct else 0, 'total_time': time_taken}
+    )
+
+@transaction.atomic
+def record_answer(session, word, user_answer, time_taken, user):
+    """记录一次听写答案并更新会话、进度和学习记录，返回是否正确
+
+    所有写入在同一个事务中完成，计数都用F表达式在数据库中累加。
+    """
+    # 检查答案是否正确（忽略大小写和空格）
+    is_correct = user_answer == word.word.lower()
+    try:
+        time_taken = int(time_taken)
+    except (TypeError, ValueError):
+        time_taken = 0
+
+    if write_behind_enabled():
+        # 会话计数同步更新，听写记录、学习记录、用户进度和每日统计由缓冲区批量写入
+        if is_correct:
+            update_session(session, word, True, completed_words=1, correct_count=1)
+        else:
+            update_session(session, word, False, wrong_count=1)
+        buffer_event(make_event('answer', session, word, user, user_answer, is_correct, time_taken))
+        return is_correct
+
+    # 先更新学习记录，听写记录创建时直接关联
+    learning_record_id = None
+    if user.is_authenticated:
+        learning_record_id = WordLearningRecord.record_review(word, user, is_correct)
+        invalidate_learning_summary(user.pk)
+
+    DictationRecord.objects.create(
+        session=session,
+        word=word,
+        user_answer=user_answer,
+        is_correct=is_correct,
+        time_taken=time_taken,
+        learning_record_id=learning_record_id
+    )
+
+    # 更新会话统计 - 只有正确时才增加完成单词计数，并把队列前移一位
+    if is_correct:
+        update_session(session, word, True, completed_words=1, correct_count=1)
+    else:
+        update_session(session, word, False, wrong_count=1)
+
+    update_user_progress(word, user, is_correct)
+    update_daily_stat(user, is_correct, time_taken)
+    return is_correct
+
+@transaction.atomic
+def record_skip(session, word, user):
+    """跳过当前单词，将其放到学习列表的最后
+
+    单词已不是当前单词时（重复提交或过期页面）不做任何记录，返回False。
+    """
+    # 队列前移一位，并把单词追加到队列末尾，学完其他单词后再次出现
+    # 先累加队列长度占住末尾的位置，并发跳过时不会写入同一位置
+    if not update_session(session, word, True, require_advance=True, wrong_count=1, queue_length=1):
+        return False
+    DictationQueueItem.objects.create(
+        session=session, position=session.queue_length - 1, word=word, is_skip=True
+    )
+
+    if write_behind_enabled():
+        buffer_event(make_event('skip', session, word, user))
+        return True
+
+    update_daily_stat(user, False, 0)
+
+    # 跳过不影响掌握程度，只确保有学习记录
+    learning_record_id = None
+    if user.is_authenticated:
+        learning_record_id = WordLearningRecord.objects.get_or_create(
+            word=word,
+            user=user,
+            defaults={'next_review_date': timezone.now()}
+        )[0].id
+        invalidate_learning_summary(user.pk)
+
+    # 创建一个错误记录，以便在后续查询中能够找到这个单词
+    DictationRecord.objects.create(
+        session=session,
+        word=word,
+        user_answer='[已跳过]',
+        is_correct=False,
+        time_taken=0,
+        learning_record_id=learning_record_id
+    )
+    return True
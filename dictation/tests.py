@@ -1,3 +1,538 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from vocabulary.models import Word, WordList, WordListWord, WordLearningRecord
+from .models import DictationSession, DictationQueueItem, DictationRecord, UserProgress, DailyLearningStat
+from .charts import lttb
+from .services import record_answer, record_skip
+from .views import next_queue_item, session_result
+from .writebehind import AnswerBuffer, apply_events, flush_pending_answers, make_event, recover_journal, shutdown_answer_buffer
+
+
+class DictationTestCase(TestCase):
+    """创建一个用户、一本三个单词的词书和对应的听写会话"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('tester', password='password')
+        self.word_list = WordList.objects.create(name='测试词书')
+        self.words = [Word.objects.create(word=text, translation=text) for text in ('apple', 'banana', 'cherry')]
+        for order, word in enumerate(self.words):
+            WordListWord.objects.create(word_list=self.word_list, word=word, order=order)
+        self.session = DictationSession.objects.create(
+            word_list=self.word_list, user=self.user, session_name='测试', total_words=len(self.words)
+        )
+        self.session.build_queue([word.id for word in self.words])
+
+
+class AnswerServiceTests(DictationTestCase):
+    """答案写入服务：单一事务、F表达式累加、固定的查询次数"""
+
+    @override_settings(DICTATION_PROGRESS_SHARDS=1)
+    def test_correct_answer_query_count(self):
+        apple = self.words[0]
+        WordLearningRecord.objects.create(word=apple, user=self.user, next_review_date=self.session.start_time)
+        UserProgress.objects.create(word=apple, user=self.user)
+        DailyLearningStat.objects.create(user=self.user, date=timezone.localdate())
+        # 事务的保存点和释放各一次；学习记录：读ID、更新；听写记录：插入；
+        # 会话：条件更新、重新读取；用户进度、每日统计：更新
+        with self.assertNumQueries(9):
+            self.assertTrue(record_answer(self.session, apple, 'apple', 3, self.user))
+
+        self.assertEqual(self.session.correct_count, 1)
+        self.assertEqual(self.session.completed_words, 1)
+        self.assertEqual(self.session.queue_cursor, 1)
+        learning_record = WordLearningRecord.objects.get(word=apple, user=self.user)
+        self.assertEqual(learning_record.review_count, 1)
+        self.assertEqual(learning_record.mastery_level, 10)
+        self.assertEqual(DictationRecord.objects.get(session=self.session).learning_record, learning_record)
+        progress = UserProgress.summary(self.user)[apple.id]
+        self.assertEqual((progress['total_attempts'], progress['correct_attempts'], progress['mastery_level']), (1, 1, 4))
+
+    @override_settings(DICTATION_PROGRESS_SHARDS=1)
+    def test_repeated_answers_update_in_place(self):
+        apple = self.words[0]
+        record_answer(self.session, apple, 'aple', 0, self.user)
+        with self.assertNumQueries(9):
+            self.assertFalse(record_answer(self.session, apple, 'appel', 0, self.user))
+        record_answer(self.session, apple, 'apple', 0, self.user)
+
+        self.assertEqual(self.session.wrong_count, 2)
+        self.assertEqual(self.session.correct_count, 1)
+        self.assertEqual(self.session.queue_cursor, 1)
+        # 每次回答只复习一次，不再重复更新掌握程度
+        learning_record = WordLearningRecord.objects.get(word=apple, user=self.user)
+        self.assertEqual(learning_record.review_count, 3)
+        self.assertEqual(learning_record.mastery_level, 10)
+        progress = UserProgress.summary(self.user)[apple.id]
+        self.assertEqual((progress['total_attempts'], progress['correct_attempts'], progress['mastery_level']), (3, 1, 1))
+
+    def test_progress_is_per_user_and_sharded(self):
+        other = User.objects.create_user('other', password='password')
+        other_session = DictationSession.objects.create(
+            word_list=self.word_list, user=other, session_name='测试', total_words=len(self.words)
+        )
+        other_session.build_queue([word.id for word in self.words])
+        apple = self.words[0]
+        with override_settings(DICTATION_PROGRESS_SHARDS=4):
+            for answer in ('apple', 'aple', 'apple', 'apple', 'apple'):
+                record_answer(self.session, apple, answer, 0, self.user)
+            record_answer(other_session, apple, 'aple', 0, other)
+
+        # 各分片求和后按用户分开统计
+        self.assertLessEqual(UserProgress.objects.filter(word=apple, user=self.user).count(), 4)
+        progress = UserProgress.summary(self.user)[apple.id]
+        self.assertEqual((progress['total_attempts'], progress['correct_attempts'], progress['mastery_level']), (5, 4, 3))
+        progress = UserProgress.summary(other, [apple.id])[apple.id]
+        self.assertEqual((progress['total_attempts'], progress['correct_attempts'], progress['mastery_level']), (1, 0, 0))
+
+    def test_stale_answer_does_not_move_cursor(self):
+        # 另一个页面已经答对了第一个单词，这里再次提交不会让游标多走一位
+        stale_session = DictationSession.objects.get(pk=self.session.pk)
+        record_answer(self.session, self.words[0], 'apple', 0, self.user)
+        record_answer(stale_session, self.words[0], 'apple', 0, self.user)
+
+        self.assertEqual(stale_session.queue_cursor, 1)
+        self.assertEqual(stale_session.correct_count, 2)
+
+    def test_skip_appends_to_queue(self):
+        apple = self.words[0]
+        WordLearningRecord.objects.create(word=apple, user=self.user, next_review_date=self.session.start_time)
+        DailyLearningStat.objects.create(user=self.user, date=timezone.localdate())
+        # 保存点和释放；会话：条件更新、重新读取；队列项：插入；每日统计：更新；学习记录：读取；听写记录：插入
+        with self.assertNumQueries(8):
+            record_skip(self.session, apple, self.user)
+
+        self.assertEqual(self.session.wrong_count, 1)
+        self.assertEqual((self.session.queue_cursor, self.session.queue_length), (1, 4))
+        item = DictationQueueItem.objects.get(session=self.session, position=3)
+        self.assertEqual((item.word, item.is_skip), (apple, True))
+        self.assertEqual(self.session.remaining_skipped(), 1)
+
+    def test_repeated_skip_is_ignored(self):
+        apple = self.words[0]
+        # 另一个页面里仍停在apple的旧会话对象
+        stale = DictationSession.objects.get(pk=self.session.pk)
+        self.assertTrue(record_skip(self.session, apple, self.user))
+        self.assertFalse(record_skip(stale, apple, self.user))
+        self.assertFalse(record_skip(self.session, apple, self.user))
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.wrong_count, 1)
+        self.assertEqual((self.session.queue_cursor, self.session.queue_length), (1, 4))
+        self.assertEqual(DictationQueueItem.objects.filter(session=self.session, is_skip=True).count(), 1)
+        self.assertEqual(DictationRecord.objects.filter(session=self.session, word=apple).count(), 1)
+
+
+class DictationQueueTests(DictationTestCase):
+    """听写队列：游标只在答对或跳过时前移，旧会话第一次访问时补建队列"""
+
+    def test_wrong_answer_repeats_word(self):
+        apple, banana, cherry = self.words
+        record_answer(self.session, apple, 'aple', 0, self.user)
+        self.assertEqual(next_queue_item(self.session).word, apple)
+        record_answer(self.session, apple, 'apple', 0, self.user)
+        self.assertEqual(next_queue_item(self.session).word, banana)
+
+    def test_skipped_word_comes_back_last(self):
+        apple, banana, cherry = self.words
+        record_skip(self.session, apple, self.user)
+        order = []
+        while True:
+            item = next_queue_item(self.session)
+            if item is None:
+                break
+            order.append((item.word.word, item.is_skip))
+            record_answer(self.session, item.word, item.word.word, 0, self.user)
+        self.assertEqual(order, [('banana', False), ('cherry', False), ('apple', True)])
+        self.assertTrue(self.session.is_completed)
+
+    def test_legacy_session_builds_queue_lazily(self):
+        apple, banana, cherry = self.words
+        legacy = DictationSession.objects.create(
+            word_list=self.word_list, user=self.user, session_name='旧会话', total_words=len(self.words)
+        )
+        DictationRecord.objects.create(session=legacy, word=banana, user_answer='banana', is_correct=True)
+        self.assertEqual(legacy.queue_length, 0)
+
+        # 已答对的单词不再出现
+        self.assertEqual(next_queue_item(legacy).word, apple)
+        self.assertEqual(
+            list(legacy.queue_items.order_by('position').values_list('word__word', flat=True)), ['apple', 'cherry']
+        )
+        self.assertEqual((legacy.queue_cursor, legacy.queue_length), (0, 2))
+
+
+class DictationStepTests(DictationTestCase):
+    """/step/接口：提交答案或跳过后在同一个响应中返回下一个单词"""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse('dictation:dictation_step', args=[self.session.pk])
+
+    def step(self, word, **data):
+        data['word_id'] = word.id
+        return self.client.post(self.url, json.dumps(data), content_type='application/json')
+
+    def test_next_word_contract(self):
+        apple, banana, cherry = self.words
+        data = self.step(apple, answer=' Aple ', engine='edge-tts', voice='en-US-female', speed=1).json()
+        self.assertEqual(
+            (data['success'], data['action'], data['is_correct'], data['correct_word'], data['completed']),
+            (True, 'submit', False, 'apple', False)
+        )
+        self.assertEqual(data['next_word']['id'], apple.id)
+        self.assertIn('/tts/audio/?', data['next_word']['audio_url'])
+        self.assertEqual(data['next_word']['learning_record']['review_count'], 1)
+
+        data = self.step(apple, answer=' Apple ').json()
+        self.assertTrue(data['is_correct'])
+        self.assertEqual((data['next_word']['id'], data['next_word']['audio_url']), (banana.id, None))
+        self.assertEqual(data['progress'], {'completed': 1, 'total': 3, 'percentage': 33.3})
+        self.assertEqual((data['correct_count'], data['wrong_count'], data['remaining_skipped']), (1, 1, 0))
+
+        data = self.step(banana, action='skip').json()
+        self.assertEqual((data['action'], data['is_correct'], data['next_word']['id']), ('skip', False, cherry.id))
+        self.assertEqual(data['remaining_skipped'], 1)
+
+    def test_completed_contract(self):
+        for word in self.words:
+            data = self.step(word, answer=word.word).json()
+        self.assertEqual((data['completed'], data['next_word']), (True, None))
+        self.assertEqual(data['result_url'], reverse('dictation:dictation_result', args=[self.session.pk]))
+        self.assertEqual(data['progress']['percentage'], 100.0)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertEqual(self.client.post(self.url, 'not json', content_type='application/json').status_code, 400)
+        self.assertEqual(self.step(self.words[0], action='undo').status_code, 400)
+        response = self.client.post(self.url, json.dumps({'word_id': 0}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SkipQueueMigrationTests(TransactionTestCase):
+    """0005迁移：skipped_words中的单词移到队列末尾，回滚时写回"""
+
+    migrate_from = [('dictation', '0004_dictation_queue')]
+    migrate_to = [('dictation', '0005_skip_queue')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def setUp(self):
+        self.addCleanup(self.migrate, MigrationExecutor(connection).loader.graph.leaf_nodes())
+        apps = self.migrate(self.migrate_from)
+        Word = apps.get_model('vocabulary', 'Word')
+        WordList = apps.get_model('vocabulary', 'WordList')
+        WordListWord = apps.get_model('vocabulary', 'WordListWord')
+        Session = apps.get_model('dictation', 'DictationSession')
+        QueueItem = apps.get_model('dictation', 'DictationQueueItem')
+        Record = apps.get_model('dictation', 'DictationRecord')
+
+        word_list = WordList.objects.create(name='测试词书')
+        self.words = [Word.objects.create(word=text, translation=text) for text in ('apple', 'banana', 'cherry')]
+        for order, word in enumerate(self.words):
+            WordListWord.objects.create(word_list=word_list, word=word, order=order)
+        apple, banana, cherry = self.words
+
+        # 已有队列的会话：跳过了第一个单词
+        self.queued = Session.objects.create(
+            word_list=word_list, session_name='队列', total_words=3,
+            queue_cursor=1, queue_length=3, skipped_words=f'{apple.id},'
+        )
+        QueueItem.objects.bulk_create([
+            QueueItem(session=self.queued, position=i, word=word) for i, word in enumerate(self.words)
+        ])
+        # 没有队列的旧会话：答对了apple，跳过了cherry
+        self.legacy = Session.objects.create(
+            word_list=word_list, session_name='旧会话', total_words=3, skipped_words=f'{cherry.id},'
+        )
+        Record.objects.create(session=self.legacy, word=apple, user_answer='apple', is_correct=True)
+        # 已完成的会话不处理
+        self.completed = Session.objects.create(
+            word_list=word_list, session_name='已完成', total_words=3, is_completed=True, skipped_words=f'{banana.id},'
+        )
+
+    def queue(self, apps, session, *fields):
+        QueueItem = apps.get_model('dictation', 'DictationQueueItem')
+        return list(QueueItem.objects.filter(session_id=session.pk).order_by('position').values_list(
+            'position', 'word_id', *fields
+        ))
+
+    def test_forward_and_reverse(self):
+        apple, banana, cherry = (word.id for word in self.words)
+        apps = self.migrate(self.migrate_to)
+        Session = apps.get_model('dictation', 'DictationSession')
+        self.assertEqual(self.queue(apps, self.queued, 'is_skip'), [
+            (0, apple, False), (1, banana, False), (2, cherry, False), (3, apple, True),
+        ])
+        self.assertEqual(Session.objects.get(pk=self.queued.pk).queue_length, 4)
+        self.assertEqual(self.queue(apps, self.legacy, 'is_skip'), [(0, banana, False), (1, cherry, True)])
+        self.assertEqual(Session.objects.get(pk=self.legacy.pk).queue_length, 2)
+        self.assertEqual(self.queue(apps, self.completed), [])
+
+        apps = self.migrate(self.migrate_from)
+        Session = apps.get_model('dictation', 'DictationSession')
+        queued = Session.objects.get(pk=self.queued.pk)
+        self.assertEqual((queued.skipped_words, queued.queue_length), (f'{apple},', 3))
+        self.assertEqual(self.queue(apps, queued), [(0, apple), (1, banana), (2, cherry)])
+        legacy = Session.objects.get(pk=self.legacy.pk)
+        self.assertEqual((legacy.skipped_words, legacy.queue_length), (f'{cherry},', 1))
+        self.assertEqual(self.queue(apps, legacy), [(0, banana)])
+        # 已完成会话的跳过记录不再需要，随字段一起删除
+        self.assertEqual(Session.objects.get(pk=self.completed.pk).skipped_words, '')
+
+
+class DailyLearningStatTests(DictationTestCase):
+    """每日统计：答题时累加，与从听写记录重新生成的结果一致"""
+
+    def test_daily_stat_matches_backfill(self):
+        record_answer(self.session, self.words[0], 'aple', 4, self.user)
+        record_answer(self.session, self.words[0], 'apple', 2, self.user)
+        record_skip(self.session, self.words[1], self.user)
+
+        stat = DailyLearningStat.objects.get(user=self.user)
+        self.assertEqual(stat.date, timezone.localdate())
+        self.assertEqual((stat.attempts, stat.correct, stat.total_time), (3, 1, 6))
+        self.assertEqual(stat.accuracy_rate, 33.3)
+
+        DailyLearningStat.objects.all().delete()
+        call_command('backfill_daily_stats', stdout=open(os.devnull, 'w'))
+        stat = DailyLearningStat.objects.get(user=self.user)
+        self.assertEqual((stat.date, stat.attempts, stat.correct, stat.total_time), (timezone.localdate(), 3, 1, 6))
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('dictation:progress'))
+        self.assertContains(response, 'banana')
+        data = self.client.get(reverse('dictation:progress_chart')).json()
+        today = timezone.localdate().isoformat()
+        self.assertEqual((data['count'], data['accuracy']), ([[today, 3]], [[today, 33.3]]))
+
+
+class ProgressChartTests(DictationTestCase):
+    """学习趋势图：长历史按粒度汇总并降采样，点数有上限"""
+
+    def setUp(self):
+        super().setUp()
+        start = date(2020, 1, 1)
+        DailyLearningStat.objects.bulk_create([
+            DailyLearningStat(
+                user=self.user, date=start + timedelta(days=i), attempts=10 + i % 7, correct=(i * 37) % 11
+            )
+            for i in range(1500)
+        ])
+        self.total_attempts = sum(10 + i % 7 for i in range(1500))
+        self.client.force_login(self.user)
+
+    def test_lttb_keeps_endpoints(self):
+        points = [(x, (x * 7919) % 101) for x in range(1000)]
+        sampled = lttb(points, 50)
+        self.assertEqual(len(sampled), 50)
+        self.assertEqual((sampled[0], sampled[-1]), (points[0], points[-1]))
+        self.assertEqual(sampled, sorted(sampled))
+        self.assertEqual(lttb(points[:20], 50), points[:20])
+
+    def test_daily_series_is_downsampled(self):
+        data = self.client.get(reverse('dictation:progress_chart'), {'granularity': 'day', 'points': 50}).json()
+        self.assertTrue(data['downsampled'])
+        self.assertEqual(data['total_points'], 1500)
+        self.assertLessEqual(len(data['count']), 50)
+        self.assertEqual(len(data['accuracy']), 50)
+        # 数量按时间段求和，总数不变
+        self.assertEqual(sum(total for _, total in data['count']), self.total_attempts)
+        self.assertEqual((data['accuracy'][0][0], data['accuracy'][-1][0]), (data['first'], data['last']))
+
+    def test_auto_granularity_follows_zoom(self):
+        url = reverse('dictation:progress_chart')
+        data = self.client.get(url, {'points': 100}).json()
+        self.assertEqual((data['granularity'], data['downsampled']), ('month', False))
+        self.assertEqual(sum(total for _, total in data['count']), self.total_attempts)
+
+        data = self.client.get(url, {'points': 100, 'start': '2021-03-01', 'end': '2021-03-31'}).json()
+        self.assertEqual((data['granularity'], len(data['count'])), ('day', 31))
+        self.assertEqual(data['first'], '2020-01-01')
+
+        response = self.client.get(url, {'granularity': 'year'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(url, {'start': '2021-13-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DictationResultTests(DictationTestCase):
+    """结果页：分组聚合统计，完成后只读取会话快照"""
+
+    def test_completed_result_is_single_row_read(self):
+        self.words[2].difficulty_level = 3
+        self.words[2].save()
+        record_skip(self.session, self.words[0], self.user)
+        for word in self.words[1:] + self.words[:1]:
+            record_answer(self.session, word, word.word, 1, self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(next_queue_item(self.session))
+
+        snapshot = DictationSession.objects.get(pk=self.session.pk).result_snapshot
+        self.assertEqual(snapshot['total_attempts'], 4)
+        self.assertEqual(snapshot['correct_unique_words'], 3)
+        self.assertEqual(
+            [(stats['level'], stats['correct'], stats['total']) for stats in snapshot['difficulty_stats']],
+            [(1, 2, 2), (3, 1, 1)]
+        )
+        self.assertEqual([record['word'] for record in snapshot['records']], ['apple', 'banana', 'cherry', 'apple'])
+
+        self.client.force_login(self.user)
+        url = reverse('dictation:dictation_result', args=[self.session.pk])
+        # 登录会话、用户、听写会话（含词书）各一次
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '[已跳过]')
+
+    def test_difficulty_stats_count_each_word_once(self):
+        apple, banana, cherry = self.words
+        cherry.difficulty_level = 3
+        cherry.save()
+        for answer in ('aple', 'appel', 'apple'):
+            record_answer(self.session, apple, answer, 1, self.user)
+        for answer in ('banan', 'banana'):
+            record_answer(self.session, banana, answer, 1, self.user)
+        for answer in ('chery', 'cherri'):
+            record_answer(self.session, cherry, answer, 1, self.user)
+
+        result = session_result(self.session)
+        self.assertEqual(result['total_attempts'], 7)
+        self.assertEqual(result['correct_unique_words'], 2)
+        self.assertEqual(result['difficulty_stats'], [
+            {'level': 1, 'total': 2, 'correct': 2, 'accuracy_rate': 100.0},
+            {'level': 3, 'total': 1, 'correct': 0, 'accuracy_rate': 0.0},
+        ])
+
+
+class WriteBehindTests(DictationTestCase):
+    """延迟写入：答案先进入缓冲区和磁盘日志，批量写入，崩溃后可重放"""
+
+    def setUp(self):
+        super().setUp()
+        self.journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.journal_dir.cleanup)
+
+    def test_answers_are_buffered_until_flush(self):
+        # 后台线程不会自动写入，由测试线程调用flush
+        with override_settings(
+            DICTATION_WRITE_BEHIND=True,
+            DICTATION_WRITE_BEHIND_JOURNAL_DIR=self.journal_dir.name,
+            DICTATION_WRITE_BEHIND_BATCH_SIZE=1000,
+            DICTATION_WRITE_BEHIND_INTERVAL_MS=60000,
+        ):
+            self.addCleanup(shutdown_answer_buffer)
+            apple, banana = self.words[:2]
+            with self.captureOnCommitCallbacks(execute=True):
+                record_answer(self.session, apple, 'aple', 0, self.user)
+                record_answer(self.session, apple, 'apple', 2, self.user)
+                record_skip(self.session, banana, self.user)
+
+            # 会话计数和队列同步更新，听写记录尚未写入
+            self.assertEqual((self.session.correct_count, self.session.wrong_count), (1, 2))
+            self.assertEqual(self.session.queue_cursor, 2)
+            self.assertEqual(self.session.remaining_skipped(), 1)
+            self.assertFalse(DictationRecord.objects.exists())
+            segments = set(os.listdir(self.journal_dir.name))
+            self.assertEqual(len(segments), 1)
+
+            flush_pending_answers()
+
+        self.assertEqual(DictationRecord.objects.filter(session=self.session).count(), 3)
+        learning_record = WordLearningRecord.objects.get(word=apple, user=self.user)
+        self.assertEqual((learning_record.review_count, learning_record.mastery_level), (2, 10))
+        self.assertEqual(WordLearningRecord.objects.get(word=banana, user=self.user).review_count, 0)
+        progress = UserProgress.summary(self.user)[apple.id]
+        self.assertEqual((progress['total_attempts'], progress['correct_attempts'], progress['mastery_level']), (2, 1, 1))
+        # 已写入数据库的日志段被删除
+        self.assertFalse(segments & set(os.listdir(self.journal_dir.name)))
+
+    def test_recover_journal_replays_unflushed_tail(self):
+        # 模拟进程崩溃后留下的日志段，最后一行只写了一半
+        events = [
+            make_event('answer', self.session, self.words[0], self.user, 'apple', True, 3),
+            make_event('skip', self.session, self.words[1], self.user),
+        ]
+        lines = ''.join(json.dumps(event) + '\n' for event in events) + '{"event_id": "trunc'
+        path = os.path.join(self.journal_dir.name, '1234-crashed.log')
+        with open(path, 'w') as segment:
+            segment.write(lines)
+
+        self.assertEqual(recover_journal(self.journal_dir.name), 2)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(DictationRecord.objects.filter(session=self.session).count(), 2)
+
+        # 写入数据库后、删除日志前崩溃：再次重放不会重复写入
+        with open(path, 'w') as segment:
+            segment.write(lines)
+        self.assertEqual(recover_journal(self.journal_dir.name), 0)
+        self.assertEqual(DictationRecord.objects.filter(session=self.session).count(), 2)
+        self.assertEqual(WordLearningRecord.objects.get(word=self.words[0], user=self.user).review_count, 1)
+
+    def test_snapshot_includes_final_buffered_answer(self):
+        with override_settings(
+            DICTATION_WRITE_BEHIND=True,
+            DICTATION_WRITE_BEHIND_JOURNAL_DIR=self.journal_dir.name,
+            DICTATION_WRITE_BEHIND_BATCH_SIZE=1000,
+            DICTATION_WRITE_BEHIND_INTERVAL_MS=60000,
+        ):
+            self.addCleanup(shutdown_answer_buffer)
+            self.client.force_login(self.user)
+            url = reverse('dictation:dictation_step', args=[self.session.pk])
+            for word in self.words:
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(url, json.dumps({'word_id': word.id, 'answer': word.word}),
+                                                content_type='application/json')
+            self.assertTrue(response.json()['completed'])
+
+        snapshot = DictationSession.objects.get(pk=self.session.pk).result_snapshot
+        self.assertEqual((snapshot['total_attempts'], snapshot['correct_unique_words']), (3, 3))
+
+    def test_snapshot_waits_for_other_processes_buffers(self):
+        with override_settings(DICTATION_WRITE_BEHIND=True):
+            # 事务没有提交，事件不会进入本进程的缓冲区，模拟还在其他进程的缓冲区中
+            for word in self.words:
+                record_answer(self.session, word, word.word, 1, self.user)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertIsNone(next_queue_item(self.session))
+            self.assertIsNone(DictationSession.objects.get(pk=self.session.pk).result_snapshot)
+
+            # 记录写入后第一次查看结果时补存快照
+            apply_events([make_event('answer', self.session, word, self.user, word.word, True, 1) for word in self.words])
+            self.client.force_login(self.user)
+            response = self.client.get(reverse('dictation:dictation_result', args=[self.session.pk]))
+            self.assertEqual(response.context['total_attempts'], 3)
+        snapshot = DictationSession.objects.get(pk=self.session.pk).result_snapshot
+        self.assertEqual(snapshot['total_attempts'], 3)
+
+    @mock.patch('dictation.writebehind.fcntl', None)
+    def test_journal_without_fcntl(self):
+        # Windows下没有fcntl，日志段不加锁，仍然写入、删除和重放
+        buffer = AnswerBuffer(self.journal_dir.name, batch_size=1000, interval=60).start()
+        buffer.append(make_event('answer', self.session, self.words[0], self.user, 'apple', True, 3))
+        self.assertTrue(all(name.endswith('.log') for name in os.listdir(self.journal_dir.name)))
+        buffer.close()
+        self.assertEqual(os.listdir(self.journal_dir.name), [])
+        self.assertEqual(DictationRecord.objects.filter(session=self.session).count(), 1)
+
+        path = os.path.join(self.journal_dir.name, '1234-crashed.log')
+        with open(path, 'w') as segment:
+            segment.write(json.dumps(make_event('skip', self.session, self.words[1], self.user)) + '\n')
+        self.assertEqual(recover_journal(self.journal_dir.name), 1)
+        self.assertFalse(os.path.exists(path))
@@ -9,6 +9,8 @@ urlpatterns = [
     path('session/<int:session_id>/', views.dictation_session, name='dictation_session'),
     path('session/<int:session_id>/submit/', views.submit_answer, name='submit_answer'),
     path('session/<int:session_id>/skip/', views.skip_word, name='skip_word'),
+    path('session/<int:session_id>/step/', views.dictation_step, name='dictation_step'),
     path('result/<int:session_id>/', views.dictation_result, name='dictation_result'),
     path('progress/', views.progress_report, name='progress'),
+    path('progress/chart/', views.progress_chart, name='progress_chart'),
 ] 
\ No newline at end of file
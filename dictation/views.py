@@ -4,8 +4,19 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from vocabulary.models import Word, WordList, WordLearningRecord, ReviewPlan
-from .models import DictationSession, DictationRecord, UserProgress
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from vocabulary.models import Word, WordList, WordLearningRecord
+from vocabulary.summary import get_learning_summary
+from .models import DictationSession, DictationRecord
+from tts.views import VOICE_OPTIONS, ENGINE_CONTENT_TYPES, speech_audio_url
+from tts.prerender import prerender_texts
+from .charts import CHART_GRANULARITIES, CHART_MAX_POINTS, CHART_MIN_POINTS, chart_series
+from .services import record_answer, record_skip
+from .writebehind import flush_pending_answers, write_behind_enabled
 import json
 import random
 
@@ -34,8 +45,9 @@ def start_dictation(request, list_id):
     """开始听写"""
     word_list = get_object_or_404(WordList, id=list_id)
     words = word_list.words.filter(is_active=True).order_by('wordlistword__order')
+    word_ids = list(words.values_list('id', flat=True))
     
-    if not words.exists():
+    if not word_ids:
         messages.error(request, f'词书"{word_list.name}"为空，请先添加单词后再开始听写。')
         return redirect('dictation:home')
     
@@ -44,94 +56,103 @@ def start_dictation(request, list_id):
         word_list=word_list,
         user=request.user if request.user.is_authenticated else None,
         session_name=f"{word_list.name} - {timezone.now().strftime('%Y-%m-%d %H:%M')}",
-        total_words=words.count()
+        total_words=len(word_ids)
     )
     
+    # 按词书顺序生成听写队列
+    session.build_queue(word_ids)
+    
+    # 后台预生成词书音频，听写到每个单词时只需读取缓存
+    prerender_word_audio(request, words)
+    
     # 重定向到会话页面
     return redirect('dictation:dictation_session', session_id=session.id)
 
+def prerender_word_audio(request, words):
+    """按词书顺序把单词音频加入后台预生成队列"""
+    if not getattr(settings, 'TTS_PRERENDER_ON_START', True):
+        return
+    
+    # 使用浏览器发音时不需要预生成
+    engine = request.GET.get('engine', 'edge-tts')
+    if engine not in ENGINE_CONTENT_TYPES:
+        return
+    
+    voice_key = request.GET.get('voice', 'en-US-female')
+    if voice_key not in VOICE_OPTIONS:
+        voice_key = 'en-US-female'
+    try:
+        speed = float(request.GET.get('speed', 1.0))
+    except ValueError:
+        speed = 1.0
+    
+    prerender_texts(words.values_list('word', flat=True), voice_key, engine, speed)
+
+def next_queue_item(session):
+    """取得当前要听写的队列项，全部完成时标记会话完成并返回None
+
+    答错时游标不动，继续练习该单词；跳过的单词已追加在队列末尾。
+    """
+    # 开始听写之前创建的会话没有队列，这里补建
+    session.ensure_queue()
+    
+    item = session.current_queue_item()
+    if item is not None:
+        return item
+    
+    # 所有单词都已正确完成，保存结果快照
+    if not session.is_completed:
+        session.is_completed = True
+        session.end_time = timezone.now()
+        session.save(update_fields=['is_completed', 'end_time'])
+        # 启用延迟写入时本次答案在事务提交后才进入缓冲区，提交后再保存快照
+        transaction.on_commit(lambda: save_result_snapshot(session), robust=True)
+    return None
+
+def session_progress(session):
+    """进度统计 - 只计算正确完成的单词"""
+    total_words = session.total_words
+    completed_count = session.completed_words
+    return {
+        'completed': completed_count,
+        'total': total_words,
+        'percentage': round((completed_count / total_words) * 100, 1) if total_words > 0 else 0
+    }
+
 def dictation_session(request, session_id):
     """听写会话页面"""
     session = get_object_or_404(DictationSession, id=session_id)
     
     # 确保用户只能访问自己的会话
-    if session.user and session.user != request.user and request.user.is_authenticated:
+    if session.user_id and session.user_id != request.user.id and request.user.is_authenticated:
         messages.error(request, "您无权访问此听写会话")
         return redirect('dictation:home')
     
-    words = session.word_list.words.filter(is_active=True).order_by('wordlistword__order')
-    
-    # 获取当前进度 - 只计算正确回答的单词
-    completed_words = DictationRecord.objects.filter(session=session, is_correct=True).values_list('word_id', flat=True)
-    
-    # 检查是否有上一次答错的单词
-    last_incorrect = DictationRecord.objects.filter(
-        session=session, 
-        is_correct=False
-    ).order_by('-created_at').first()
-    
-    # 解析跳过的单词ID列表
-    skipped_word_ids = []
-    if session.skipped_words:
-        skipped_word_ids = [int(id) for id in session.skipped_words.strip(',').split(',') if id]
-    
-    # 决定当前要学习的单词
-    if last_incorrect and last_incorrect.word_id not in completed_words:
-        # 如果有答错的单词且尚未正确回答，则继续练习该单词
-        current_word = last_incorrect.word
-    else:
-        # 否则获取剩余单词中的第一个
-        remaining_words = words.exclude(id__in=completed_words)
-        
-        if not remaining_words.exists():
-            # 如果所有常规单词都已完成，检查是否有跳过的单词
-            if skipped_word_ids:
-                # 获取第一个跳过的单词
-                skipped_word_id = skipped_word_ids[0]
-                current_word = get_object_or_404(Word, id=skipped_word_id)
-                
-                # 从跳过列表中移除这个单词
-                skipped_word_ids.pop(0)
-                session.skipped_words = ','.join(map(str, skipped_word_ids)) + ',' if skipped_word_ids else ''
-                session.save(update_fields=['skipped_words'])
-            else:
-                # 所有单词都已正确完成
-                session.is_completed = True
-                session.end_time = timezone.now()
-                session.save()
-                
-                context = {
-                    'session': session,
-                    'completed': True,
-                }
-                return render(request, 'dictation/result.html', context)
+    item = next_queue_item(session)
+    if item is None:
+        if session.result_snapshot is None:
+            result = save_result_snapshot(session)
         else:
-            current_word = remaining_words.first()
-    
-    # 获取该单词的学习记录
+            result = session.result_snapshot
+        context = {
+            'session': session,
+            'completed': True,
+            **result
+        }
+        return render(request, 'dictation/result.html', context)
+    current_word = item.word
+    
+    # 获取该单词的学习记录（第一次回答时才创建）
     learning_record = None
     if request.user.is_authenticated:
-        learning_record, created = WordLearningRecord.objects.get_or_create(
-            word=current_word,
-            user=request.user,
-            defaults={'next_review_date': timezone.now()}
-        )
-    
-    # 计算进度百分比 - 只计算正确完成的单词
-    total_words = words.count()
-    completed_count = len(completed_words)
-    percentage = round((completed_count / total_words) * 100, 1) if total_words > 0 else 0
+        learning_record = WordLearningRecord.objects.filter(word=current_word, user=request.user).first()
     
     context = {
         'session': session,
         'current_word': current_word,
         'learning_record': learning_record,
-        'progress': {
-            'completed': completed_count,
-            'total': total_words,
-            'percentage': percentage
-        },
-        'remaining_skipped': len(skipped_word_ids)
+        'progress': session_progress(session),
+        'remaining_skipped': session.remaining_skipped()
     }
     return render(request, 'dictation/dictation.html', context)
 
@@ -151,61 +172,7 @@ def submit_answer(request, session_id):
             user_answer = data['answer'].strip().lower()
             time_taken = data.get('time_taken', 0)
             
-            # 检查答案是否正确（忽略大小写和空格）
-            is_correct = user_answer == word.word.lower()
-            
-            # 创建听写记录
-            record = DictationRecord.objects.create(
-                session=session,
-                word=word,
-                user_answer=user_answer,
-                is_correct=is_correct,
-                time_taken=time_taken
-            )
-            
-            # 更新会话统计 - 只有正确时才增加完成单词计数
-            if is_correct:
-                session.completed_words += 1
-                session.correct_count += 1
-            else:
-                session.wrong_count += 1
-            session.save()
-            
-            # 更新用户进度
-            progress, created = UserProgress.objects.get_or_create(word=word)
-            progress.total_attempts += 1
-            if is_correct:
-                progress.correct_attempts += 1
-            progress.last_practiced = timezone.now()
-            
-            # 根据准确率更新掌握程度
-            accuracy = progress.accuracy_rate
-            if accuracy >= 90:
-                progress.mastery_level = 4
-            elif accuracy >= 80:
-                progress.mastery_level = 3
-            elif accuracy >= 60:
-                progress.mastery_level = 2
-            elif accuracy >= 30:
-                progress.mastery_level = 1
-            else:
-                progress.mastery_level = 0
-            progress.save()
-            
-            # 获取或创建学习记录
-            if request.user.is_authenticated:
-                learning_record, created = WordLearningRecord.objects.get_or_create(
-                    word=word,
-                    user=request.user,
-                    defaults={'next_review_date': timezone.now()}
-                )
-                
-                # 更新学习记录
-                learning_record.update_mastery(is_correct)
-                
-                # 关联学习记录到听写记录
-                record.learning_record = learning_record
-                record.save(update_fields=['learning_record'])
+            is_correct = record_answer(session, word, user_answer, time_taken, request.user)
             
             return JsonResponse({
                 'success': True,
@@ -233,34 +200,7 @@ def skip_word(request, session_id):
             
             word = get_object_or_404(Word, id=data['word_id'])
             
-            # 创建一个错误记录，以便在后续查询中能够找到这个单词
-            record = DictationRecord.objects.create(
-                session=session,
-                word=word,
-                user_answer='[已跳过]',
-                is_correct=False,
-                time_taken=0
-            )
-            
-            # 更新会话统计
-            session.wrong_count += 1
-            session.save()
-            
-            # 获取或创建学习记录
-            if request.user.is_authenticated:
-                learning_record, created = WordLearningRecord.objects.get_or_create(
-                    word=word,
-                    user=request.user,
-                    defaults={'next_review_date': timezone.now()}
-                )
-                
-                # 更新学习记录 - 跳过不影响掌握程度
-                record.learning_record = learning_record
-                record.save(update_fields=['learning_record'])
-            
-            # 创建一个特殊标记，表示这个单词被跳过，需要放到列表末尾
-            session.skipped_words = session.skipped_words + str(word.id) + ',' if hasattr(session, 'skipped_words') else str(word.id) + ','
-            session.save(update_fields=['skipped_words'])
+            record_skip(session, word, request.user)
             
             return JsonResponse({
                 'success': True,
@@ -272,75 +212,189 @@ def skip_word(request, session_id):
     
     return JsonResponse({'success': False, 'message': '只支持POST请求'})
 
-def dictation_result(request, session_id):
-    """听写结果页面"""
-    session = get_object_or_404(DictationSession, id=session_id)
+def word_payload(word, user, engine=None, voice_key='en-US-female', speed=1.0):
+    """下一个单词的数据，使用服务器发音时附带音频地址供页面预加载"""
+    payload = {
+        'id': word.id,
+        'word': word.word,
+        'phonetic': word.phonetic,
+        'translation': word.translation,
+        'audio_url': None,
+        'learning_record': None,
+    }
+    if engine in ENGINE_CONTENT_TYPES:
+        payload['audio_url'] = speech_audio_url(word.word.strip(), voice_key, engine, speed)
+    if user.is_authenticated:
+        learning_record = WordLearningRecord.objects.filter(word=word, user=user).first()
+        if learning_record:
+            payload['learning_record'] = {
+                'review_count': learning_record.review_count,
+                'mastery_level': learning_record.mastery_level,
+                'next_review_date': learning_record.next_review_date.strftime('%Y-%m-%d'),
+            }
+    return payload
+
+@csrf_exempt
+def dictation_step(request, session_id):
+    """提交答案或跳过，并在同一个请求中返回下一个单词"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': '只支持POST请求'}, status=405)
     
-    # 确保用户只能查看自己的会话结果
-    if session.user and session.user != request.user and request.user.is_authenticated:
-        messages.error(request, "您无权查看此听写会话的结果")
-        return redirect('dictation:home')
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'JSON解析错误'}, status=400)
     
-    # 获取所有记录，包括错误和正确的
-    records = DictationRecord.objects.filter(session=session).order_by('created_at')
+    session = get_object_or_404(DictationSession, id=session_id)
     
-    # 获取正确回答的单词ID列表
-    correct_word_ids = records.filter(is_correct=True).values_list('word_id', flat=True).distinct()
+    # 确保用户只能操作自己的会话
+    if session.user_id and session.user_id != request.user.id and request.user.is_authenticated:
+        return JsonResponse({'success': False, 'message': '您无权操作此听写会话'}, status=403)
+    
+    action = data.get('action', 'submit')
+    if action not in ('submit', 'skip'):
+        return JsonResponse({'success': False, 'message': '不支持的操作'}, status=400)
+    
+    try:
+        word = Word.objects.get(id=data['word_id'])
+    except (KeyError, ValueError, Word.DoesNotExist):
+        return JsonResponse({'success': False, 'message': '单词不存在'}, status=400)
+    
+    try:
+        speed = float(data.get('speed', 1.0))
+    except (TypeError, ValueError):
+        speed = 1.0
+    voice_key = data.get('voice', 'en-US-female')
+    if voice_key not in VOICE_OPTIONS:
+        voice_key = 'en-US-female'
+    
+    try:
+        with transaction.atomic():
+            if action == 'skip':
+                record_skip(session, word, request.user)
+                is_correct = False
+            else:
+                user_answer = str(data.get('answer', '')).strip().lower()
+                is_correct = record_answer(session, word, user_answer, data.get('time_taken', 0), request.user)
+            item = next_queue_item(session)
+    except Exception as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=500)
+    
+    return JsonResponse({
+        'success': True,
+        'action': action,
+        'is_correct': is_correct,
+        'correct_word': word.word,
+        'completed': item is None,
+        'result_url': reverse('dictation:dictation_result', args=[session.id]),
+        'next_word': word_payload(item.word, request.user, data.get('engine'), voice_key, speed) if item else None,
+        'progress': session_progress(session),
+        'correct_count': session.correct_count,
+        'wrong_count': session.wrong_count,
+        'remaining_skipped': session.remaining_skipped(),
+    })
+
+def session_result(session):
+    """统计听写结果：按难度的统计用一次分组聚合得到，记录列表一次查询取出
+
+    difficulty_stats是按难度排列的列表（结果快照保存为JSON，字典的整数键会变成字符串），
+    total为该难度练习过的单词数，correct为其中答对过的单词数，同一单词多次作答只计一次。
+    """
+    records = DictationRecord.objects.filter(session=session)
+    
+    # 每个难度的尝试次数、练习过的单词数和答对过的单词数
+    difficulty_stats = []
+    total_attempts = 0
+    correct_unique_words = 0
+    for row in records.values('word__difficulty_level').annotate(
+        attempts=Count('id'),
+        total=Count('word', distinct=True),
+        correct=Count('word', distinct=True, filter=Q(is_correct=True))
+    ).order_by('word__difficulty_level'):
+        total_attempts += row['attempts']
+        correct_unique_words += row['correct']
+        difficulty_stats.append({
+            'level': row['word__difficulty_level'],
+            'total': row['total'],
+            'correct': row['correct'],
+            'accuracy_rate': round((row['correct'] / row['total']) * 100, 1) if row['total'] else 0.0,
+        })
     
     # 计算总体准确率 - 基于唯一单词的正确率
     total_unique_words = session.word_list.words.count()
-    correct_unique_words = len(correct_word_ids)
-    
     accuracy_rate = 0
     if total_unique_words > 0:
         accuracy_rate = round((correct_unique_words / total_unique_words) * 100, 1)
     
-    # 按难度统计
-    difficulty_stats = {}
-    
-    # 获取每个单词的最后一次正确记录
-    word_ids_dict = {}
-    for record in records.filter(is_correct=True):
-        word_ids_dict[record.word_id] = record
-    
-    # 使用最后一次正确记录进行统计
-    for record in word_ids_dict.values():
-        level = record.word.difficulty_level
-        if level not in difficulty_stats:
-            difficulty_stats[level] = {'total': 0, 'correct': 0}
-        difficulty_stats[level]['total'] += 1
-        difficulty_stats[level]['correct'] += 1
-    
-    # 计算每个难度的正确率
-    for level in difficulty_stats:
-        stats = difficulty_stats[level]
-        if stats['total'] > 0:
-            stats['accuracy_rate'] = round((stats['correct'] / stats['total']) * 100, 1)
-        else:
-            stats['accuracy_rate'] = 0.0
-    
-    context = {
-        'session': session,
-        'records': records,
+    # 所有记录，包括错误和正确的
+    record_rows = []
+    for record in records.select_related('word', 'learning_record').order_by('created_at'):
+        record_rows.append({
+            'word': record.word.word,
+            'translation': record.word.translation,
+            'difficulty_level': record.word.difficulty_level,
+            'user_answer': record.user_answer,
+            'is_correct': record.is_correct,
+            'time_taken': record.time_taken,
+            'mastery_level': record.learning_record.mastery_level if record.learning_record else None,
+        })
+    
+    return {
+        'records': record_rows,
         'accuracy_rate': accuracy_rate,
         'difficulty_stats': difficulty_stats,
-        'total_attempts': records.count(),
+        'total_attempts': total_attempts,
         'correct_unique_words': correct_unique_words,
         'total_unique_words': total_unique_words
     }
+
+def save_result_snapshot(session):
+    """保存已完成会话的结果快照，之后查看结果只需读取会话这一行，返回结果
+
+    启用延迟写入时先写入本进程缓冲区中的听写记录；其他进程的缓冲区中还有该会话的记录时
+    听写记录数与会话计数不一致，只返回当前结果不保存，之后查看结果时再补存。
+    """
+    flush_pending_answers()
+    result = session_result(session)
+    if write_behind_enabled() and result['total_attempts'] != session.correct_count + session.wrong_count:
+        return result
+    session.result_snapshot = result
+    session.save(update_fields=['result_snapshot'])
+    return result
+
+def dictation_result(request, session_id):
+    """听写结果页面"""
+    session = get_object_or_404(DictationSession.objects.select_related('word_list'), id=session_id)
+    
+    # 确保用户只能查看自己的会话结果
+    if session.user_id and session.user_id != request.user.id and request.user.is_authenticated:
+        messages.error(request, "您无权查看此听写会话的结果")
+        return redirect('dictation:home')
+    
+    if session.result_snapshot is not None:
+        result = session.result_snapshot
+    elif session.is_completed:
+        # 加入快照之前完成的会话或完成时记录尚未全部写入的会话，查看时补存
+        result = save_result_snapshot(session)
+    else:
+        flush_pending_answers()
+        result = session_result(session)
+    
+    context = {
+        'session': session,
+        **result
+    }
     return render(request, 'dictation/result.html', context)
 
 @login_required
 def progress_report(request):
     """进度报告"""
-    # 获取用户的学习记录
-    learning_records = WordLearningRecord.objects.filter(user=request.user)
-    
-    # 按掌握程度分组
+    # 掌握程度分布、今日待复习数量和复习计划从缓存的学习概要读取
+    summary = get_learning_summary(request.user)
     mastery_groups = {
-        '已掌握': learning_records.filter(mastery_level__gte=80).count(),
-        '学习中': learning_records.filter(mastery_level__lt=80, mastery_level__gte=40).count(),
-        '需加强': learning_records.filter(mastery_level__lt=40).count()
+        '已掌握': summary['mastered'],
+        '学习中': summary['learning'],
+        '需加强': summary['weak']
     }
     
     # 预处理图表数据
@@ -350,51 +404,38 @@ def progress_report(request):
         {"value": mastery_groups['需加强'], "name": "需加强", "color": "#EF4444"}
     ])
     
-    # 获取今日需要复习的单词
-    today = timezone.now().date()
-    today_reviews = learning_records.filter(next_review_date__date=today)
-    
-    # 获取活跃的复习计划
-    active_plans = ReviewPlan.objects.filter(user=request.user, is_active=True)
-    
-    # 听写记录统计
-    dictation_records = DictationRecord.objects.filter(
-        session__user=request.user,
-        learning_record__isnull=False
-    )
-    
-    # 按日期统计听写数据
-    date_stats = {}
-    for record in dictation_records:
-        date_key = record.created_at.date()
-        if date_key not in date_stats:
-            date_stats[date_key] = {'total': 0, 'correct': 0}
-        date_stats[date_key]['total'] += 1
-        if record.is_correct:
-            date_stats[date_key]['correct'] += 1
-    
-    # 转换为图表数据格式
-    chart_data = {
-        'dates': [],
-        'accuracy': [],
-        'count': []
-    }
-    
-    for date in sorted(date_stats.keys()):
-        stats = date_stats[date]
-        chart_data['dates'].append(date.strftime('%m-%d'))
-        chart_data['count'].append(stats['total'])
-        if stats['total'] > 0:
-            chart_data['accuracy'].append(round((stats['correct'] / stats['total']) * 100, 1))
-        else:
-            chart_data['accuracy'].append(0)
+    # 今日需要复习的单词列表
+    today_reviews = []
+    if summary['due_today']:
+        today_reviews = WordLearningRecord.objects.filter(
+            user=request.user,
+            next_review_date__date=timezone.localdate()
+        ).select_related('word')
     
     context = {
-        'learning_records': learning_records,
-        'mastery_groups': mastery_groups,
+        'summary': summary,
         'today_reviews': today_reviews,
-        'active_plans': active_plans,
-        'chart_data': json.dumps(chart_data),
         'mastery_chart_data': mastery_chart_data
     }
     return render(request, 'dictation/progress.html', context)
+
+@login_required
+def progress_chart(request):
+    """学习趋势图数据API，按粒度汇总并在点数过多时降采样"""
+    granularity = request.GET.get('granularity', 'auto')
+    if granularity != 'auto' and granularity not in CHART_GRANULARITIES:
+        return JsonResponse({'success': False, 'message': '不支持的时间粒度'}, status=400)
+    
+    try:
+        start = parse_date(request.GET['start']) if request.GET.get('start') else None
+        end = parse_date(request.GET['end']) if request.GET.get('end') else None
+        max_points = int(request.GET.get('points', getattr(settings, 'DICTATION_CHART_MAX_POINTS', 120)))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': '参数格式错误'}, status=400)
+    if (request.GET.get('start') and start is None) or (request.GET.get('end') and end is None):
+        return JsonResponse({'success': False, 'message': '日期格式应为YYYY-MM-DD'}, status=400)
+    max_points = min(max(max_points, CHART_MIN_POINTS), CHART_MAX_POINTS)
+    
+    series = chart_series(request.user, granularity, start, end, max_points)
+    return JsonResponse({'success': True, **series})
+
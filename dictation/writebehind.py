@@ -0,0 +1,424 @@
+import atexit
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，日志段不加锁，只支持单个进程写入同一日志目录
+    fcntl = None
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from vocabulary.models import WordLearningRecord
+from vocabulary.summary import invalidate_learning_summary
+from .models import DictationRecord, UserProgress, DailyLearningStat
+
+# 延迟写入：听写记录、用户进度、学习记录和每日统计先追加到内存缓冲区和磁盘日志，
+# 每攒够一批或每隔一段时间用bulk_create/bulk_update一次写入数据库。
+# 会话计数和队列游标决定下一个单词，仍然在提交答案时同步更新。
+#
+# 日志按段存放，每个进程同时只写一个段并持有该段的文件锁；写入数据库后删除对应的段。
+# 进程崩溃后留下的段没有进程持有锁，下次启动时重放。每个事件带唯一的event_id，
+# 已写入的事件不会重复写入。
+
+
+def write_behind_enabled():
+    return getattr(settings, 'DICTATION_WRITE_BEHIND', False)
+
+
+def make_event(kind, session, word, user, user_answer='', is_correct=False, time_taken=0):
+    """一次答题(kind='answer')或跳过(kind='skip')对应的待写入事件"""
+    return {
+        'event_id': uuid.uuid4().hex,
+        'kind': kind,
+        'session_id': session.pk,
+        'word_id': word.pk,
+        'user_id': user.pk if user.is_authenticated else None,
+        'user_answer': user_answer,
+        'is_correct': is_correct,
+        'time_taken': time_taken,
+        'created_at': timezone.now().isoformat(),
+    }
+
+
+def apply_events(events, skip_existing=False):
+    """在一个事务中把一批事件写入数据库，返回写入的事件数
+
+    skip_existing为True时先排除已经写入过的事件（重放崩溃前的日志时使用）。
+    """
+    from .services import progress_shard
+
+    if skip_existing:
+        existing = set(DictationRecord.objects.filter(
+            event_id__in=[event['event_id'] for event in events]
+        ).values_list('event_id', flat=True))
+        events = [event for event in events if event['event_id'] not in existing]
+    if not events:
+        return 0
+
+    for event in events:
+        event['created'] = datetime.fromisoformat(event['created_at'])
+
+    with transaction.atomic():
+        # 学习记录：一次读出涉及的记录，按事件顺序在内存中复习，再批量写回
+        pairs = {(event['user_id'], event['word_id']) for event in events if event['user_id']}
+        learning_records = {}
+        if pairs:
+            for record in WordLearningRecord.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, _ in pairs},
+                word_id__in={word_id for _, word_id in pairs}
+            ):
+                learning_records[(record.user_id, record.word_id)] = record
+        new_records = {}
+        changed_records = {}
+        for event in events:
+            if not event['user_id']:
+                continue
+            pair = (event['user_id'], event['word_id'])
+            record = learning_records.get(pair)
+            if record is None:
+                record = learning_records[pair] = new_records[pair] = WordLearningRecord(
+                    user_id=event['user_id'], word_id=event['word_id'], next_review_date=event['created']
+                )
+            # 跳过不影响掌握程度，只确保有学习记录
+            if event['kind'] == 'answer':
+                record.apply_review(event['is_correct'], now=event['created'])
+                record.last_review_date = event['created']
+                if pair not in new_records:
+                    changed_records[pair] = record
+        if new_records:
+            WordLearningRecord.objects.bulk_create(new_records.values())
+            # 部分数据库不返回批量插入的ID，重新读取
+            if any(record.pk is None for record in new_records.values()):
+                for record in WordLearningRecord.objects.filter(
+                    user_id__in={user_id for user_id, _ in new_records},
+                    word_id__in={word_id for _, word_id in new_records}
+                ):
+                    if (record.user_id, record.word_id) in new_records:
+                        learning_records[(record.user_id, record.word_id)] = record
+        if changed_records:
+            WordLearningRecord.objects.bulk_update(
+                changed_records.values(), ['mastery_level', 'review_count', 'next_review_date', 'last_review_date']
+            )
+        invalidate_learning_summary(*{user_id for user_id, _ in pairs})
+
+        # 用户进度：按用户和单词汇总次数，每组累加到随机的一个分片
+        attempts = {}
+        for event in events:
+            if event['kind'] != 'answer':
+                continue
+            key = (event['word_id'], event['user_id'])
+            total, correct, last = attempts.get(key, (0, 0, event['created']))
+            attempts[key] = (total + 1, correct + int(event['is_correct']), max(last, event['created']))
+        if attempts:
+            shards = {key: progress_shard() for key in attempts}
+            condition = Q()
+            for (word_id, user_id), shard in shards.items():
+                condition |= Q(word_id=word_id, user_id=user_id, shard=shard)
+            progresses = {
+                (progress.word_id, progress.user_id): progress
+                for progress in UserProgress.objects.select_for_update().filter(condition)
+            }
+            new_progresses = []
+            for key, (total, correct, last) in attempts.items():
+                progress = progresses.get(key)
+                if progress is None:
+                    progress = UserProgress(word_id=key[0], user_id=key[1], shard=shards[key], last_practiced=last)
+                    new_progresses.append(progress)
+                progress.total_attempts += total
+                progress.correct_attempts += correct
+                progress.last_practiced = max(progress.last_practiced, last)
+            UserProgress.objects.bulk_create(new_progresses)
+            if progresses:
+                UserProgress.objects.bulk_update(
+                    progresses.values(), ['total_attempts', 'correct_attempts', 'last_practiced']
+                )
+
+        # 每日统计：按用户和本地日期汇总
+        daily = {}
+        for event in events:
+            if not event['user_id']:
+                continue
+            key = (event['user_id'], timezone.localdate(event['created']))
+            attempts, correct, total_time = daily.get(key, (0, 0, 0))
+            daily[key] = (attempts + 1, correct + int(event['is_correct']), total_time + event['time_taken'])
+        if daily:
+            condition = Q()
+            for user_id, date in daily:
+                condition |= Q(user_id=user_id, date=date)
+            stats = {
+                (stat.user_id, stat.date): stat
+                for stat in DailyLearningStat.objects.select_for_update().filter(condition)
+            }
+            new_stats = []
+            for key, (attempts, correct, total_time) in daily.items():
+                stat = stats.get(key)
+                if stat is None:
+                    stat = DailyLearningStat(user_id=key[0], date=key[1])
+                    new_stats.append(stat)
+                stat.attempts += attempts
+                stat.correct += correct
+                stat.total_time += total_time
+            DailyLearningStat.objects.bulk_create(new_stats)
+            if stats:
+                DailyLearningStat.objects.bulk_update(stats.values(), ['attempts', 'correct', 'total_time'])
+
+        DictationRecord.objects.bulk_create([
+            DictationRecord(
+                session_id=event['session_id'],
+                word_id=event['word_id'],
+                user_answer=event['user_answer'] if event['kind'] == 'answer' else '[已跳过]',
+                is_correct=event['is_correct'],
+                time_taken=event['time_taken'],
+                created_at=event['created'],
+                learning_record=learning_records.get((event['user_id'], event['word_id'])),
+                event_id=event['event_id'],
+            )
+            for event in events
+        ], batch_size=500)
+    return len(events)
+
+
+def read_segment(path):
+    """读取一个日志段，忽略崩溃时写了一半的最后一行"""
+    events = []
+    with open(path, encoding='utf-8') as segment:
+        for line in segment:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                continue
+    return events
+
+
+def remove_segment(path, segment):
+    """删除已写入数据库的日志段
+
+    有fcntl时先删除再关闭，删除前一直持有锁，其他进程不会重放；
+    没有fcntl时打开的文件在Windows下不能删除，先关闭再删除。
+    """
+    if fcntl is None:
+        segment.close()
+        os.remove(path)
+    else:
+        os.remove(path)
+        segment.close()
+
+
+def recover_journal(journal_dir):
+    """重放没有进程持有的日志段，返回写入的事件数"""
+    recovered = 0
+    if not os.path.isdir(journal_dir):
+        return recovered
+    for name in sorted(os.listdir(journal_dir)):
+        if not name.endswith('.log'):
+            continue
+        path = os.path.join(journal_dir, name)
+        try:
+            segment = open(path, 'a')
+        except FileNotFoundError:
+            continue
+        with segment:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # 仍有进程在写入
+                    continue
+            if not os.path.exists(path):
+                # 拿到锁之前已被其他进程重放并删除
+                continue
+            try:
+                recovered += apply_events(read_segment(path), skip_existing=True)
+            except Exception as e:
+                print(f"重放听写日志失败: {path}, 错误: {str(e)}")
+                continue
+            remove_segment(path, segment)
+    return recovered
+
+
+class AnswerBuffer:
+    """进程内的答题写入缓冲区
+
+    append先把事件写入磁盘日志再放入内存，后台线程每攒够batch_size个事件
+    或每隔interval秒调用flush批量写入数据库。写入失败的事件留在缓冲区，下次重试。
+    """
+
+    def __init__(self, journal_dir, batch_size=100, interval=0.2, fsync=False):
+        self.journal_dir = str(journal_dir)
+        self.batch_size = batch_size
+        self.interval = interval
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._events = []
+        # 已换下但事件尚未写入数据库的日志段，(路径, 文件)
+        self._segments = []
+        self._journal = None
+        self._journal_path = None
+        # 当前日志段中的事件数
+        self._journal_events = 0
+        self._thread = None
+        self._closed = False
+        self.appended = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def start(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        recovered = recover_journal(self.journal_dir)
+        if recovered:
+            print(f"已重放崩溃前未写入的听写记录: {recovered}条")
+        with self._lock:
+            self._journal, self._journal_path = self._open_segment()
+        self._thread = threading.Thread(target=self._run, name='dictation-write-behind', daemon=True)
+        self._thread.start()
+        return self
+
+    def _open_segment(self):
+        # 先用临时文件名加锁再改名，重放时不会误把刚创建的段当作遗留的段
+        name = f'{os.getpid()}-{uuid.uuid4().hex}'
+        path = os.path.join(self.journal_dir, name + '.log')
+        if fcntl is None:
+            return open(path, 'a', encoding='utf-8'), path
+        temp_path = os.path.join(self.journal_dir, name + '.tmp')
+        journal = open(temp_path, 'a', encoding='utf-8')
+        fcntl.flock(journal, fcntl.LOCK_EX)
+        os.rename(temp_path, path)
+        return journal, path
+
+    def append(self, event):
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('听写写入缓冲区已关闭')
+            self._journal.write(line)
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._events.append(event)
+            self._journal_events += 1
+            self.appended += 1
+            if len(self._events) >= self.batch_size:
+                self._ready.notify()
+
+    def flush(self):
+        """把缓冲区中的事件写入数据库，返回写入的事件数"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._events:
+                    return 0
+                events, self._events = self._events, []
+                # 换一个新的日志段，旧段在事件写入数据库后删除（重试时当前段可能是空的，不用换）
+                if self._journal_events:
+                    self._segments.append((self._journal_path, self._journal))
+                    self._journal, self._journal_path = self._open_segment()
+                    self._journal_events = 0
+                segments, self._segments = self._segments, []
+            try:
+                apply_events(events)
+            except Exception as e:
+                print(f"批量写入听写记录失败，稍后重试: {len(events)}条, 错误: {str(e)}")
+                with self._lock:
+                    self._events[:0] = events
+                    self._segments[:0] = segments
+                    self.failures += 1
+                return 0
+            for path, segment in segments:
+                remove_segment(path, segment)
+            with self._lock:
+                self.flushed += len(events)
+                self.flushes += 1
+            return len(events)
+
+    def _run(self):
+        while True:
+            with self._ready:
+                if not self._closed and len(self._events) < self.batch_size:
+                    self._ready.wait(self.interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"听写写入线程异常: {str(e)}")
+
+    def close(self):
+        """停止后台线程并写入剩余事件；写入失败的事件留在日志中，下次启动时重放"""
+        with self._ready:
+            if self._closed:
+                return
+            self._closed = True
+            self._ready.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                if self._events:
+                    self._journal.close()
+                else:
+                    remove_segment(self._journal_path, self._journal)
+                self._journal = self._journal_path = None
+            for path, segment in self._segments:
+                segment.close()
+            self._segments = []
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._events),
+                'appended': self.appended,
+                'flushed': self.flushed,
+                'flushes': self.flushes,
+                'failures': self.failures,
+            }
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_answer_buffer():
+    """获取全局写入缓冲区，第一次使用时重放崩溃前遗留的日志"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = AnswerBuffer(
+                    getattr(settings, 'DICTATION_WRITE_BEHIND_JOURNAL_DIR', settings.BASE_DIR / 'answer_journal'),
+                    batch_size=getattr(settings, 'DICTATION_WRITE_BEHIND_BATCH_SIZE', 100),
+                    interval=getattr(settings, 'DICTATION_WRITE_BEHIND_INTERVAL_MS', 200) / 1000,
+                    fsync=getattr(settings, 'DICTATION_WRITE_BEHIND_FSYNC', False),
+                ).start()
+    return _buffer
+
+
+def shutdown_answer_buffer():
+    """关闭全局写入缓冲区（进程退出时自动调用）"""
+    global _buffer
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.close()
+            _buffer = None
+
+
+atexit.register(shutdown_answer_buffer)
+
+
+def buffer_event(event):
+    """事务提交后把事件放入写入缓冲区，事务回滚时不写入"""
+    transaction.on_commit(lambda: get_answer_buffer().append(event))
+
+
+def flush_pending_answers():
+    """立即写入本进程缓冲区中的事件，需要读取完整听写记录前调用"""
+    if write_behind_enabled() and _buffer is not None:
+        _buffer.flush()
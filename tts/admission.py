@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+
+class AdmissionRejected(Exception):
+    """请求未被接纳：429表示单个客户端超出频率限制，503表示服务整体繁忙"""
+
+    def __init__(self, status, retry_after, message):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.message = message
+
+
+class TokenBucket:
+    """令牌桶：平均每秒rate个请求，最多允许burst个突发请求"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self):
+        """取一个令牌，成功返回0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class AdmissionController:
+    """限制同时进行的音频合成数量
+
+    超出并发上限的请求进入先进先出的等待队列；队列已满、预计等待时间超过期限
+    或实际等待超时的请求立即返回503，不会无限排队。名额只由真正调用引擎的请求申请，
+    每个客户端需要合成的请求另由令牌桶限制频率。
+    """
+
+    def __init__(self, max_concurrent=8, max_waiting=32, wait_timeout=3, client_rate=2, client_burst=20, max_clients=10000):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._buckets = OrderedDict()
+        # 单次合成占用时间的指数移动平均，用于估算排队时间
+        self._service_time = None
+        self.active = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_rate_limit = 0
+        self.rejected_queue_full = 0
+        self.shed_deadline = 0
+
+    def _bucket(self, client_id):
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            bucket = self._buckets[client_id] = TokenBucket(self.client_rate, self.client_burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client_id)
+        return bucket
+
+    def _estimated_wait(self, position):
+        """排在第position位的请求预计需要等待的秒数"""
+        if self._service_time is None:
+            return 0
+        return math.ceil(position / self.max_concurrent) * self._service_time
+
+    def _busy(self, retry_after):
+        return AdmissionRejected(503, retry_after, '语音服务繁忙，请稍后重试')
+
+    def check_rate(self, client_id):
+        """客户端的请求需要合成音频时取一个令牌，超出频率限制抛出AdmissionRejected(429)"""
+        with self._lock:
+            wait = self._bucket(client_id).take()
+            if wait:
+                self.rejected_rate_limit += 1
+                raise AdmissionRejected(429, wait, '请求过于频繁，请稍后重试')
+
+    def acquire(self):
+        """申请一个合成名额，未被接纳时抛出AdmissionRejected(503)；返回开始时间供release使用
+
+        只在真正调用引擎前申请，被合并的重复请求不占用名额和等待队列。
+        """
+        with self._lock:
+            if self.active < self.max_concurrent and not self._waiters:
+                self.active += 1
+                self.admitted += 1
+                return time.monotonic()
+
+            position = len(self._waiters) + 1
+            estimated = self._estimated_wait(position)
+            if position > self.max_waiting:
+                self.rejected_queue_full += 1
+                raise self._busy(estimated or self.wait_timeout)
+            if estimated > self.wait_timeout:
+                # 预计等不到期限内，直接拒绝，不占用等待队列
+                self.shed_deadline += 1
+                raise self._busy(estimated)
+
+            event = threading.Event()
+            self._waiters.append(event)
+            self.queued += 1
+
+        if not event.wait(self.wait_timeout):
+            with self._lock:
+                # 超时的同时可能刚好拿到名额
+                if not event.is_set():
+                    self._waiters.remove(event)
+                    self.shed_deadline += 1
+                    raise self._busy(self._estimated_wait(len(self._waiters) + 1) or self.wait_timeout)
+        return time.monotonic()
+
+    def release(self, started):
+        """归还名额，有等待的请求时直接转交给队首"""
+        with self._lock:
+            elapsed = time.monotonic() - started
+            if self._service_time is None:
+                self._service_time = elapsed
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+
+            if self._waiters:
+                self._waiters.popleft().set()
+                self.admitted += 1
+            else:
+                self.active -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_waiting': self.max_waiting,
+                'active': self.active,
+                'waiting': len(self._waiters),
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'rejected_rate_limit': self.rejected_rate_limit,
+                'rejected_queue_full': self.rejected_queue_full,
+                'shed_deadline': self.shed_deadline,
+                'avg_service_ms': round(self._service_time * 1000, 1) if self._service_time is not None else None,
+            }
+
+
+def get_client_id(request):
+    """登录用户按用户ID限流，匿名用户按IP"""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """获取全局准入控制器"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    max_concurrent=getattr(settings, 'TTS_ADMISSION_MAX_CONCURRENT', 8),
+                    max_waiting=getattr(settings, 'TTS_ADMISSION_MAX_WAITING', 32),
+                    wait_timeout=getattr(settings, 'TTS_ADMISSION_WAIT_SECONDS', 3),
+                    client_rate=getattr(settings, 'TTS_ADMISSION_CLIENT_RATE', 2),
+                    client_burst=getattr(settings, 'TTS_ADMISSION_CLIENT_BURST', 20),
+                )
+    return _controller
@@ -0,0 +1,71 @@
+import hashlib
+import json
+
+from .cache import get_audio_cache, make_cache_key
+
+
+def index_key_for(bundle_key):
+    """音频包索引在缓存中的键"""
+    return hashlib.sha256(f'{bundle_key}:index'.encode('utf-8')).hexdigest()
+
+
+def load_bundle_index(bundle_key):
+    """读取已生成的音频包索引，不存在返回None"""
+    index_data = get_audio_cache().read(index_key_for(bundle_key))
+    if index_data is None:
+        return None
+    return json.loads(index_data)
+
+
+def build_bundle(words, voice_key, engine, speed, content_type):
+    """把词书中所有单词的音频拼接成一个音频包
+
+    words为(单词ID, 单词)列表。这里不调用引擎：有单词音频尚未缓存时返回(None, 缺少的文本列表)，
+    由调用方排队预生成，全部缓存后才拼接并保存，不保存不完整的音频包。
+    音频包的键是拼接后内容的哈希，URL和ETag始终对应同一份内容；索引按各段缓存键保存，
+    词书内容或发音设置不变时直接复用已生成的音频包。
+    返回(索引, [])。
+    """
+    cache = get_audio_cache()
+    items = []
+    for word_id, text in words:
+        text = (text or '').strip()
+        if text:
+            items.append((word_id, text, make_cache_key(text, voice_key, engine, speed)))
+
+    manifest_key = hashlib.sha256(
+        ('bundle:' + ','.join(item[2] for item in items)).encode('utf-8')
+    ).hexdigest()
+    index = load_bundle_index(manifest_key)
+    if index is not None and cache.contains(index['bundle_key']):
+        return index, []
+
+    # 拼接音频并记录每个单词的偏移量和长度
+    parts = []
+    segments = []
+    missing = []
+    offset = 0
+    for word_id, text, cache_key in items:
+        audio_data = cache.read(cache_key)
+        if not audio_data:
+            missing.append(text)
+            continue
+        segments.append({'word_id': word_id, 'text': text, 'offset': offset, 'length': len(audio_data)})
+        parts.append(audio_data)
+        offset += len(audio_data)
+    if missing:
+        return None, missing
+
+    bundle_data = b''.join(parts)
+    index = {
+        'bundle_key': hashlib.sha256(bundle_data).hexdigest(),
+        'content_type': content_type,
+        'size': offset,
+        'segments': segments,
+    }
+    if parts:
+        index_data = json.dumps(index, ensure_ascii=False).encode('utf-8')
+        cache.put(index['bundle_key'], bundle_data)
+        cache.put(index_key_for(index['bundle_key']), index_data)
+        cache.put(index_key_for(manifest_key), index_data)
+    return index, []
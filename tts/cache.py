@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+# 缓存格式版本，修改音频生成方式后递增即可让旧缓存失效
+CACHE_VERSION = 1
+
+
+def make_cache_key(text, voice_key, engine, speed):
+    """根据(文本, 语音, 引擎, 语速)计算缓存键"""
+    raw = json.dumps(
+        [CACHE_VERSION, text, voice_key, engine, round(float(speed), 2)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """按内容寻址的磁盘音频缓存，超出容量时按最近访问时间(LRU)淘汰"""
+
+    def __init__(self, root, max_bytes):
+        self.root = str(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        self._evicting = False
+        self._lock = threading.Lock()
+
+    @property
+    def lock_dir(self):
+        return os.path.join(self.root, '.locks')
+
+    def path_for(self, key):
+        """两级分片目录，避免单个目录下文件过多"""
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def open(self, key):
+        """命中时返回打开的文件对象，未命中返回None"""
+        path = self.path_for(key)
+        try:
+            audio_file = open(path, 'rb')
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # 更新修改时间，作为LRU的访问时间
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return audio_file
+
+    def read(self, key):
+        """读取缓存内容（不计入命中统计），未缓存返回None"""
+        try:
+            with open(self.path_for(key), 'rb') as audio_file:
+                return audio_file.read()
+        except FileNotFoundError:
+            return None
+
+    def contains(self, key):
+        """检查是否已缓存（不计入命中统计）"""
+        return os.path.exists(self.path_for(key))
+
+    def put(self, key, data):
+        """写入缓存，先写临时文件再原子替换，避免读到半个文件"""
+        writer = self.writer(key)
+        try:
+            writer.write(data)
+            return writer.commit()
+        except Exception:
+            writer.abort()
+            raise
+
+    def writer(self, key):
+        """逐块写入一个缓存项，用于边生成边返回的流式响应"""
+        return CacheWriter(self, key)
+
+    def _added(self, delta):
+        """写入后累加缓存大小，超出上限时淘汰"""
+        with self._lock:
+            if self._size is not None:
+                self._size += delta
+        if self._size is None:
+            # 第一次写入时扫描目录得到当前大小，扫描不占用锁
+            size = self._scan_size()
+            with self._lock:
+                if self._size is None:
+                    self._size = size
+        with self._lock:
+            evict = self._size > self.max_bytes and not self._evicting
+            if evict:
+                self._evicting = True
+        if evict:
+            try:
+                self._evict()
+            finally:
+                with self._lock:
+                    self._evicting = False
+
+    def _iter_entries(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            # 跳过锁文件等隐藏目录
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            for filename in filenames:
+                if filename.endswith('.tmp') or filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat
+
+    def _scan_size(self):
+        return sum(stat.st_size for path, stat in self._iter_entries())
+
+    def _evict(self):
+        """删除最久未访问的文件，直到容量降到上限的90%
+
+        遍历目录和删除文件都不占用锁，同一时间只有一个线程在淘汰。
+        """
+        entries = sorted(self._iter_entries(), key=lambda entry: entry[1].st_mtime)
+        size = sum(stat.st_size for path, stat in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = evictions = 0
+        for path, stat in entries:
+            if size <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            size -= stat.st_size
+            removed += stat.st_size
+            evictions += 1
+        with self._lock:
+            self._size = max(0, self._size - removed)
+            self.evictions += evictions
+
+    def stats(self):
+        """缓存命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0,
+                'evictions': self.evictions,
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+class CacheWriter:
+    """写入临时文件，commit时原子替换为缓存文件，abort时删除临时文件"""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.path = cache.path_for(key)
+        shard_dir = os.path.dirname(self.path)
+        os.makedirs(shard_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=shard_dir, suffix='.tmp')
+        self.file = os.fdopen(fd, 'wb')
+        self.size = 0
+        self.finished = False
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        """替换缓存文件并返回路径，覆盖已有文件时只累加大小的差值"""
+        self.finished = True
+        self.file.close()
+        try:
+            old_size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            old_size = 0
+        try:
+            os.replace(self.temp_path, self.path)
+        except Exception:
+            self._remove_temp()
+            raise
+        self.cache._added(self.size - old_size)
+        return self.path
+
+    def abort(self):
+        """丢弃已写入的数据，已提交时不做任何事"""
+        if self.finished:
+            return
+        self.finished = True
+        self.file.close()
+        self._remove_temp()
+
+    def _remove_temp(self):
+        try:
+            os.unlink(self.temp_path)
+        except OSError:
+            pass
+
+
+_audio_cache = None
+_audio_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """获取全局音频缓存实例"""
+    global _audio_cache
+    if _audio_cache is None:
+        with _audio_cache_lock:
+            if _audio_cache is None:
+                _audio_cache = AudioCache(
+                    getattr(settings, 'TTS_CACHE_DIR', settings.BASE_DIR / 'tts_cache'),
+                    getattr(settings, 'TTS_CACHE_MAX_BYTES', 512 * 1024 * 1024),
+                )
+    return _audio_cache
@@ -0,0 +1,72 @@
+import re
+
+from django.conf import settings
+
+# 句末标点：英文标点后必须有空白，避免拆开缩写和小数；中文标点后直接拆分
+SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?;])\s+|(?<=[。！？；])')
+# 分句标点
+CLAUSE_BOUNDARY_RE = re.compile(r'(?<=[,:])\s+|(?<=[，：、])')
+
+# 以句点结尾但不表示句子结束的常见缩写
+ABBREVIATIONS = {'mr.', 'mrs.', 'ms.', 'dr.', 'st.', 'vs.', 'etc.', 'e.g.', 'i.e.'}
+
+
+def split_sentences(text):
+    """按句末标点拆分，缩写后的句点不拆"""
+    sentences = []
+    for piece in SENTENCE_BOUNDARY_RE.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        if sentences and sentences[-1].split()[-1].lower() in ABBREVIATIONS:
+            sentences[-1] = f'{sentences[-1]} {piece}'
+        else:
+            sentences.append(piece)
+    return sentences
+
+
+def pack(pieces, max_chars):
+    """把相邻的小段合并，每段尽量接近但不超过max_chars"""
+    packed = []
+    current = ''
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            packed.append(current)
+            current = piece
+        else:
+            current = f'{current} {piece}' if current else piece
+    if current:
+        packed.append(current)
+    return packed
+
+
+def split_text(text, min_chars=None, max_chars=None):
+    """把较长的文本按句子拆分，超长的句子再按分句和空白拆分
+
+    文本不超过min_chars时原样返回一段。每个句子单独成段（不合并相邻的短句），
+    这样不同文本中相同的句子也能命中同一个缓存项。
+    """
+    if min_chars is None:
+        min_chars = getattr(settings, 'TTS_CHUNK_MIN_CHARS', 60)
+    if max_chars is None:
+        max_chars = getattr(settings, 'TTS_CHUNK_MAX_CHARS', 200)
+
+    text = text.strip()
+    if len(text) <= min_chars:
+        return [text]
+
+    chunks = []
+    for sentence in split_sentences(text):
+        if len(sentence) <= max_chars:
+            chunks.append(sentence)
+            continue
+        # 超长的句子按分句合并成不超过max_chars的段，单个分句仍然过长时按空白切分
+        clauses = []
+        for clause in CLAUSE_BOUNDARY_RE.split(sentence):
+            clause = clause.strip()
+            if len(clause) > max_chars:
+                clauses.extend(pack(clause.split(), max_chars))
+            elif clause:
+                clauses.append(clause)
+        chunks.extend(pack(clauses, max_chars))
+    return chunks or [text]
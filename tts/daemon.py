@@ -0,0 +1,195 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+
+from .cache import get_audio_cache, make_cache_key
+
+
+class SynthesisPending(Exception):
+    """音频仍在合成服务中生成，稍后再取"""
+
+
+class SynthesisBusy(Exception):
+    """合成服务队列已满，任务未被接受"""
+
+
+class SynthesisUnavailable(Exception):
+    """无法连接合成服务（未启动或中途退出）"""
+
+
+def get_daemon_address():
+    """合成服务地址：字符串为Unix套接字路径，列表/元组为(主机, 端口)"""
+    address = getattr(settings, 'TTS_DAEMON_ADDRESS', None)
+    if isinstance(address, list):
+        address = tuple(address)
+    return address
+
+
+def get_authkey():
+    return hashlib.sha256(('tts-daemon:' + settings.SECRET_KEY).encode('utf-8')).digest()
+
+
+class SynthesisDaemon:
+    """独立的音频合成服务进程，负责调用TTS引擎并限制并发
+
+    Django进程只提交任务并等待结果，生成的音频写入共享的磁盘缓存。
+    每个连接一个处理线程，线程数最多max_queue个，超出的连接直接返回繁忙。
+    """
+
+    def __init__(self, address, concurrency=4, max_queue=200):
+        self.address = address
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='tts-daemon')
+        self._connections = threading.BoundedSemaphore(max_queue)
+        self._listener = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def stats(self):
+        from .engines import engine_registry
+
+        with self._lock:
+            return {
+                'engines': engine_registry.stats(),
+                'concurrency': self.concurrency,
+                'max_queue': self.max_queue,
+                'queued': self.queued,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+            }
+
+    def _render(self, job):
+        from . import views
+
+        cache = get_audio_cache()
+        cache_key = make_cache_key(job['text'], job['voice'], job['engine'], job['speed'])
+        try:
+            _, engine_used = views.synthesize_cached(
+                job['text'], job['voice'], job['engine'], job['speed'], cache, cache_key,
+                fallback=job.get('fallback', False),
+            )
+            with self._lock:
+                self.completed += 1
+            # 降级时音频写入实际引擎的缓存键
+            if engine_used != job['engine']:
+                cache_key = make_cache_key(job['text'], job['voice'], engine_used, job['speed'])
+            return {'ok': True, 'cache_key': cache_key, 'engine': engine_used}
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            return {'ok': False, 'error': str(e)}
+        finally:
+            with self._lock:
+                self.queued -= 1
+
+    def _handle(self, conn):
+        try:
+            request = conn.recv()
+            if request.get('op') == 'stats':
+                conn.send(self.stats())
+                return
+
+            with self._lock:
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    conn.send({'ok': False, 'busy': True, 'error': '合成服务繁忙'})
+                    return
+                self.queued += 1
+
+            # 客户端超时断开后任务仍会继续执行，结果写入缓存供之后读取
+            result = self._executor.submit(self._render, request).result()
+            conn.send(result)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            self._connections.release()
+
+    def _reject(self, conn):
+        """处理线程已满时直接返回繁忙
+
+        客户端连接后立即发送请求，短暂等待读取请求后再回复，避免客户端发送时连接已关闭。
+        """
+        with self._lock:
+            self.rejected += 1
+        try:
+            if conn.poll(0.05):
+                conn.recv()
+            conn.send({'ok': False, 'busy': True, 'error': '合成服务繁忙'})
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        with Listener(self.address, authkey=get_authkey()) as listener:
+            self._listener = listener
+            while not self._closed:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    if self._closed:
+                        break
+                    print(f"合成服务接受连接失败: {str(e)}")
+                    continue
+                if not self._connections.acquire(blocking=False):
+                    self._reject(conn)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def close(self):
+        """停止接受新连接"""
+        self._closed = True
+        if self._listener is not None:
+            self._listener.close()
+
+
+def request_synthesis(text, voice_key, engine, speed, timeout, fallback=False):
+    """把任务提交给合成服务并最多等待timeout秒
+
+    完成时返回(缓存键, 实际使用的引擎名)；超时抛出SynthesisPending（任务仍在后台继续）；
+    队列已满抛出SynthesisBusy；无法连接合成服务抛出SynthesisUnavailable；生成失败抛出异常。
+    """
+    try:
+        conn = Client(get_daemon_address(), authkey=get_authkey())
+    except OSError as e:
+        raise SynthesisUnavailable(str(e)) from e
+    try:
+        try:
+            conn.send({'text': text, 'voice': voice_key, 'engine': engine, 'speed': speed, 'fallback': fallback})
+        except OSError:
+            # 合成服务繁忙时可能已回复并关闭连接，仍然读取回复
+            pass
+        if not conn.poll(timeout):
+            raise SynthesisPending()
+        result = conn.recv()
+    except (EOFError, OSError) as e:
+        # 合成服务在处理过程中退出
+        raise SynthesisUnavailable(str(e) or type(e).__name__) from e
+    finally:
+        conn.close()
+
+    if result.get('busy'):
+        raise SynthesisBusy(result['error'])
+    if not result['ok']:
+        raise Exception(result['error'])
+    return result['cache_key'], result['engine']
+
+
+def daemon_stats():
+    """读取合成服务的队列统计"""
+    conn = Client(get_daemon_address(), authkey=get_authkey())
+    try:
+        conn.send({'op': 'stats'})
+        return conn.recv()
+    finally:
+        conn.close()
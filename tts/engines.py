@@ -0,0 +1,458 @@
+import asyncio
+import hashlib
+import io
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .offline import get_offline_pool
+
+# 可用的Edge TTS语音列表
+VOICE_OPTIONS = {
+    'en-US-female': 'en-US-JennyNeural',
+    'en-US-male': 'en-US-GuyNeural',
+    'en-GB-female': 'en-GB-SoniaNeural',
+    'en-GB-male': 'en-GB-RyanNeural',
+    'zh-CN-female': 'zh-CN-XiaoxiaoNeural',
+    'zh-CN-male': 'zh-CN-YunjianNeural',
+}
+
+# 可用的gTTS语言映射
+GTTS_LANG_MAP = {
+    'en-US-female': 'en',
+    'en-US-male': 'en',
+    'en-GB-female': 'en-uk',
+    'en-GB-male': 'en-uk',
+    'zh-CN-female': 'zh-cn',
+    'zh-CN-male': 'zh-cn',
+}
+
+
+def create_communicate(text, voice, speed=1.0):
+    """创建Edge TTS会话对象"""
+    # 第一次使用时才导入，避免每个进程启动时都加载
+    import edge_tts
+    
+    # 调整语速参数
+    if speed != 1.0:
+        voice_with_speed = f"{voice}<prosody rate='{speed}'>"
+        text_with_speed = f"{text}</prosody>"
+    else:
+        voice_with_speed = voice
+        text_with_speed = text
+        
+    return edge_tts.Communicate(text_with_speed, voice_with_speed)
+
+
+async def generate_audio(text, voice, speed=1.0):
+    """使用Edge TTS生成音频数据（直接在内存中拼接，不落盘）"""
+    communicate = create_communicate(text, voice, speed)
+    
+    chunks = []
+    async for chunk in communicate.stream():
+        if chunk['type'] == 'audio' and chunk['data']:
+            chunks.append(chunk['data'])
+    
+    return b''.join(chunks)
+
+
+def stream_audio(text, voice, speed=1.0):
+    """边生成边返回Edge TTS音频数据块"""
+    communicate = create_communicate(text, voice, speed)
+    stream = communicate.stream()
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                chunk = loop.run_until_complete(stream.__anext__())
+            except StopAsyncIteration:
+                break
+            if chunk['type'] == 'audio' and chunk['data']:
+                yield chunk['data']
+    finally:
+        loop.run_until_complete(stream.aclose())
+        loop.close()
+
+
+def generate_audio_pyttsx3(text, voice_type):
+    """使用pyttsx3生成音频数据
+
+    引擎在常驻的工作进程中只初始化一次，声音ID解析后缓存，不需要网络。
+    """
+    return get_offline_pool().synthesize(text, voice_type)
+
+
+def generate_audio_gtts(text, voice_type, speed=1.0):
+    """使用Google TTS生成音频数据（通过write_to_fp写入内存缓冲区）"""
+    from gtts import gTTS
+    
+    # 获取对应的语言代码
+    lang = GTTS_LANG_MAP.get(voice_type, 'en')
+    
+    try:
+        # 检查文本是否为空
+        if not text or text.strip() == '':
+            raise ValueError("文本内容不能为空")
+        
+        # 生成音频文件
+        # gTTS不直接支持速度调整，但可以设置slow参数
+        slow = False
+        if speed < 0.8:
+            slow = True
+        
+        # 添加重试机制
+        max_retries = 3
+        retry_count = 0
+        
+        while retry_count < max_retries:
+            try:
+                buffer = io.BytesIO()
+                tts = gTTS(text=text, lang=lang, slow=slow)
+                tts.write_to_fp(buffer)
+                
+                # 验证音频是否生成成功并且大小合理
+                if buffer.tell() > 100:  # 确保音频大小至少100字节
+                    return buffer.getvalue()
+                
+                print(f"音频生成失败或大小异常, 大小: {buffer.tell()} 字节")
+                retry_count += 1
+                time.sleep(0.5)  # 等待500毫秒后重试
+            except Exception as e:
+                print(f"gTTS生成音频失败 (尝试 {retry_count+1}/{max_retries}): {str(e)}")
+                retry_count += 1
+                if retry_count >= max_retries:
+                    raise Exception(f"gTTS生成音频失败，已重试{max_retries}次: {str(e)}")
+                time.sleep(0.5)  # 等待500毫秒后重试
+        
+        raise Exception("音频文件生成失败，已达到最大重试次数")
+    except Exception as e:
+        print(f"生成音频文件时出错: {str(e)}")
+        raise e
+
+
+def generate_audio_fake(text, voice_type, speed=1.0):
+    """模拟引擎：按配置的延迟返回确定的音频数据，用于本地压测
+
+    TTS_FAKE_ENGINE_FAILURE_RATE大于0时按文本哈希确定哪些文本生成失败，
+    相同参数的多次压测结果可以直接比较。
+    """
+    time.sleep(getattr(settings, 'TTS_FAKE_ENGINE_LATENCY', 0.2))
+    digest = hashlib.sha256(f'{text}|{voice_type}|{speed}'.encode('utf-8')).digest()
+    if int.from_bytes(digest[:4], 'big') / 2 ** 32 < getattr(settings, 'TTS_FAKE_ENGINE_FAILURE_RATE', 0):
+        raise Exception("模拟引擎生成失败")
+    return b'ID3' + digest * 64
+
+
+class CircuitBreaker:
+    """引擎熔断器
+
+    连续失败达到阈值后熔断，熔断期间直接跳过该引擎；
+    超过恢复时间后只放行一个探测请求，成功则恢复，失败则继续熔断。
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half_open'
+
+    def allow(self):
+        """是否可以调用该引擎（半开状态下只放行一个探测请求）"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {'state': self.state, 'failures': self.failures}
+
+
+class LatencyTracker:
+    """记录最近若干次成功调用的耗时，计算p50/p95"""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percent / 100))
+        return samples[index]
+
+    def stats(self):
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        return {
+            'samples': len(self._samples),
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class TTSEngine:
+    """TTS引擎基类
+
+    offline为True的引擎不依赖网络，作为最后的降级选项；
+    fallback为False的引擎不参与降级，也不会被选作其他引擎的替代。
+    """
+
+    name = None
+    content_type = 'audio/mpeg'
+    offline = False
+    fallback = True
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(
+            getattr(settings, 'TTS_CIRCUIT_FAILURE_THRESHOLD', 3),
+            getattr(settings, 'TTS_CIRCUIT_RESET_SECONDS', 30),
+        )
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.failures = 0
+
+    def synthesize(self, text, voice_key, speed=1.0):
+        raise NotImplementedError
+
+    def synthesize_many(self, texts, voice_key, speed=1.0):
+        """并发生成多段音频，按顺序返回（默认使用线程池）"""
+        if len(texts) == 1:
+            return [self.synthesize(texts[0], voice_key, speed)]
+        workers = min(len(texts), getattr(settings, 'TTS_CHUNK_WORKERS', 4))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda text: self.synthesize(text, voice_key, speed), texts))
+
+    def stats(self):
+        return {
+            'content_type': self.content_type,
+            'offline': self.offline,
+            'calls': self.calls,
+            'failures': self.failures,
+            'circuit': self.breaker.stats(),
+            'latency': self.latency.stats(),
+        }
+
+
+class EdgeTTSEngine(TTSEngine):
+    name = 'edge-tts'
+
+    def synthesize(self, text, voice_key, speed=1.0):
+        return asyncio.run(generate_audio(text, VOICE_OPTIONS[voice_key], speed))
+
+    def synthesize_many(self, texts, voice_key, speed=1.0):
+        """在同一个事件循环中用asyncio.gather并发生成多段音频"""
+        voice = VOICE_OPTIONS[voice_key]
+        workers = getattr(settings, 'TTS_CHUNK_WORKERS', 4)
+
+        async def run():
+            semaphore = asyncio.Semaphore(workers)
+
+            async def generate(text):
+                async with semaphore:
+                    return await generate_audio(text, voice, speed)
+
+            return await asyncio.gather(*(generate(text) for text in texts))
+
+        return asyncio.run(run())
+
+
+class GTTSEngine(TTSEngine):
+    name = 'chat-tts'
+
+    def synthesize(self, text, voice_key, speed=1.0):
+        return generate_audio_gtts(text, voice_key, speed)
+
+
+class Pyttsx3Engine(TTSEngine):
+    name = 'pyttsx3'
+    content_type = 'audio/wav'
+    offline = True
+
+    def synthesize(self, text, voice_key, speed=1.0):
+        return generate_audio_pyttsx3(text, voice_key)
+
+
+class FakeEngine(TTSEngine):
+    name = 'fake'
+    fallback = False
+
+    def synthesize(self, text, voice_key, speed=1.0):
+        return generate_audio_fake(text, voice_key, speed)
+
+
+DEFAULT_ENGINES = (
+    'tts.engines.EdgeTTSEngine',
+    'tts.engines.GTTSEngine',
+    'tts.engines.Pyttsx3Engine',
+)
+
+
+class EngineRegistry:
+    """按名称管理TTS引擎，并负责失败时的降级顺序"""
+
+    def __init__(self):
+        self._engines = {}
+
+    def register(self, engine):
+        self._engines[engine.name] = engine
+        return engine
+
+    def get(self, name):
+        return self._engines.get(name)
+
+    @property
+    def engines(self):
+        return list(self._engines.values())
+
+    def is_available(self, name):
+        """引擎存在且未处于熔断状态"""
+        engine = self.get(name)
+        return engine is not None and engine.breaker.state != 'open'
+
+    def candidates(self, name, fallback=True):
+        """返回依次尝试的引擎列表
+
+        先尝试请求的引擎，再按p50耗时从快到慢尝试其他在线引擎，最后是离线引擎。
+        没有耗时数据的引擎排在有数据的引擎之后。
+        """
+        requested = self.get(name)
+        if not fallback or not requested.fallback:
+            return [requested]
+
+        def speed_key(engine):
+            p50 = engine.latency.percentile(50)
+            return (p50 is None, p50 or 0)
+
+        others = [engine for engine in self._engines.values() if engine is not requested and engine.fallback]
+        online = sorted((engine for engine in others if not engine.offline), key=speed_key)
+        offline = [engine for engine in others if engine.offline]
+        return [requested] + online + offline
+
+    def synthesize(self, text, voice_key, name, speed, cache, fallback=True):
+        """按降级顺序生成音频并写入对应引擎的缓存，返回(音频数据, 实际使用的引擎名)"""
+        audio_list, engine_name = self.synthesize_many([text], voice_key, name, speed, cache, fallback)
+        return audio_list[0], engine_name
+
+    def synthesize_many(self, texts, voice_key, name, speed, cache, fallback=True, content_type=None):
+        """按降级顺序生成多段音频，每段单独写入对应引擎的缓存
+
+        每个引擎先查自己的缓存，只生成缺少的部分；所有段落使用同一个引擎，
+        content_type不为空时只考虑该音频类型的引擎（拼接要求格式一致）。
+        返回(音频数据列表, 实际使用的引擎名)。
+        """
+        from .cache import make_cache_key
+
+        errors = []
+        for engine in self.candidates(name, fallback):
+            if content_type and engine.content_type != content_type:
+                continue
+
+            cache_keys = [make_cache_key(text, voice_key, engine.name, speed) for text in texts]
+            results = [cache.read(cache_key) for cache_key in cache_keys]
+            missing = [i for i, audio_data in enumerate(results) if audio_data is None]
+            if not missing:
+                return results, engine.name
+
+            if not engine.breaker.allow():
+                errors.append(f'{engine.name}: 已熔断')
+                continue
+
+            started = time.perf_counter()
+            engine.calls += 1
+            try:
+                rendered = engine.synthesize_many([texts[i] for i in missing], voice_key, speed)
+                # 检查音频数据
+                if not all(rendered):
+                    raise Exception("音频数据为空")
+            except Exception as e:
+                engine.failures += 1
+                engine.breaker.record_failure()
+                print(f"{engine.name}生成音频失败: {str(e)}")
+                errors.append(f'{engine.name}: {str(e)}')
+                continue
+
+            # 只记录单段生成的耗时，保证各引擎的p50可以直接比较
+            if len(missing) == 1:
+                engine.latency.record(time.perf_counter() - started)
+            engine.breaker.record_success()
+
+            for i, audio_data in zip(missing, rendered):
+                results[i] = audio_data
+                # 写入缓存，失败不影响本次返回
+                try:
+                    cache.put(cache_keys[i], audio_data)
+                except Exception as e:
+                    print(f"写入音频缓存失败: {str(e)}")
+            return results, engine.name
+
+        raise Exception('；'.join(errors) or '没有可用的TTS引擎')
+
+    def stats(self):
+        return {engine.name: engine.stats() for engine in self._engines.values()}
+
+
+def build_registry():
+    """按TTS_ENGINES配置的类路径注册引擎
+
+    这里只创建引擎对象，各引擎依赖的第三方库在第一次生成音频时才导入，
+    缺少某个库时该引擎调用失败并进入降级流程，不影响进程启动。
+    """
+    registry = EngineRegistry()
+    paths = list(getattr(settings, 'TTS_ENGINES', DEFAULT_ENGINES))
+    # 本地压测用的模拟引擎，不访问任何外部服务
+    if getattr(settings, 'TTS_ENABLE_FAKE_ENGINE', False):
+        paths.append('tts.engines.FakeEngine')
+    for path in paths:
+        registry.register(import_string(path)())
+    return registry
+
+
+engine_registry = build_registry()
+
+# 各引擎返回的音频类型
+ENGINE_CONTENT_TYPES = {engine.name: engine.content_type for engine in engine_registry.engines}
+
+
+def enable_fake_engine():
+    """在未开启TTS_ENABLE_FAKE_ENGINE的进程中临时注册模拟引擎（压测命令使用）"""
+    if engine_registry.get('fake') is None:
+        engine = engine_registry.register(FakeEngine())
+        ENGINE_CONTENT_TYPES[engine.name] = engine.content_type
+    return engine_registry.get('fake')
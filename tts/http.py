@@ -0,0 +1,79 @@
+import mmap
+import os
+import re
+
+from django.http import FileResponse, HttpResponse
+from django.utils.http import parse_etags
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# 按内容寻址的URL内容不会变化，可以长期缓存
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def parse_range(header, size):
+    """解析单段Range请求头
+
+    返回(start, end)闭区间；没有或不支持的Range返回None；无法满足时返回False。
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # 多段Range等格式不支持，按完整内容返回
+        return None
+    start, end = match.groups()
+    if start == '' and end == '':
+        return None
+    if start == '':
+        # bytes=-500 表示最后500字节
+        length = int(end)
+        if length == 0:
+            return False
+        start = max(size - length, 0)
+        end = size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def etag_matches(request, etag):
+    """检查If-None-Match是否与当前ETag一致"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or f'"{etag}"' in etags
+
+
+def ranged_file_response(request, audio_file, content_type, etag=None, cache_control=IMMUTABLE_CACHE_CONTROL):
+    """返回支持ETag和Range的文件响应，部分内容通过mmap直接读取所需的字节"""
+    size = os.fstat(audio_file.fileno()).st_size
+
+    if etag and etag_matches(request, etag):
+        audio_file.close()
+        response = HttpResponse(status=304)
+    else:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        if byte_range is False:
+            audio_file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif byte_range is None:
+            response = FileResponse(audio_file, content_type=content_type)
+        else:
+            start, end = byte_range
+            with audio_file, mmap.mmap(audio_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                body = mapped[start:end + 1]
+            response = HttpResponse(body, status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    if etag:
+        response['ETag'] = f'"{etag}"'
+    if cache_control:
+        response['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1 @@
+# TTS压测工具
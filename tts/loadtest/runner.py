@@ -0,0 +1,139 @@
+import http.client
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.test import Client
+
+SPEAK_PATH = '/tts/speak/'
+
+
+def percentile(sorted_values, percent):
+    """最近秩法计算百分位数"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def build_texts(unique_texts, words=None):
+    """压测使用的文本列表：优先使用词库中的单词，不足时补充编号文本"""
+    texts = list(words or [])[:unique_texts]
+    while len(texts) < unique_texts:
+        texts.append(f'loadtest word {len(texts)}')
+    return texts
+
+
+class TestClientTarget:
+    """通过Django测试客户端在当前进程内调用视图，不经过网络"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def post(self, client_index, payload):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client()
+        # 每个虚拟客户端使用不同的地址，分别计入令牌桶
+        remote_addr = f'10.{(client_index >> 16) & 255}.{(client_index >> 8) & 255}.{client_index & 255}'
+        response = client.post(
+            SPEAK_PATH,
+            json.dumps(payload),
+            content_type='application/json',
+            REMOTE_ADDR=remote_addr,
+        )
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code, response.get('X-TTS-Cache')
+
+
+class HTTPTarget:
+    """通过HTTP请求已启动的服务
+
+    bind_clients为True时（本机服务）每个虚拟客户端从不同的127.x.x.x地址发起连接。
+    """
+
+    def __init__(self, base_url, bind_clients=False, timeout=60):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path.rstrip('/') + SPEAK_PATH
+        self.bind_clients = bind_clients
+        self.timeout = timeout
+
+    def post(self, client_index, payload):
+        source_address = None
+        if self.bind_clients:
+            source_address = (f'127.1.{(client_index >> 8) & 255}.{client_index & 255 or 1}', 0)
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout, source_address=source_address)
+        try:
+            conn.request('POST', self.path, json.dumps(payload), {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            return response.status, response.getheader('X-TTS-Cache')
+        finally:
+            conn.close()
+
+
+def run_load_test(target, texts, requests=500, concurrency=16, clients=50, engine='fake',
+                  voice='en-US-female', speed=1.0, seed=0):
+    """按指定并发发送请求，返回延迟分位数、吞吐量和缓存命中率
+
+    文本和客户端的选择由seed确定，相同参数的多次运行发送完全相同的请求序列。
+    """
+    rng = random.Random(seed)
+    plan = [(rng.randrange(clients), rng.choice(texts)) for _ in range(requests)]
+    results = [None] * requests
+
+    def send(index):
+        client_index, text = plan[index]
+        payload = {'text': text, 'voice': voice, 'engine': engine, 'speed': speed}
+        started = time.perf_counter()
+        try:
+            status, cache_status = target.post(client_index, payload)
+        except Exception as e:
+            status, cache_status = f'error: {type(e).__name__}', None
+        results[index] = (time.perf_counter() - started, status, cache_status)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(result[0] for result in results)
+    ok_latencies = sorted(result[0] for result in results if result[1] == 200)
+    status_counts = {}
+    for _, status, _ in results:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    hits = sum(1 for result in results if result[2] == 'HIT')
+    misses = sum(1 for result in results if result[2] == 'MISS')
+
+    def summary(values):
+        return {
+            'p50': round(percentile(values, 50) * 1000, 2) if values else None,
+            'p95': round(percentile(values, 95) * 1000, 2) if values else None,
+            'p99': round(percentile(values, 99) * 1000, 2) if values else None,
+            'max': round(values[-1] * 1000, 2) if values else None,
+            'mean': round(sum(values) / len(values) * 1000, 2) if values else None,
+        }
+
+    return {
+        'requests': requests,
+        'concurrency': concurrency,
+        'clients': clients,
+        'unique_texts': len(set(texts)),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(requests / elapsed, 2) if elapsed > 0 else 0,
+        'success_rps': round(status_counts.get('200', 0) / elapsed, 2) if elapsed > 0 else 0,
+        'latency_ms': summary(latencies),
+        'success_latency_ms': summary(ok_latencies),
+        'status_counts': status_counts,
+        'cache': {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0,
+        },
+    }
@@ -0,0 +1,85 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# 加载WSGI应用并解析URL配置，相当于工作进程处理第一个请求前的准备工作
+WSGI_SCRIPT = (
+    'from config.wsgi import application; '
+    'from django.urls import get_resolver; '
+    'get_resolver().url_patterns'
+)
+
+# 需要确认没有在启动时导入的TTS引擎库
+ENGINE_MODULES = ('edge_tts', 'gtts', 'pyttsx3')
+
+
+def parse_importtime(stderr):
+    """解析-X importtime输出，返回{模块名: (自身耗时us, 累计耗时us)}"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        modules[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return modules
+
+
+def run_target(args, env):
+    """在新的解释器中执行一次，返回(墙钟耗时秒, 导入耗时)"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        cwd=settings.BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else '进程异常退出')
+    return elapsed, parse_importtime(result.stderr)
+
+
+class Command(BaseCommand):
+    help = '用python -X importtime统计manage.py check和WSGI应用加载的启动耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='每个目标的执行次数，取中位数')
+        parser.add_argument('--top', type=int, default=15, help='列出累计导入耗时最多的模块数')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')]))
+
+        targets = (
+            ('check', ['manage.py', 'check']),
+            ('wsgi', ['-c', WSGI_SCRIPT]),
+        )
+        report = {}
+        for name, target_args in targets:
+            runs = [run_target(target_args, env) for _ in range(max(options['repeat'], 1))]
+            runs.sort(key=lambda run: run[0])
+            elapsed, modules = runs[len(runs) // 2]
+
+            top_level = {module: times for module, times in modules.items() if '.' not in module}
+            slowest = sorted(top_level.items(), key=lambda item: item[1][1], reverse=True)[:options['top']]
+            report[name] = {
+                'wall_ms': round(elapsed * 1000, 1),
+                'import_ms': round(sum(times[0] for times in modules.values()) / 1000, 1),
+                'modules': len(modules),
+                'engine_modules_loaded': [module for module in ENGINE_MODULES if module in modules],
+                'slowest_imports': [
+                    {'module': module, 'cumulative_ms': round(times[1] / 1000, 1)}
+                    for module, times in slowest
+                ],
+            }
+
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+
+from tts.engines import VOICE_OPTIONS, generate_audio, generate_audio_gtts
+
+# 统计这些审计事件来估算每次请求的文件操作次数（stat类调用没有审计事件，不计入）
+FILE_AUDIT_EVENTS = ('open', 'os.remove', 'os.rename', 'tempfile.mkstemp')
+
+
+def fake_chunks(audio_size, chunk_size):
+    """模拟TTS引擎逐块返回的音频数据"""
+    chunk = b'\xff' * chunk_size
+    remaining = audio_size
+    while remaining > 0:
+        yield chunk[:min(chunk_size, remaining)]
+        remaining -= chunk_size
+
+
+def fake_engine_modules(audio_size, chunk_size):
+    """模拟edge_tts和gtts模块，接口与真实库相同，只是不访问网络"""
+
+    class Communicate:
+        def __init__(self, text, voice):
+            self.text = text
+            self.voice = voice
+
+        async def stream(self):
+            for chunk in fake_chunks(audio_size, chunk_size):
+                yield {'type': 'audio', 'data': chunk}
+
+        async def save(self, path):
+            with open(path, 'wb') as audio_file:
+                async for chunk in self.stream():
+                    audio_file.write(chunk['data'])
+
+    class gTTS:
+        def __init__(self, text, lang='en', slow=False):
+            self.text = text
+
+        def write_to_fp(self, fp):
+            for chunk in fake_chunks(audio_size, chunk_size):
+                fp.write(chunk)
+
+        def save(self, path):
+            with open(path, 'wb') as audio_file:
+                self.write_to_fp(audio_file)
+
+    edge_tts = types.ModuleType('edge_tts')
+    edge_tts.Communicate = Communicate
+    gtts = types.ModuleType('gtts')
+    gtts.gTTS = gTTS
+    return {'edge_tts': edge_tts, 'gtts': gtts}
+
+
+def read_and_remove(temp_filename):
+    """旧流程的后半段：检查文件、读回内存、删除临时文件"""
+    if not (os.path.exists(temp_filename) and os.path.getsize(temp_filename) > 100):
+        raise Exception("音频文件生成失败")
+    with open(temp_filename, 'rb') as audio_file:
+        audio_data = audio_file.read()
+    os.unlink(temp_filename)
+    return audio_data
+
+
+def edge_tempfile_path(text):
+    """旧的edge-tts流程：communicate.save写临时文件，再读回内存"""
+    import edge_tts
+
+    communicate = edge_tts.Communicate(text, VOICE_OPTIONS['en-US-female'])
+    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
+        temp_filename = temp_file.name
+    asyncio.run(communicate.save(temp_filename))
+    return read_and_remove(temp_filename)
+
+
+def edge_memory_path(text):
+    """当前的edge-tts流程：engines.generate_audio在内存中拼接"""
+    return asyncio.run(generate_audio(text, VOICE_OPTIONS['en-US-female']))
+
+
+def gtts_tempfile_path(text):
+    """旧的gTTS流程：tts.save写临时文件，再读回内存"""
+    from gtts import gTTS
+
+    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
+        temp_filename = temp_file.name
+    gTTS(text=text, lang='en', slow=False).save(temp_filename)
+    return read_and_remove(temp_filename)
+
+
+def gtts_memory_path(text):
+    """当前的gTTS流程：engines.generate_audio_gtts通过write_to_fp写入内存"""
+    return generate_audio_gtts(text, 'en-US-female')
+
+
+class Command(BaseCommand):
+    help = '对比临时文件与内存两种音频生成流程的耗时、内存分配和文件操作次数（使用模拟的edge_tts和gtts模块）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=500, help='每种流程的执行次数')
+        parser.add_argument('--audio-size', type=int, default=16 * 1024, help='模拟音频大小(字节)')
+        parser.add_argument('--chunk-size', type=int, default=4096, help='模拟引擎返回的数据块大小')
+
+    def handle(self, *args, **options):
+        counters = {'enabled': False, 'events': 0}
+
+        def audit(event, args):
+            if counters['enabled'] and event in FILE_AUDIT_EVENTS:
+                counters['events'] += 1
+
+        sys.addaudithook(audit)
+
+        paths = (
+            ('edge-tts', (('tempfile', edge_tempfile_path), ('memory', edge_memory_path))),
+            ('chat-tts', (('tempfile', gtts_tempfile_path), ('memory', gtts_memory_path))),
+        )
+        results = {}
+        # 引擎模块替换为模拟实现，计时只包含本地的音频处理流程
+        with mock.patch.dict(sys.modules, fake_engine_modules(options['audio_size'], options['chunk_size'])):
+            for engine, funcs in paths:
+                results[engine] = {}
+                for name, func in funcs:
+                    results[engine][name] = self.measure(func, options['iterations'], counters)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def measure(self, func, iterations, counters):
+        """执行iterations次，返回平均耗时、每次的文件操作数和峰值内存分配"""
+        func('hello world')  # 预热
+
+        counters['events'] = 0
+        counters['enabled'] = True
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func('hello world')
+        elapsed = time.perf_counter() - started
+        counters['enabled'] = False
+        file_events = counters['events']
+
+        tracemalloc.start()
+        func('hello world')
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'avg_ms': round(elapsed / iterations * 1000, 4),
+            'file_ops_per_request': round(file_events / iterations, 2),
+            'peak_alloc_bytes': peak,
+        }
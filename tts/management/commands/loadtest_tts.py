@@ -0,0 +1,132 @@
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from tts.loadtest.runner import HTTPTarget, TestClientTarget, build_texts, run_load_test
+from vocabulary.models import Word
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """压测时不输出每个请求的访问日志"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = '使用模拟引擎压测/tts/speak/，输出延迟分位数、吞吐量和缓存命中率(JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=('client', 'wsgi', 'url'), default='client',
+                            help='client: 进程内测试客户端；wsgi: 启动本地WSGI服务；url: 请求--url指定的服务')
+        parser.add_argument('--url', help='--mode=url时的服务地址，如 http://127.0.0.1:8000')
+        parser.add_argument('--requests', type=int, default=500, help='请求总数')
+        parser.add_argument('--concurrency', type=int, default=16, help='并发数')
+        parser.add_argument('--clients', type=int, default=50, help='虚拟客户端数量（分别计入限流）')
+        parser.add_argument('--unique-texts', type=int, default=100, help='不同文本的数量，决定缓存命中率')
+        parser.add_argument('--from-words', action='store_true', help='使用词库中的单词作为文本')
+        parser.add_argument('--engine', default='fake', help='TTS引擎，默认使用模拟引擎')
+        parser.add_argument('--latency', type=float, default=0.2, help='模拟引擎延迟(秒)')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='模拟引擎失败比例(0~1)')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子，相同种子发送相同的请求序列')
+        parser.add_argument('--keep-cache', action='store_true', help='使用配置的缓存目录（默认使用空的临时目录）')
+        parser.add_argument('--output', help='同时把结果写入该文件')
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'url' and not options['url']:
+            raise CommandError('--mode=url 需要指定 --url')
+
+        words = None
+        if options['from_words']:
+            words = list(
+                Word.objects.filter(is_active=True).order_by('id').values_list('word', flat=True)[:options['unique_texts']]
+            )
+        texts = build_texts(options['unique_texts'], words)
+
+        overrides = {
+            'TTS_FAKE_ENGINE_LATENCY': options['latency'],
+            'TTS_FAKE_ENGINE_FAILURE_RATE': options['failure_rate'],
+            'ALLOWED_HOSTS': list(settings.ALLOWED_HOSTS) + ['testserver', '127.0.0.1', 'localhost'],
+        }
+        temp_dir = None
+        if not options['keep_cache'] and options['mode'] != 'url':
+            temp_dir = tempfile.TemporaryDirectory(prefix='tts-loadtest-')
+            overrides['TTS_CACHE_DIR'] = temp_dir.name
+
+        # 进程内压测时视图的print输出不写入stdout，stdout只输出JSON结果；-v 2时转到stderr
+        try:
+            with contextlib.ExitStack() as stack:
+                if options['mode'] != 'url':
+                    sink = sys.stderr if options['verbosity'] >= 2 else stack.enter_context(open(os.devnull, 'w'))
+                    stack.enter_context(contextlib.redirect_stdout(sink))
+                stack.enter_context(override_settings(**overrides))
+                result = self.run(options, texts)
+        finally:
+            if temp_dir is not None:
+                temp_dir.cleanup()
+
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+        self.stdout.write(output)
+
+    def run(self, options, texts):
+        if options['mode'] != 'url':
+            from tts import engines
+
+            if options['engine'] == 'fake':
+                engines.enable_fake_engine()
+            elif options['engine'] not in engines.ENGINE_CONTENT_TYPES:
+                raise CommandError(f"不支持的引擎类型: {options['engine']}")
+
+        server = None
+        if options['mode'] == 'client':
+            target = TestClientTarget()
+        elif options['mode'] == 'wsgi':
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietRequestHandler)
+            server.set_app(get_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            target = HTTPTarget(f'http://127.0.0.1:{server.server_address[1]}', bind_clients=True)
+        else:
+            target = HTTPTarget(options['url'])
+
+        try:
+            result = run_load_test(
+                target,
+                texts,
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+                clients=options['clients'],
+                engine=options['engine'],
+                seed=options['seed'],
+            )
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        result['mode'] = options['mode']
+        result['engine'] = options['engine']
+        if options['engine'] == 'fake':
+            result['fake_engine'] = {'latency': options['latency'], 'failure_rate': options['failure_rate']}
+
+        # 进程内压测时附带服务端的准入和请求合并统计
+        if options['mode'] != 'url':
+            from tts.admission import get_admission_controller
+            from tts.singleflight import synthesis_flight
+
+            result['server'] = {
+                'admission': get_admission_controller().stats(),
+                'coalescing': synthesis_flight.stats(),
+            }
+        return result
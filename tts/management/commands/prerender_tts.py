@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tts.cache import get_audio_cache, make_cache_key
+from tts.views import VOICE_OPTIONS, ENGINE_CONTENT_TYPES
+from vocabulary.models import Word
+
+
+def render_job(job):
+    """生成单个音频（进程池中也可调用）
+
+    离线预热直接调用引擎并写入缓存，不经过在线请求的准入控制，并发数只由--workers决定。
+    """
+    from tts import views
+
+    index, text, voice_key, engine, speed, cache_key = job
+    try:
+        views.synthesize_text(text, voice_key, engine, speed, get_audio_cache())
+        return index, None
+    except Exception as e:
+        return index, str(e)
+
+
+class Command(BaseCommand):
+    help = '批量预生成单词(和例句)音频，用于新节点上线前预热音频缓存'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', default='edge-tts', help='TTS引擎')
+        parser.add_argument('--voices', default=','.join(VOICE_OPTIONS), help='逗号分隔的语音列表，默认全部')
+        parser.add_argument('--speed', type=float, default=1.0, help='语速')
+        parser.add_argument('--include-examples', action='store_true', help='同时生成例句音频')
+        parser.add_argument('--workers', type=int, default=4, help='并发数')
+        parser.add_argument('--processes', action='store_true', help='使用进程池代替线程池')
+        parser.add_argument('--checkpoint', help='进度文件路径，默认保存在缓存目录下')
+        parser.add_argument('--reset', action='store_true', help='忽略已有进度，从头开始')
+
+    def handle(self, *args, **options):
+        engine = options['engine']
+        if engine not in ENGINE_CONTENT_TYPES:
+            raise CommandError(f'不支持的引擎类型: {engine}')
+        voices = [voice.strip() for voice in options['voices'].split(',') if voice.strip()]
+        unknown = [voice for voice in voices if voice not in VOICE_OPTIONS]
+        if unknown:
+            raise CommandError(f'未知的语音: {", ".join(unknown)}')
+
+        jobs = self.build_jobs(voices, engine, options['speed'], options['include_examples'])
+        cache = get_audio_cache()
+
+        # 任务列表的签名，参数或词库变化后旧进度自动失效
+        signature = hashlib.sha256(
+            ''.join(job[-1] for job in jobs).encode('utf-8')
+        ).hexdigest()
+        checkpoint_path = options['checkpoint'] or os.path.join(cache.root, '.prerender_checkpoint.json')
+        start_index = 0
+        if not options['reset']:
+            start_index = self.load_checkpoint(checkpoint_path, signature)
+            if start_index:
+                self.stdout.write(f'从第 {start_index} 项继续')
+
+        pending = [job for job in jobs[start_index:] if not cache.contains(job[-1])]
+        skipped = len(jobs) - start_index - len(pending)
+        self.stdout.write(
+            f'共 {len(jobs)} 项，跳过已缓存 {skipped} 项，待生成 {len(pending)} 项'
+        )
+
+        executor_class = ProcessPoolExecutor if options['processes'] else ThreadPoolExecutor
+        finished = set(range(start_index))
+        finished.update(job[0] for job in jobs[start_index:] if cache.contains(job[-1]))
+        next_index = start_index
+        failures = []
+        done = 0
+        started = time.perf_counter()
+        last_report = started
+
+        try:
+            with executor_class(max_workers=options['workers']) as executor:
+                futures = [executor.submit(render_job, job) for job in pending]
+                for future in as_completed(futures):
+                    index, error = future.result()
+                    done += 1
+                    if error:
+                        failures.append({'text': jobs[index][1], 'voice': jobs[index][2], 'error': error})
+                    else:
+                        finished.add(index)
+
+                    # 只记录连续成功的前缀，中断后从这里继续（失败项会被重试）
+                    while next_index in finished:
+                        next_index += 1
+
+                    now = time.perf_counter()
+                    if now - last_report >= 5:
+                        last_report = now
+                        self.save_checkpoint(checkpoint_path, signature, next_index)
+                        self.stdout.write(
+                            f'进度 {done}/{len(pending)}，{done / (now - started):.2f} 项/秒，失败 {len(failures)}'
+                        )
+        finally:
+            self.save_checkpoint(checkpoint_path, signature, next_index)
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            'total': len(jobs),
+            'skipped': skipped,
+            'rendered': done - len(failures),
+            'failed': len(failures),
+            'elapsed_seconds': round(elapsed, 2),
+            'words_per_second': round(done / elapsed, 2) if elapsed > 0 else 0,
+        }
+        self.stdout.write(json.dumps(stats, ensure_ascii=False))
+        for failure in failures[:20]:
+            self.stderr.write(f"失败: {failure['text']} ({failure['voice']}): {failure['error']}")
+
+    def build_jobs(self, voices, engine, speed, include_examples):
+        """按单词ID顺序生成任务列表，保证每次运行的顺序一致"""
+        texts = []
+        for word, example in Word.objects.filter(is_active=True).order_by('id').values_list('word', 'example_sentence'):
+            texts.append(word.strip())
+            if include_examples and example.strip():
+                texts.append(example.strip())
+
+        jobs = []
+        seen = set()
+        for text in texts:
+            if not text:
+                continue
+            for voice_key in voices:
+                cache_key = make_cache_key(text, voice_key, engine, speed)
+                if cache_key in seen:
+                    continue
+                seen.add(cache_key)
+                jobs.append((len(jobs), text, voice_key, engine, speed, cache_key))
+        return jobs
+
+    def load_checkpoint(self, path, signature):
+        try:
+            with open(path) as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+        except (FileNotFoundError, ValueError):
+            return 0
+        if checkpoint.get('signature') != signature:
+            return 0
+        return checkpoint.get('next_index', 0)
+
+    def save_checkpoint(self, path, signature, next_index):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as checkpoint_file:
+            json.dump({'signature': signature, 'next_index': next_index}, checkpoint_file)
+        os.replace(temp_path, path)
@@ -0,0 +1,34 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tts.daemon import SynthesisDaemon, get_daemon_address
+
+
+class Command(BaseCommand):
+    help = '启动独立的音频合成服务，Django进程通过TTS_DAEMON_ADDRESS提交合成任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=getattr(settings, 'TTS_DAEMON_CONCURRENCY', 4),
+                            help='同时调用引擎的数量')
+        parser.add_argument('--max-queue', type=int,
+                            default=getattr(settings, 'TTS_DAEMON_MAX_QUEUE', 200),
+                            help='排队任务上限')
+
+    def handle(self, *args, **options):
+        address = get_daemon_address()
+        if not address:
+            raise CommandError('请先在settings中配置TTS_DAEMON_ADDRESS')
+
+        # 清理上次异常退出留下的套接字文件
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+
+        daemon = SynthesisDaemon(address, options['concurrency'], options['max_queue'])
+        self.stdout.write(f'音频合成服务已启动: {address}，并发数 {options["concurrency"]}')
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('音频合成服务已停止')
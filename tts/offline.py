@@ -0,0 +1,246 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+
+# 各语音对应的系统声音ID关键字（pyttsx3在不同平台上的命名不一致）
+VOICE_PATTERNS = {
+    'en-US': ('en_us', 'en-us', 'english-us', 'zira', 'david'),
+    'en-GB': ('en_gb', 'en-gb', 'english-gb', 'hazel', 'daniel'),
+    'zh-CN': ('zh_cn', 'zh-cn', 'chinese', 'huihui', 'ting-ting'),
+}
+
+
+def resolve_voice_id(voices, voice_type):
+    """根据voice_type在系统声音列表中找到对应的声音ID，找不到返回None"""
+    patterns = VOICE_PATTERNS.get(voice_type[:5], ())
+    for voice in voices:
+        voice_id = voice.id.lower()
+        if any(pattern in voice_id for pattern in patterns):
+            return voice.id
+    return None
+
+
+def load_pyttsx3():
+    """初始化pyttsx3，返回speak(text, voice_type)函数"""
+    import pyttsx3
+
+    engine = pyttsx3.init()
+    engine.setProperty('rate', 150)  # 语速
+    engine.setProperty('volume', 1.0)  # 音量
+    voices = engine.getProperty('voices')
+    default_voice = engine.getProperty('voice')
+    voice_ids = {}
+
+    def speak(text, voice_type):
+        fd, temp_filename = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            # 声音ID只解析一次
+            if voice_type not in voice_ids:
+                voice_ids[voice_type] = resolve_voice_id(voices, voice_type) or default_voice
+            engine.setProperty('voice', voice_ids[voice_type])
+
+            # 每个进程同时只执行一个runAndWait
+            engine.save_to_file(text, temp_filename)
+            engine.runAndWait()
+
+            with open(temp_filename, 'rb') as audio_file:
+                audio_data = audio_file.read()
+            if not audio_data:
+                raise Exception("音频文件生成失败或为空")
+            return audio_data
+        finally:
+            try:
+                os.unlink(temp_filename)
+            except OSError:
+                pass
+
+    return speak
+
+
+def load_fake_engine(delays=None):
+    """模拟离线引擎：不依赖pyttsx3，delays中的文本按指定秒数延迟返回，用于测试进程池"""
+    delays = delays or {}
+
+    def speak(text, voice_type):
+        time.sleep(delays.get(text, 0))
+        return f'RIFF|{text}|{voice_type}'.encode('utf-8')
+
+    return speak
+
+
+def worker_main(job_queue, result_queue, load_engine=load_pyttsx3):
+    """离线引擎工作进程：只初始化一次引擎，逐个处理任务
+
+    开始处理任务时先报告自己的pid，任务超时时进程池据此回收卡住的进程；
+    请求已经超时的任务直接跳过。
+    """
+    try:
+        speak = load_engine()
+        init_error = None
+    except Exception as e:
+        # 初始化失败时仍然保持运行，直接把错误返回给每个任务，避免请求一直等到超时
+        init_error = f"离线引擎初始化失败: {str(e)}"
+
+    while True:
+        job = job_queue.get()
+        if job is None:
+            break
+        job_id, text, voice_type, deadline = job
+        if deadline is not None and time.time() > deadline:
+            result_queue.put(('error', job_id, '请求已超时'))
+            continue
+        if init_error:
+            result_queue.put(('error', job_id, init_error))
+            continue
+
+        result_queue.put(('started', job_id, os.getpid()))
+        try:
+            result_queue.put(('audio', job_id, speak(text, voice_type)))
+        except Exception as e:
+            result_queue.put(('error', job_id, str(e)))
+
+
+class OfflineEnginePool:
+    """常驻的离线引擎工作进程池，避免每次请求都初始化引擎
+
+    任务超时时结束正在处理它的工作进程并补齐，卡住的进程不会一直占用进程池。
+    """
+
+    def __init__(self, workers=1, load_engine=load_pyttsx3):
+        self.workers = workers
+        self.load_engine = load_engine
+        self._context = multiprocessing.get_context('spawn')
+        self._job_queue = self._context.Queue()
+        self._result_queue = self._context.Queue()
+        self._processes = []
+        self._futures = {}
+        self._running = {}  # 任务ID -> 正在处理该任务的工作进程pid
+        self._recycled = 0
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._collector = None
+
+    def _ensure_started(self):
+        with self._lock:
+            # 补齐意外退出或被回收的工作进程
+            self._processes = [process for process in self._processes if process.is_alive()]
+            while len(self._processes) < self.workers:
+                process = self._context.Process(
+                    target=worker_main,
+                    args=(self._job_queue, self._result_queue, self.load_engine),
+                    daemon=True,
+                )
+                process.start()
+                self._processes.append(process)
+
+            if self._collector is None:
+                self._collector = threading.Thread(target=self._collect, daemon=True)
+                self._collector.start()
+
+    def _recycle(self, pid):
+        """结束卡住的工作进程并立即补齐，排队中的任务不用等下一次提交"""
+        with self._lock:
+            for process in self._processes:
+                if process.pid == pid:
+                    process.terminate()
+                    self._processes.remove(process)
+                    self._recycled += 1
+                    break
+            else:
+                return
+        print(f"离线引擎工作进程{pid}处理超时，已回收")
+        self._ensure_started()
+
+    def _collect(self):
+        """把工作进程返回的结果交给等待中的请求"""
+        while True:
+            kind, job_id, payload = self._result_queue.get()
+            with self._lock:
+                if kind == 'started':
+                    waiting = job_id in self._futures
+                    if waiting:
+                        self._running[job_id] = payload
+                else:
+                    self._running.pop(job_id, None)
+                    future = self._futures.pop(job_id, None)
+            if kind == 'started':
+                # 开始处理时请求刚好超时，没有人会回收这个进程，直接回收
+                if not waiting:
+                    self._recycle(payload)
+                continue
+            if future is None:
+                continue
+            if kind == 'error':
+                future.set_exception(Exception(f"离线引擎生成音频失败: {payload}"))
+            else:
+                future.set_result(payload)
+
+    def submit(self, text, voice_type, timeout=None):
+        """提交任务，返回Future；超过timeout秒还没开始处理的任务不再生成"""
+        self._ensure_started()
+        future = Future()
+        job_id = next(self._job_ids)
+        future.job_id = job_id
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._lock:
+            self._futures[job_id] = future
+        self._job_queue.put((job_id, text, voice_type, deadline))
+        return future
+
+    def synthesize(self, text, voice_type, timeout=None):
+        """生成音频数据，超时抛出异常"""
+        if timeout is None:
+            timeout = getattr(settings, 'TTS_OFFLINE_TIMEOUT', 30)
+        future = self.submit(text, voice_type, timeout)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._futures.pop(future.job_id, None)
+                pid = self._running.pop(future.job_id, None)
+            if pid is not None:
+                self._recycle(pid)
+            raise Exception(f"离线引擎生成音频超时({timeout}秒)")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'alive': sum(1 for process in self._processes if process.is_alive()),
+                'pending': len(self._futures),
+                'recycled': self._recycled,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            processes = list(self._processes)
+            self._processes = []
+        for _ in processes:
+            try:
+                self._job_queue.put_nowait(None)
+            except queue.Full:
+                pass
+        for process in processes:
+            process.join(timeout=5)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_offline_pool():
+    """获取全局离线引擎进程池"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OfflineEnginePool(getattr(settings, 'TTS_OFFLINE_WORKERS', 1))
+    return _pool
@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .cache import get_audio_cache, make_cache_key
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# 已排队但尚未完成的缓存键，避免多个会话重复排队同一个单词
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def get_executor():
+    """获取后台预生成线程池，线程数由TTS_PRERENDER_WORKERS限制"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'TTS_PRERENDER_WORKERS', 4),
+                    thread_name_prefix='tts-prerender',
+                )
+    return _executor
+
+
+def _render(text, voice_key, engine, speed, cache_key):
+    from . import views
+
+    try:
+        views.render_audio(text, voice_key, engine, speed, get_audio_cache(), cache_key)
+    except views.SynthesisPending:
+        # 合成服务仍在后台生成，结果会写入缓存
+        pass
+    except Exception as e:
+        print(f"预生成音频失败: text={text}, 错误: {str(e)}")
+    finally:
+        with _pending_lock:
+            _pending.discard(cache_key)
+
+
+def prerender_texts(texts, voice_key='en-US-female', engine='edge-tts', speed=1.0):
+    """按顺序把文本加入后台预生成队列，已缓存或已在队列中的跳过
+
+    返回实际加入队列的数量。
+    """
+    cache = get_audio_cache()
+    executor = get_executor()
+    queued = 0
+    for text in texts:
+        # 与听写页面一致，朗读前去掉首尾空白
+        text = (text or '').strip()
+        if not text:
+            continue
+        cache_key = make_cache_key(text, voice_key, engine, speed)
+        if cache.contains(cache_key):
+            continue
+        with _pending_lock:
+            if cache_key in _pending:
+                continue
+            _pending.add(cache_key)
+        executor.submit(_render, text, voice_key, engine, speed, cache_key)
+        queued += 1
+    return queued
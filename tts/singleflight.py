@@ -0,0 +1,116 @@
+import contextlib
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，只做进程内合并
+    fcntl = None
+
+
+class _Call:
+    """一次正在进行中的调用"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """合并并发的相同请求：同一个key同时只执行一次，其余请求等待并共享结果"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.cross_process = 0
+        self.cached_after_lock = 0
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def record_cached(self, waited):
+        """记录一次拿到文件锁后发现结果已缓存、无需执行的调用
+
+        waited为True表示等待过其他进程持有的锁，即结果由其他进程生成；
+        否则是本进程刚完成的调用在检查缓存和进入合并之间结束了。
+        """
+        with self._lock:
+            if waited:
+                self.cross_process += 1
+            else:
+                self.cached_after_lock += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'cross_process': self.cross_process,
+                'cached_after_lock': self.cached_after_lock,
+                'saved_upstream_calls': self.coalesced + self.cross_process + self.cached_after_lock,
+            }
+
+
+# 锁文件数量固定，缓存键按前缀分配到其中一个，锁文件不会随缓存键数量增长
+LOCK_STRIPES = 1024
+
+
+def lock_path(lock_dir, key):
+    return os.path.join(lock_dir, f'{int(key[:4], 16) % LOCK_STRIPES:04d}.lock')
+
+
+@contextlib.contextmanager
+def file_lock(lock_dir, key):
+    """跨进程的文件锁，返回是否等待过其他进程持有的锁
+
+    不同的key可能共用一个锁文件，只会偶尔多等一次，不影响正确性。
+    """
+    if fcntl is None:
+        yield False
+        return
+
+    os.makedirs(lock_dir, exist_ok=True)
+    with open(lock_path(lock_dir, key), 'a') as lock_file:
+        waited = False
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            waited = True
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield waited
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+synthesis_flight = SingleFlight()
@@ -0,0 +1,62 @@
+class TeeStream:
+    """流式响应的音频数据块：边返回给客户端边写入缓存
+
+    完整返回后提交缓存写入并调用on_complete；中途出错或客户端断开时丢弃写了一半的缓存。
+    无论哪种情况，迭代结束或响应关闭时都会调用一次on_close（归还合成名额）。
+    不用生成器实现：未开始迭代的生成器被关闭时不会执行finally。
+    """
+
+    def __init__(self, chunks, writer, on_complete=None, on_close=None):
+        self.chunks = iter(chunks)
+        self.writer = writer
+        self.on_complete = on_complete
+        self.on_close = on_close
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self._finish()
+            raise
+        except BaseException:
+            self.close()
+            raise
+        if self.writer is not None:
+            try:
+                self.writer.write(chunk)
+            except Exception as e:
+                # 缓存写入失败不影响返回音频
+                print(f"写入音频缓存失败: {str(e)}")
+                self.writer.abort()
+                self.writer = None
+        return chunk
+
+    def _finish(self):
+        try:
+            if self.writer is not None:
+                try:
+                    self.writer.commit()
+                except Exception as e:
+                    print(f"写入音频缓存失败: {str(e)}")
+            if self.on_complete:
+                self.on_complete()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.writer is not None:
+                self.writer.abort()
+            close_chunks = getattr(self.chunks, 'close', None)
+            if close_chunks:
+                close_chunks()
+        finally:
+            if self.on_close:
+                self.on_close()
@@ -1,3 +1,660 @@
-from django.test import TestCase
+import functools
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from vocabulary.models import Word, WordList, WordListWord
+
+from .admission import AdmissionController, AdmissionRejected
+from .cache import AudioCache, make_cache_key
+from .chunking import split_text
+from . import engines
+from .daemon import SynthesisBusy, SynthesisDaemon, daemon_stats, request_synthesis
+from .engines import CircuitBreaker, EngineRegistry, TTSEngine, engine_registry
+from .http import IMMUTABLE_CACHE_CONTROL, parse_range
+from .offline import OfflineEnginePool, load_fake_engine
+from . import singleflight
+from .singleflight import SingleFlight, file_lock
+
+
+class AudioCacheTests(TestCase):
+    """磁盘音频缓存：大小统计和按最近访问时间淘汰"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def age(self, cache, key, seconds):
+        """把缓存文件的访问时间往前调，模拟更早访问"""
+        past = time.time() - seconds
+        os.utime(cache.path_for(key), (past, past))
+
+    def test_overwrite_counts_size_once(self):
+        cache = AudioCache(self.cache_dir.name, max_bytes=1000)
+        cache.put('a' * 64, b'x' * 100)
+        cache.put('a' * 64, b'x' * 300)
+        cache.put('a' * 64, b'x' * 200)
+        self.assertEqual(cache.stats()['size_bytes'], 200)
+        self.assertEqual(cache.read('a' * 64), b'x' * 200)
+        self.assertEqual(cache.stats()['evictions'], 0)
+
+    def test_evicts_least_recently_used(self):
+        cache = AudioCache(self.cache_dir.name, max_bytes=1000)
+        keys = [str(i) * 64 for i in range(4)]
+        for age, key in zip((30, 20, 10), keys):
+            cache.put(key, b'x' * 300)
+            self.age(cache, key, age)
+        # 最早写入的文件刚被访问过，不会被淘汰
+        cache.open(keys[0]).close()
+        cache.put(keys[3], b'x' * 300)
+
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertFalse(cache.contains(keys[1]))
+        for key in (keys[0], keys[2], keys[3]):
+            self.assertTrue(cache.contains(key))
+        self.assertEqual(cache.stats()['size_bytes'], 900)
+
+        cache.put('9' * 64, b'x' * 300)
+        stats = cache.stats()
+        self.assertLessEqual(stats['size_bytes'], 900)
+        self.assertEqual(stats['size_bytes'], sum(
+            os.path.getsize(cache.path_for(key)) for key in keys + ['9' * 64] if cache.contains(key)
+        ))
+        self.assertEqual((stats['hits'], stats['misses']), (1, 0))
+
+
+class SingleFlightTests(TestCase):
+    """请求合并：并发的相同请求只执行一次"""
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def synthesize():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return b'audio'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', synthesize)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do('key', synthesize))) for _ in range(7)
+        ]
+        for thread in followers:
+            thread.start()
+        # 等所有跟随者都进入等待后再让引擎返回
+        while flight.stats()['coalesced'] < 7:
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [b'audio'] * 8)
+        stats = flight.stats()
+        self.assertEqual((stats['executed'], stats['coalesced'], stats['in_flight']), (1, 7, 0))
+
+    def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('engine down')
+
+        with self.assertRaises(ValueError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: b'audio'), b'audio')
+
+    @unittest.skipIf(singleflight.fcntl is None, '没有fcntl时不使用文件锁')
+    def test_file_lock_is_striped(self):
+        with tempfile.TemporaryDirectory() as lock_dir:
+            held = threading.Event()
+            release = threading.Event()
+
+            def hold():
+                with file_lock(lock_dir, '0000' + 'a' * 60):
+                    held.set()
+                    release.wait(5)
+
+            holder = threading.Thread(target=hold)
+            holder.start()
+            held.wait(5)
+            # 其他分组的key不受影响
+            with file_lock(lock_dir, '0001' + 'a' * 60) as waited:
+                self.assertFalse(waited)
+            threading.Timer(0.1, release.set).start()
+            with file_lock(lock_dir, '0000' + 'b' * 60) as waited:
+                self.assertTrue(waited)
+            holder.join(5)
+
+            # 锁文件数量固定，不随key增长
+            for i in range(3000):
+                with file_lock(lock_dir, hashlib.sha256(str(i).encode()).hexdigest()):
+                    pass
+            self.assertLessEqual(len(os.listdir(lock_dir)), singleflight.LOCK_STRIPES)
+
+
+class AdmissionControllerTests(TestCase):
+    """准入控制：频率限制、队列已满、等待超时和名额转交"""
+
+    def test_client_rate_limit(self):
+        admission = AdmissionController(client_rate=1, client_burst=2)
+        admission.check_rate('ip:1')
+        admission.check_rate('ip:1')
+        with self.assertRaises(AdmissionRejected) as ctx:
+            admission.check_rate('ip:1')
+        self.assertEqual((ctx.exception.status, ctx.exception.retry_after), (429, 1))
+        # 其他客户端不受影响
+        admission.check_rate('ip:2')
+        self.assertEqual(admission.stats()['rejected_rate_limit'], 1)
+
+    def test_queue_full_rejects_immediately(self):
+        admission = AdmissionController(max_concurrent=1, max_waiting=0)
+        admission.acquire()
+        with self.assertRaises(AdmissionRejected) as ctx:
+            admission.acquire()
+        self.assertEqual(ctx.exception.status, 503)
+        stats = admission.stats()
+        self.assertEqual((stats['active'], stats['rejected_queue_full']), (1, 1))
+
+    def test_waiter_is_shed_after_deadline(self):
+        admission = AdmissionController(max_concurrent=1, wait_timeout=0.05)
+        admission.acquire()
+        with self.assertRaises(AdmissionRejected) as ctx:
+            admission.acquire()
+        self.assertEqual(ctx.exception.status, 503)
+        stats = admission.stats()
+        self.assertEqual((stats['waiting'], stats['shed_deadline']), (0, 1))
+
+    def test_estimated_wait_beyond_deadline_is_shed(self):
+        admission = AdmissionController(max_concurrent=1, wait_timeout=1)
+        admission.release(admission.acquire() - 5)
+        admission.acquire()
+        with self.assertRaises(AdmissionRejected) as ctx:
+            admission.acquire()
+        self.assertEqual(ctx.exception.status, 503)
+        self.assertGreaterEqual(ctx.exception.retry_after, 5)
+        self.assertEqual(admission.stats()['queued'], 0)
+
+    def test_release_hands_slot_to_waiter(self):
+        admission = AdmissionController(max_concurrent=1, wait_timeout=5)
+        started = admission.acquire()
+        admitted = []
+        waiter = threading.Thread(target=lambda: admitted.append(admission.acquire()))
+        waiter.start()
+        while admission.stats()['waiting'] < 1:
+            time.sleep(0.01)
+        admission.release(started)
+        waiter.join(5)
+
+        self.assertEqual(len(admitted), 1)
+        stats = admission.stats()
+        self.assertEqual((stats['active'], stats['waiting'], stats['admitted'], stats['queued']), (1, 0, 2, 1))
+        admission.release(admitted[0])
+        self.assertEqual(admission.stats()['active'], 0)
+
+
+class WordListBundleTests(TestCase):
+    """词书音频包：音频未全部缓存时排队预生成，全部缓存后按内容寻址"""
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache = AudioCache(cache_dir.name, max_bytes=1024 * 1024)
+        patcher = mock.patch('tts.cache._audio_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.word_list = WordList.objects.create(name='测试词书')
+        for order, text in enumerate(('apple', 'banana')):
+            word = Word.objects.create(word=text, translation=text)
+            WordListWord.objects.create(word_list=self.word_list, word=word, order=order)
+        self.url = reverse('tts:word_list_bundle', args=[self.word_list.id])
+
+    def put_audio(self, text, speed=1.0):
+        self.cache.put(make_cache_key(text, 'en-US-female', 'edge-tts', speed), text.encode('utf-8'))
+
+    @mock.patch('tts.views.prerender_texts')
+    def test_missing_audio_is_queued_not_bundled(self, prerender):
+        self.put_audio('apple', speed=2.0)
+        response = self.client.get(self.url, {'speed': '3.7', 'voice': 'unknown'})
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertEqual((response.json()['missing'], response.json()['total']), (1, 2))
+        # 语速限制在滑块范围内，未知语音使用默认语音
+        prerender.assert_called_once_with(['banana'], 'en-US-female', 'edge-tts', 2.0)
+        # 不完整的音频包不保存
+        self.assertEqual(self.cache.stats()['size_bytes'], len(b'apple'))
+
+    @mock.patch('tts.views.prerender_texts')
+    def test_invalid_speed_is_rejected(self, prerender):
+        for speed in ('fast', 'nan', 'inf'):
+            self.assertEqual(self.client.get(self.url, {'speed': speed}).status_code, 400)
+        prerender.assert_not_called()
+
+    def test_complete_bundle_is_content_addressed(self):
+        self.put_audio('apple')
+        self.put_audio('banana')
+        index = self.client.get(self.url).json()
+        self.assertEqual([(item['text'], item['offset'], item['length']) for item in index['segments']], [
+            ('apple', 0, 5), ('banana', 5, 6),
+        ])
+
+        response = self.client.get(index['bundle_url'])
+        self.assertEqual(b''.join(response.streaming_content), b'applebanana')
+        self.assertEqual(response['ETag'], '"%s"' % hashlib.sha256(b'applebanana').hexdigest())
+        self.assertIn(hashlib.sha256(b'applebanana').hexdigest(), index['bundle_url'])
+        # 再次请求复用已保存的索引
+        self.assertEqual(self.client.get(self.url).json(), index)
+
+
+class RangeResponseTests(TestCase):
+    """Range和ETag：按内容寻址的音频支持部分下载和304"""
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache = AudioCache(cache_dir.name, max_bytes=1024 * 1024)
+        patcher = mock.patch('tts.cache._audio_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.key = make_cache_key('apple', 'en-US-female', 'edge-tts', 1.0)
+        self.cache.put(self.key, b'0123456789')
+        self.url = reverse('tts:speech_audio')
+        self.params = {'text': 'apple', 'voice': 'en-US-female', 'engine': 'edge-tts', 'speed': '1'}
+
+    def test_parse_range(self):
+        cases = [
+            (None, None),
+            ('bytes=0-3', (0, 3)),
+            ('bytes=5-', (5, 9)),
+            ('bytes=-4', (6, 9)),
+            ('bytes=-20', (0, 9)),
+            ('bytes=8-100', (8, 9)),
+            ('bytes=0-1,4-5', None),
+            ('items=0-1', None),
+            ('bytes=-', None),
+            ('bytes=10-', False),
+            ('bytes=4-2', False),
+            ('bytes=-0', False),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 10), expected)
+
+    def test_full_response_has_etag(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['ETag'], f'"{self.key}"')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_matching_etag_is_not_modified(self):
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=f'"{self.key}"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], f'"{self.key}"')
+
+    def test_partial_content(self):
+        response = self.client.get(self.url, self.params, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+        response = self.client.get(self.url, self.params, HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+
+class SplitTextTests(TestCase):
+    """长文本拆分：按句子拆分，超长句子按分句和空白拆分"""
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(split_text('  Hello there. How are you?  ', min_chars=60), ['Hello there. How are you?'])
+
+    def test_splits_on_sentence_boundaries(self):
+        self.assertEqual(
+            split_text('Hello there. How are you? Fine! Thanks; bye.', min_chars=10),
+            ['Hello there.', 'How are you?', 'Fine!', 'Thanks;', 'bye.']
+        )
+        self.assertEqual(split_text('你好。今天天气很好！再见', min_chars=2), ['你好。', '今天天气很好！', '再见'])
+
+    def test_abbreviations_and_decimals_are_not_boundaries(self):
+        self.assertEqual(
+            split_text('Mr. Smith paid 3.50 dollars, e.g. coins. Then he left.', min_chars=10),
+            ['Mr. Smith paid 3.50 dollars, e.g. coins.', 'Then he left.']
+        )
+
+    def test_long_sentences_respect_max_chars(self):
+        sentence = 'first clause is here, second clause is here, third clause is here, and the end.'
+        chunks = split_text(sentence, min_chars=10, max_chars=45)
+        self.assertEqual(chunks, ['first clause is here, second clause is here,', 'third clause is here, and the end.'])
+
+        words = ' '.join(f'word{i}' for i in range(40))
+        chunks = split_text(words, min_chars=10, max_chars=30)
+        self.assertTrue(all(len(chunk) <= 30 for chunk in chunks))
+        self.assertEqual(' '.join(chunks), words)
+
+
+class StubEngine(TTSEngine):
+    """测试用引擎，failing为True时每次调用都失败"""
+
+    def __init__(self, name, offline=False, failing=False, p50=None):
+        super().__init__()
+        self.name = name
+        self.offline = offline
+        self.failing = failing
+        if p50 is not None:
+            self.latency.record(p50)
+
+    def synthesize(self, text, voice_key, speed=1.0):
+        if self.failing:
+            raise RuntimeError('engine down')
+        return f'{self.name}:{text}'.encode('utf-8')
+
+
+class CircuitBreakerTests(TestCase):
+    """熔断器：连续失败后熔断，超时后只放行一个探测请求"""
+
+    def test_opens_after_threshold_and_probes_once(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        now = [100.0]
+        with mock.patch('tts.engines.time.monotonic', lambda: now[0]):
+            breaker.record_failure()
+            self.assertEqual(breaker.state, 'closed')
+            breaker.record_failure()
+            self.assertEqual(breaker.state, 'open')
+            self.assertFalse(breaker.allow())
+
+            now[0] += 30
+            self.assertEqual(breaker.state, 'half_open')
+            self.assertTrue(breaker.allow())
+            self.assertFalse(breaker.allow())
+            # 探测失败继续熔断
+            breaker.record_failure()
+            self.assertEqual(breaker.state, 'open')
+
+            now[0] += 30
+            self.assertTrue(breaker.allow())
+            breaker.record_success()
+            self.assertEqual((breaker.state, breaker.failures), ('closed', 0))
+            self.assertTrue(breaker.allow())
+
+
+class EngineRegistryTests(TestCase):
+    """降级顺序：请求的引擎、按p50从快到慢的在线引擎、离线引擎"""
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache = AudioCache(cache_dir.name, max_bytes=1024 * 1024)
+        self.registry = EngineRegistry()
+        self.offline = self.registry.register(StubEngine('offline', offline=True, p50=0.01))
+        self.unmeasured = self.registry.register(StubEngine('unmeasured'))
+        self.slow = self.registry.register(StubEngine('slow', p50=2.0))
+        self.fast = self.registry.register(StubEngine('fast', p50=0.5))
+        self.requested = self.registry.register(StubEngine('requested', failing=True))
+
+    def names(self, engines):
+        return [engine.name for engine in engines]
+
+    def test_candidates_order(self):
+        self.assertEqual(
+            self.names(self.registry.candidates('requested')),
+            ['requested', 'fast', 'slow', 'unmeasured', 'offline']
+        )
+        self.assertEqual(self.names(self.registry.candidates('requested', fallback=False)), ['requested'])
+
+    def test_falls_back_and_caches_under_actual_engine(self):
+        audio_data, engine_name = self.registry.synthesize('apple', 'en-US-female', 'requested', 1.0, self.cache)
+        self.assertEqual((audio_data, engine_name), (b'fast:apple', 'fast'))
+        self.assertTrue(self.cache.contains(make_cache_key('apple', 'en-US-female', 'fast', 1.0)))
+        self.assertFalse(self.cache.contains(make_cache_key('apple', 'en-US-female', 'requested', 1.0)))
+        self.assertEqual((self.requested.failures, self.requested.breaker.failures), (1, 1))
+
+    def test_open_breaker_is_skipped(self):
+        self.fast.failing = True
+        for _ in range(self.fast.breaker.failure_threshold):
+            with self.assertRaises(Exception):
+                self.registry.synthesize('pear', 'en-US-female', 'fast', 1.0, self.cache, fallback=False)
+        self.assertEqual(self.fast.breaker.state, 'open')
+
+        calls = self.fast.calls
+        audio_data, engine_name = self.registry.synthesize('pear', 'en-US-female', 'requested', 1.0, self.cache)
+        self.assertEqual(engine_name, 'slow')
+        self.assertEqual(self.fast.calls, calls)
+
+    def test_all_engines_failing_raises(self):
+        for engine in self.registry.engines:
+            engine.failing = True
+        with self.assertRaises(Exception) as ctx:
+            self.registry.synthesize('apple', 'en-US-female', 'requested', 1.0, self.cache)
+        self.assertIn('requested: engine down', str(ctx.exception))
+
+
+@override_settings(TTS_FAKE_ENGINE_LATENCY=0)
+class TextToSpeechViewTests(TestCase):
+    """POST接口：第一次请求生成并写入缓存，之后直接返回缓存的音频"""
+
+    def setUp(self):
+        engines.enable_fake_engine()
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache = AudioCache(cache_dir.name, max_bytes=1024 * 1024)
+        patcher = mock.patch('tts.cache._audio_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self):
+        return self.client.post(reverse('tts:text_to_speech'), json.dumps({
+            'text': 'apple', 'voice': 'en-US-female', 'engine': 'fake', 'speed': 1.0,
+        }), content_type='application/json')
+
+    def test_second_request_is_served_from_cache(self):
+        with mock.patch('tts.engines.generate_audio_fake', wraps=engines.generate_audio_fake) as synthesize:
+            first = self.post()
+            self.assertEqual((first.status_code, first['X-TTS-Cache']), (200, 'MISS'))
+            self.assertEqual(synthesize.call_count, 1)
+
+            second = self.post()
+            self.assertEqual((second.status_code, second['X-TTS-Cache']), (200, 'HIT'))
+            self.assertEqual(b''.join(second.streaming_content), first.content)
+            self.assertEqual(synthesize.call_count, 1)
+        self.assertTrue(self.cache.contains(make_cache_key('apple', 'en-US-female', 'fake', 1.0)))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+
+class StreamingResponseTests(TestCase):
+    """流式返回：边返回边写入缓存，响应结束或客户端断开时归还名额"""
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache = AudioCache(cache_dir.name, max_bytes=1024 * 1024)
+        self.admission = AdmissionController()
+        for target, value in (('tts.cache._audio_cache', self.cache),
+                              ('tts.views.get_admission_controller', lambda: self.admission)):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(engine_registry.get('edge-tts').breaker.record_success)
+        self.key = make_cache_key('apple', 'en-US-female', 'edge-tts', 1.0)
+
+    def post(self, **data):
+        data.update(text='apple', voice='en-US-female', engine='edge-tts', speed=1.0)
+        return self.client.post(reverse('tts:text_to_speech'), json.dumps(data), content_type='application/json')
+
+    def fake_stream(self, text, voice, speed=1.0):
+        yield b'app'
+        # 第一个数据块返回后名额仍被占用
+        self.assertEqual(self.admission.stats()['active'], 1)
+        yield b'le'
+
+    def test_streams_and_caches(self):
+        with mock.patch('tts.views.stream_audio', self.fake_stream):
+            response = self.post(stream=True)
+            self.assertTrue(response.streaming)
+            self.assertEqual(b''.join(response.streaming_content), b'apple')
+        self.assertEqual(self.cache.read(self.key), b'apple')
+        self.assertEqual(self.admission.stats()['active'], 0)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+        # 已缓存后GET直接返回缓存
+        response = self.client.get(reverse('tts:speech_audio'), {
+            'text': 'apple', 'voice': 'en-US-female', 'engine': 'edge-tts', 'speed': '1', 'stream': '1',
+        })
+        self.assertEqual(response['ETag'], f'"{self.key}"')
+
+    def test_disconnect_discards_partial_audio(self):
+        with mock.patch('tts.views.stream_audio', self.fake_stream):
+            response = self.client.get(reverse('tts:speech_audio'), {
+                'text': 'apple', 'voice': 'en-US-female', 'engine': 'edge-tts', 'speed': '1', 'stream': '1',
+            })
+            self.assertEqual(next(iter(response.streaming_content)), b'app')
+            response.close()
+        self.assertFalse(self.cache.contains(self.key))
+        self.assertEqual(self.admission.stats()['active'], 0)
+        self.assertFalse([name for _, _, names in os.walk(self.cache.root) for name in names if name.endswith('.tmp')])
+
+    def test_stream_failure_falls_back_to_full_response(self):
+        def broken_stream(text, voice, speed=1.0):
+            raise ConnectionError('edge down')
+            yield
+
+        with mock.patch('tts.views.stream_audio', broken_stream), \
+                mock.patch('tts.views.render_audio', return_value=(b'full', 'edge-tts')):
+            response = self.post(stream=True)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, b'full')
+        self.assertEqual(self.admission.stats()['active'], 0)
+        self.assertEqual(engine_registry.get('edge-tts').breaker.failures, 1)
+
+
+@override_settings(TTS_FAKE_ENGINE_LATENCY=0)
+class SynthesisDaemonTests(TestCase):
+    """独立合成服务：通过临时Unix套接字往返，服务不可用时在进程内生成"""
+
+    def setUp(self):
+        engines.enable_fake_engine()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache = AudioCache(os.path.join(temp_dir.name, 'cache'), max_bytes=1024 * 1024)
+        patcher = mock.patch('tts.cache._audio_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.address = os.path.join(temp_dir.name, 'daemon.sock')
+
+    def start_daemon(self, **kwargs):
+        daemon = SynthesisDaemon(self.address, **kwargs)
+        threading.Thread(target=daemon.serve_forever, daemon=True).start()
+        self.addCleanup(daemon.close)
+        while not os.path.exists(self.address):
+            time.sleep(0.01)
+        return daemon
+
+    def post(self):
+        return self.client.post(reverse('tts:text_to_speech'), json.dumps({
+            'text': 'apple', 'voice': 'en-US-female', 'engine': 'fake', 'speed': 1.0,
+        }), content_type='application/json')
+
+    def test_round_trip(self):
+        self.start_daemon(concurrency=2, max_queue=4)
+        with override_settings(TTS_DAEMON_ADDRESS=self.address):
+            cache_key, engine_used = request_synthesis('apple', 'en-US-female', 'fake', 1.0, timeout=5)
+            self.assertEqual(cache_key, make_cache_key('apple', 'en-US-female', 'fake', 1.0))
+            self.assertEqual(engine_used, 'fake')
+            self.assertTrue(self.cache.contains(cache_key))
+
+            response = self.post()
+            self.assertEqual((response.status_code, response['X-TTS-Cache']), (200, 'HIT'))
+            stats = daemon_stats()
+        self.assertEqual((stats['completed'], stats['queued'], stats['rejected']), (1, 0, 0))
+
+    def test_connections_over_limit_are_busy(self):
+        daemon = self.start_daemon(max_queue=1)
+        daemon._connections.acquire()
+        with override_settings(TTS_DAEMON_ADDRESS=self.address):
+            with self.assertRaises(SynthesisBusy):
+                request_synthesis('apple', 'en-US-female', 'fake', 1.0, timeout=5)
+            response = self.post()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(daemon.stats()['rejected'], 2)
+
+    def test_daemon_down_falls_back_in_process(self):
+        with override_settings(TTS_DAEMON_ADDRESS=self.address):
+            response = self.post()
+        self.assertEqual((response.status_code, response['X-TTS-Cache']), (200, 'MISS'))
+        self.assertTrue(self.cache.contains(make_cache_key('apple', 'en-US-female', 'fake', 1.0)))
+
+
+@override_settings(TTS_FAKE_ENGINE_LATENCY=0)
+class PrerenderCommandTests(TestCase):
+    """离线预热命令：使用模拟引擎批量生成，不受在线准入控制限制"""
+
+    def test_renders_all_words_without_admission(self):
+        engines.enable_fake_engine()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        cache = AudioCache(temp_dir.name, max_bytes=1024 * 1024)
+        texts = [f'word{i}' for i in range(12)]
+        for text in texts:
+            Word.objects.create(word=text, translation=text)
+
+        # 在线请求的名额已全部占用且不允许排队
+        admission = AdmissionController(max_concurrent=1, max_waiting=0)
+        admission.acquire()
+        output = io.StringIO()
+        with mock.patch('tts.cache._audio_cache', cache), \
+                mock.patch('tts.views.get_admission_controller', lambda: admission):
+            call_command('prerender_tts', engine='fake', voices='en-US-female,en-GB-male', workers=8, stdout=output)
+
+        stats = json.loads(output.getvalue().splitlines()[-1])
+        self.assertEqual((stats['total'], stats['rendered'], stats['failed']), (24, 24, 0))
+        for text in texts:
+            for voice_key in ('en-US-female', 'en-GB-male'):
+                self.assertTrue(cache.contains(make_cache_key(text, voice_key, 'fake', 1.0)))
+        self.assertEqual(admission.stats()['rejected_queue_full'], 0)
+
+
+class OfflineEnginePoolTests(TestCase):
+    """离线引擎进程池：第一次提交时启动工作进程，超时的任务不再生成，卡住的进程被回收"""
+
+    def setUp(self):
+        self.pool = OfflineEnginePool(workers=1, load_engine=functools.partial(load_fake_engine, delays={'slow': 60}))
+        self.addCleanup(self.pool.shutdown)
+
+    def test_timeout_recycles_stuck_worker(self):
+        self.assertEqual(self.pool.stats()['alive'], 0)
+        self.assertEqual(self.pool.synthesize('apple', 'en-US', timeout=60), b'RIFF|apple|en-US')
+        self.assertEqual(self.pool.stats()['alive'], 1)
+        first_pid = self.pool._processes[0].pid
+
+        # 开始处理前已经超时的任务直接返回错误
+        with self.assertRaisesRegex(Exception, '请求已超时'):
+            self.pool.submit('banana', 'en-US', timeout=-1).result(timeout=60)
+
+        with self.assertRaisesRegex(Exception, '超时'):
+            self.pool.synthesize('slow', 'en-US', timeout=1)
+        stats = self.pool.stats()
+        self.assertEqual((stats['alive'], stats['pending'], stats['recycled']), (1, 0, 1))
+        self.assertNotEqual(self.pool._processes[0].pid, first_pid)
+
+        # 新的工作进程继续处理后面的任务
+        self.assertEqual(self.pool.synthesize('cherry', 'en-US', timeout=60), b'RIFF|cherry|en-US')
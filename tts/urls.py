@@ -1,9 +1,13 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 app_name = 'tts'
  
 urlpatterns = [
     path('speak/', views.text_to_speech, name='text_to_speech'),
+    path('audio/', views.speech_audio, name='speech_audio'),
     path('voices/', views.get_voice_options, name='get_voice_options'),
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
+    path('bundle/list/<int:list_id>/', views.word_list_bundle, name='word_list_bundle'),
+    re_path(r'^bundle/(?P<bundle_key>[0-9a-f]{64})/$', views.bundle_audio, name='bundle_audio'),
 ] 
\ No newline at end of file
@@ -1,174 +1,152 @@
-from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render, get_object_or_404
+from django.conf import settings
+from django.urls import reverse
+from django.views.decorators.http import require_safe
+from urllib.parse import urlencode
+from django.http import HttpResponse, JsonResponse, FileResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-import os
-import tempfile
-import asyncio
-import edge_tts
-import pyttsx3
-import io
-from gtts import gTTS
-import time # Added for retry mechanism
+import itertools
+import math
+from .cache import get_audio_cache, make_cache_key
+from .chunking import split_text
+from .singleflight import synthesis_flight, file_lock
+from .bundle import build_bundle, load_bundle_index
+from .prerender import prerender_texts
+from .offline import get_offline_pool
+from .engines import VOICE_OPTIONS, ENGINE_CONTENT_TYPES, engine_registry, stream_audio
+from .streaming import TeeStream
+from .daemon import SynthesisPending, SynthesisBusy, SynthesisUnavailable, get_daemon_address, request_synthesis, daemon_stats
+from .admission import AdmissionRejected, get_admission_controller, get_client_id
+from .http import ranged_file_response, etag_matches, IMMUTABLE_CACHE_CONTROL
+from vocabulary.models import WordList
 
-# 可用的Edge TTS语音列表
-VOICE_OPTIONS = {
-    'en-US-female': 'en-US-JennyNeural',
-    'en-US-male': 'en-US-GuyNeural',
-    'en-GB-female': 'en-GB-SoniaNeural',
-    'en-GB-male': 'en-GB-RyanNeural',
-    'zh-CN-female': 'zh-CN-XiaoxiaoNeural',
-    'zh-CN-male': 'zh-CN-YunjianNeural',
-}
+def synthesize_cached(text, voice_key, engine, speed, cache, cache_key, fallback=False):
+    """生成音频并写入缓存，返回(音频数据, 实际使用的引擎名)
 
-# 可用的gTTS语言映射
-GTTS_LANG_MAP = {
-    'en-US-female': 'en',
-    'en-US-male': 'en',
-    'en-GB-female': 'en-uk',
-    'en-GB-male': 'en-uk',
-    'zh-CN-female': 'zh-cn',
-    'zh-CN-male': 'zh-cn',
-}
-
-async def generate_audio(text, voice, speed=1.0):
-    """使用Edge TTS生成音频文件"""
-    # 调整语速参数
-    if speed != 1.0:
-        voice_with_speed = f"{voice}<prosody rate='{speed}'>"
-        text_with_speed = f"{text}</prosody>"
-    else:
-        voice_with_speed = voice
-        text_with_speed = text
-        
-    communicate = edge_tts.Communicate(text_with_speed, voice_with_speed)
-    
-    # 创建临时文件
-    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-        temp_filename = temp_file.name
-    
-    # 生成音频文件
-    await communicate.save(temp_filename)
+    同一缓存键的并发请求只调用一次引擎：进程内的重复请求等待同一个结果，
+    其他进程的重复请求通过文件锁排队，拿到锁后直接读取已生成的缓存。
+    调用引擎前申请合成名额，名额不足时抛出AdmissionRejected。
+    fallback为True时请求的引擎失败或已熔断会按顺序降级到其他引擎，
+    降级生成的音频只写入实际引擎的缓存键。
+    """
+    def run():
+        with file_lock(cache.lock_dir, cache_key) as waited:
+            audio_data = cache.read(cache_key)
+            if audio_data is not None:
+                synthesis_flight.record_cached(waited)
+                return audio_data, engine
+            
+            # 只有真正调用引擎的请求占用合成名额
+            admission = get_admission_controller()
+            admitted_at = admission.acquire()
+            try:
+                return synthesize_text(text, voice_key, engine, speed, cache, fallback=fallback)
+            finally:
+                admission.release(admitted_at)
     
-    return temp_filename
+    return synthesis_flight.do(cache_key, run)
 
-def generate_audio_pyttsx3(text, voice_type):
-    """使用pyttsx3生成音频文件"""
-    engine = pyttsx3.init()
-    
-    # 设置语音属性
-    voices = engine.getProperty('voices')
-    
-    # 打印可用的声音列表，用于调试
-    print(f"可用的声音列表: {len(voices)}")
-    for i, voice in enumerate(voices):
-        print(f"Voice {i}: {voice.id} - {voice.name}")
-    
-    # 根据voice_type设置语音
-    if voice_type.startswith('en-US'):
-        # 尝试找到美式英语声音
-        for voice in voices:
-            if 'en_US' in voice.id.lower():
-                engine.setProperty('voice', voice.id)
-                print(f"选择美式英语声音: {voice.id}")
-                break
-    elif voice_type.startswith('en-GB'):
-        # 尝试找到英式英语声音
-        for voice in voices:
-            if 'en_GB' in voice.id.lower():
-                engine.setProperty('voice', voice.id)
-                print(f"选择英式英语声音: {voice.id}")
-                break
-    elif voice_type.startswith('zh-CN'):
-        # 尝试找到中文声音
-        for voice in voices:
-            if 'zh_CN' in voice.id.lower() or 'chinese' in voice.id.lower():
-                engine.setProperty('voice', voice.id)
-                print(f"选择中文声音: {voice.id}")
-                break
-    
-    # 设置语速和音量
-    engine.setProperty('rate', 150)  # 语速
-    engine.setProperty('volume', 1.0)  # 音量
+def synthesize_text(text, voice_key, engine, speed, cache, fallback=False):
+    """生成音频，返回(音频数据, 实际使用的引擎名)
+
+    较长的文本按句子拆分后并发生成，每段单独缓存，按顺序拼接后再缓存整段。
+    只有MP3格式可以直接拼接，其他格式的引擎不拆分。
+    """
+    chunks = split_text(text) if ENGINE_CONTENT_TYPES[engine] == 'audio/mpeg' else [text]
+    if len(chunks) == 1:
+        return engine_registry.synthesize(text, voice_key, engine, speed, cache, fallback=fallback)
     
+    parts, engine_used = engine_registry.synthesize_many(
+        chunks, voice_key, engine, speed, cache, fallback=fallback, content_type='audio/mpeg'
+    )
+    audio_data = b''.join(parts)
     try:
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_filename = temp_file.name
-        
-        print(f"创建临时文件: {temp_filename}")
-        
-        # 生成音频文件
-        engine.save_to_file(text, temp_filename)
-        engine.runAndWait()
-        
-        # 验证文件是否生成成功
-        if os.path.exists(temp_filename) and os.path.getsize(temp_filename) > 0:
-            print(f"音频文件生成成功: {temp_filename}, 大小: {os.path.getsize(temp_filename)} 字节")
-            return temp_filename
-        else:
-            print(f"音频文件生成失败或为空: {temp_filename}")
-            raise Exception("音频文件生成失败或为空")
+        cache.put(make_cache_key(text, voice_key, engine_used, speed), audio_data)
     except Exception as e:
-        print(f"生成音频文件时出错: {str(e)}")
-        raise e
+        print(f"写入音频缓存失败: {str(e)}")
+    return audio_data, engine_used
 
-def generate_audio_gtts(text, voice_type, speed=1.0):
-    """使用Google TTS生成音频文件"""
-    # 获取对应的语言代码
-    lang = GTTS_LANG_MAP.get(voice_type, 'en')
+def render_audio(text, voice_key, engine, speed, cache, cache_key, fallback=False):
+    """生成音频数据，返回(音频数据, 实际使用的引擎名)
+
+    配置了TTS_DAEMON_ADDRESS时交给独立的合成服务，最多等待TTS_DAEMON_WAIT秒，
+    超时抛出SynthesisPending；否则在当前进程内生成。合成服务连接不上时也在当前进程内生成。
+    """
+    if not get_daemon_address():
+        return synthesize_cached(text, voice_key, engine, speed, cache, cache_key, fallback=fallback)
     
     try:
-        # 检查文本是否为空
-        if not text or text.strip() == '':
-            raise ValueError("文本内容不能为空")
-            
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-            temp_filename = temp_file.name
-        
-        print(f"创建临时文件: {temp_filename}")
-        
-        # 生成音频文件
-        # gTTS不直接支持速度调整，但可以设置slow参数
-        slow = False
-        if speed < 0.8:
-            slow = True
-        
-        # 添加重试机制
-        max_retries = 3
-        retry_count = 0
-        success = False
-        
-        while retry_count < max_retries and not success:
-            try:
-                tts = gTTS(text=text, lang=lang, slow=slow)
-                tts.save(temp_filename)
-                
-                # 验证文件是否生成成功并且大小合理
-                if os.path.exists(temp_filename) and os.path.getsize(temp_filename) > 100:  # 确保文件大小至少100字节
-                    print(f"音频文件生成成功: {temp_filename}, 大小: {os.path.getsize(temp_filename)} 字节")
-                    success = True
-                else:
-                    print(f"音频文件生成失败或大小异常: {temp_filename}, 大小: {os.path.getsize(temp_filename)} 字节")
-                    retry_count += 1
-                    time.sleep(0.5)  # 等待500毫秒后重试
-            except Exception as e:
-                print(f"gTTS生成音频失败 (尝试 {retry_count+1}/{max_retries}): {str(e)}")
-                retry_count += 1
-                if retry_count >= max_retries:
-                    os.unlink(temp_filename)
-                    raise Exception(f"gTTS生成音频失败，已重试{max_retries}次: {str(e)}")
-                time.sleep(0.5)  # 等待500毫秒后重试
-        
-        if success:
-            return temp_filename
-        else:
-            os.unlink(temp_filename)
-            raise Exception("音频文件生成失败，已达到最大重试次数")
+        cache_key, engine_used = request_synthesis(
+            text, voice_key, engine, speed, getattr(settings, 'TTS_DAEMON_WAIT', 5), fallback=fallback
+        )
+    except SynthesisUnavailable as e:
+        print(f"无法连接音频合成服务，在当前进程内生成: {str(e)}")
+        return synthesize_cached(text, voice_key, engine, speed, cache, cache_key, fallback=fallback)
+    audio_data = cache.read(cache_key)
+    if audio_data is None:
+        raise Exception("音频缓存读取失败")
+    return audio_data, engine_used
+
+def stream_response(text, voice_key, engine, speed, cache, cache_key):
+    """Edge TTS边生成边返回，同时写入缓存，响应结束后归还合成名额
+
+    收到第一个音频块后才开始响应，连接失败时计入熔断并返回None，由调用方按普通流程生成。
+    其他引擎、使用独立合成服务或引擎已熔断时也返回None。名额不足时抛出AdmissionRejected。
+    """
+    if engine != 'edge-tts' or get_daemon_address() or not engine_registry.is_available(engine):
+        return None
+    
+    admission = get_admission_controller()
+    admitted_at = admission.acquire()
+    breaker = engine_registry.get(engine).breaker
+    try:
+        chunks = stream_audio(text, VOICE_OPTIONS[voice_key], speed)
+        first_chunk = next(chunks)
     except Exception as e:
-        print(f"生成音频文件时出错: {str(e)}")
-        raise e
+        # 包括edge_tts未安装和音频为空的情况
+        admission.release(admitted_at)
+        print(f"流式生成音频时出错: {str(e) or type(e).__name__}")
+        breaker.record_failure()
+        return None
+    
+    response = StreamingHttpResponse(TeeStream(
+        itertools.chain([first_chunk], chunks),
+        cache.writer(cache_key),
+        on_complete=breaker.record_success,
+        on_close=lambda: admission.release(admitted_at),
+    ), content_type=ENGINE_CONTENT_TYPES[engine])
+    response['X-TTS-Cache'] = 'MISS'
+    # 生成中途失败时客户端只收到部分音频，不能被缓存
+    response['Cache-Control'] = 'no-store'
+    return response
+
+# 音频包接受的语速范围，与听写页面的语速滑块一致
+BUNDLE_MIN_SPEED = 0.5
+BUNDLE_MAX_SPEED = 2.0
+
+def fallback_enabled():
+    """在线请求是否允许降级到其他引擎"""
+    return getattr(settings, 'TTS_ENGINE_FALLBACK', True)
+
+def pending_response(text, voice_key, engine, speed, status=202):
+    """音频尚未生成时返回轮询地址"""
+    response = JsonResponse({
+        'success': status == 202,
+        'pending': status == 202,
+        'message': '音频正在生成，请稍后重试' if status == 202 else '语音服务繁忙，请稍后重试',
+        'audio_url': speech_audio_url(text, voice_key, engine, speed),
+    }, status=status)
+    response['Retry-After'] = '1'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+def admission_response(error):
+    """合成名额申请被拒绝时立即返回，告知客户端多久后重试"""
+    response = JsonResponse({'success': False, 'message': error.message}, status=error.status)
+    response['Retry-After'] = str(error.retry_after)
+    response['Cache-Control'] = 'no-store'
+    return response
 
 @csrf_exempt
 def text_to_speech(request):
@@ -180,6 +158,7 @@ def text_to_speech(request):
             voice_key = data.get('voice', 'en-US-female')
             engine = data.get('engine', 'edge-tts')  # 默认使用edge-tts
             speed = float(data.get('speed', 1.0))    # 获取速度参数，默认为1.0
+            stream = bool(data.get('stream', False))  # 是否流式返回（仅edge-tts支持）
             
             print(f"收到TTS请求: text={text}, voice={voice_key}, engine={engine}, speed={speed}")
             
@@ -187,58 +166,51 @@ def text_to_speech(request):
             if not text or text.strip() == '':
                 return JsonResponse({'success': False, 'message': '文本内容不能为空'}, status=400)
             
-            audio_path = None
+            if engine not in ENGINE_CONTENT_TYPES:
+                return JsonResponse({'success': False, 'message': '不支持的引擎类型'}, status=400)
+            content_type = ENGINE_CONTENT_TYPES[engine]
+            
+            # 未知语音统一回退到默认语音，避免同一音频占用多个缓存项
+            if voice_key not in VOICE_OPTIONS:
+                voice_key = 'en-US-female'
+            
+            # 命中缓存时直接从磁盘返回，不再调用TTS引擎
+            cache = get_audio_cache()
+            cache_key = make_cache_key(text, voice_key, engine, speed)
+            cached_file = cache.open(cache_key)
+            if cached_file is not None:
+                response = FileResponse(cached_file, content_type=content_type)
+                response['Content-Disposition'] = 'attachment; filename="speech.mp3"'
+                response['X-TTS-Cache'] = 'HIT'
+                return response
+            
+            # 缓存未命中时需要合成，先检查客户端的请求频率
             try:
-                if engine == 'edge-tts':
-                    # 获取对应的语音
-                    voice = VOICE_OPTIONS.get(voice_key, VOICE_OPTIONS['en-US-female'])
-                    
-                    # 异步生成音频
-                    audio_path = asyncio.run(generate_audio(text, voice, speed))
-                    content_type = 'audio/mpeg'
-                elif engine == 'chat-tts':
-                    # 使用Google TTS生成音频
-                    audio_path = generate_audio_gtts(text, voice_key, speed)
-                    content_type = 'audio/mpeg'
-                else:
-                    return JsonResponse({'success': False, 'message': '不支持的引擎类型'}, status=400)
+                get_admission_controller().check_rate(get_client_id(request))
+                # 流式返回：收到第一个音频块就开始响应，不能流式生成时按普通流程生成
+                response = stream_response(text, voice_key, engine, speed, cache, cache_key) if stream else None
+                if response is not None:
+                    response['Content-Disposition'] = 'attachment; filename="speech.mp3"'
+                    return response
+                audio_data, engine_used = render_audio(
+                    text, voice_key, engine, speed, cache, cache_key, fallback=fallback_enabled()
+                )
+            except AdmissionRejected as e:
+                return admission_response(e)
+            except SynthesisPending:
+                return pending_response(text, voice_key, engine, speed)
+            except SynthesisBusy:
+                return pending_response(text, voice_key, engine, speed, status=503)
             except Exception as e:
                 print(f"生成音频时出错: {str(e)}")
                 return JsonResponse({'success': False, 'message': f'生成音频时出错: {str(e)}'}, status=500)
             
-            # 读取音频文件
-            try:
-                if not audio_path or not os.path.exists(audio_path):
-                    raise Exception("音频文件不存在")
-                    
-                with open(audio_path, 'rb') as audio_file:
-                    audio_data = audio_file.read()
-                
-                # 检查音频数据
-                if len(audio_data) == 0:
-                    raise Exception("音频数据为空")
-                
-                print(f"音频文件读取成功: {audio_path}, 大小: {len(audio_data)} 字节")
-                
-                # 删除临时文件
-                try:
-                    os.unlink(audio_path)
-                except Exception as e:
-                    print(f"删除临时文件失败: {str(e)}")
-                
-                # 返回音频数据
-                response = HttpResponse(audio_data, content_type=content_type)
-                response['Content-Disposition'] = 'attachment; filename="speech.mp3"'
-                return response
-            except Exception as e:
-                print(f"读取或处理音频文件时出错: {str(e)}")
-                # 尝试删除临时文件
-                if audio_path and os.path.exists(audio_path):
-                    try:
-                        os.unlink(audio_path)
-                    except:
-                        pass
-                return JsonResponse({'success': False, 'message': f'读取或处理音频文件时出错: {str(e)}'}, status=500)
+            # 直接返回内存中的音频数据
+            response = HttpResponse(audio_data, content_type=ENGINE_CONTENT_TYPES[engine_used])
+            response['Content-Disposition'] = 'attachment; filename="speech.mp3"'
+            response['X-TTS-Cache'] = 'MISS'
+            response['X-TTS-Engine'] = engine_used
+            return response
             
         except json.JSONDecodeError:
             print("JSON解析错误")
@@ -255,3 +227,166 @@ def get_voice_options(request):
         'success': True,
         'voices': {k: {'name': v, 'description': k.replace('-', ' ')} for k, v in VOICE_OPTIONS.items()}
     })
+
+def cache_stats(request):
+    """获取音频缓存命中和请求合并统计"""
+    stats = {
+        'success': True,
+        'cache': get_audio_cache().stats(),
+        'coalescing': synthesis_flight.stats(),
+        'offline_engine': get_offline_pool().stats(),
+        'engines': engine_registry.stats(),
+        'admission': get_admission_controller().stats(),
+    }
+    if get_daemon_address():
+        try:
+            stats['daemon'] = daemon_stats()
+        except Exception as e:
+            stats['daemon'] = {'error': str(e)}
+    return JsonResponse(stats)
+
+def word_list_bundle(request, list_id):
+    """获取词书音频包索引，页面只需下载一个音频包即可在本地按段播放
+
+    还有单词音频未生成时不在请求中合成，而是加入后台预生成队列并返回202，页面稍后重试。
+    """
+    word_list = get_object_or_404(WordList, id=list_id)
+    voice_key = request.GET.get('voice', 'en-US-female')
+    engine = request.GET.get('engine', 'edge-tts')
+    try:
+        speed = float(request.GET.get('speed', 1.0))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': '语速参数错误'}, status=400)
+    if not math.isfinite(speed):
+        return JsonResponse({'success': False, 'message': '语速参数错误'}, status=400)
+    # 与页面的语速滑块一致，避免任意语速产生大量缓存项
+    speed = min(max(round(speed, 1), BUNDLE_MIN_SPEED), BUNDLE_MAX_SPEED)
+    
+    if engine not in ENGINE_CONTENT_TYPES:
+        return JsonResponse({'success': False, 'message': '不支持的引擎类型'}, status=400)
+    if voice_key not in VOICE_OPTIONS:
+        voice_key = 'en-US-female'
+    
+    words = list(word_list.words.filter(is_active=True).order_by('wordlistword__order').values_list('id', 'word'))
+    index, missing = build_bundle(words, voice_key, engine, speed, ENGINE_CONTENT_TYPES[engine])
+    if missing:
+        try:
+            get_admission_controller().check_rate(get_client_id(request))
+        except AdmissionRejected as e:
+            return admission_response(e)
+        prerender_texts(missing, voice_key, engine, speed)
+        response = JsonResponse({
+            'success': True,
+            'pending': True,
+            'message': '音频包正在生成，请稍后重试',
+            'missing': len(missing),
+            'total': len(words),
+        }, status=202)
+        response['Retry-After'] = str(getattr(settings, 'TTS_BUNDLE_RETRY_SECONDS', 2))
+        response['Cache-Control'] = 'no-store'
+        return response
+    
+    if not index['segments']:
+        return JsonResponse({'success': False, 'message': '词书中没有可用的音频'}, status=404)
+    
+    return JsonResponse({
+        'success': True,
+        'bundle_url': reverse('tts:bundle_audio', args=[index['bundle_key']]),
+        'content_type': index['content_type'],
+        'size': index['size'],
+        'segments': index['segments'],
+    })
+
+def bundle_audio(request, bundle_key):
+    """返回音频包数据，支持Range请求"""
+    index = load_bundle_index(bundle_key)
+    audio_file = get_audio_cache().open(bundle_key)
+    if index is None or audio_file is None:
+        if audio_file is not None:
+            audio_file.close()
+        return JsonResponse({'success': False, 'message': '音频包不存在'}, status=404)
+    
+    return ranged_file_response(request, audio_file, index['content_type'], etag=bundle_key)
+
+def speech_audio_url(text, voice_key='en-US-female', engine='edge-tts', speed=1.0):
+    """生成音频的GET地址，相同参数总是得到相同的URL，便于浏览器和代理缓存"""
+    query = urlencode([
+        ('text', text),
+        ('voice', voice_key),
+        ('engine', engine),
+        ('speed', f'{float(speed):g}'),
+    ])
+    return f"{reverse('tts:speech_audio')}?{query}"
+
+@require_safe
+def speech_audio(request):
+    """通过GET获取单词音频，支持ETag、长期缓存和Range请求；stream=1时未缓存的音频流式返回"""
+    text = request.GET.get('text', '')
+    voice_key = request.GET.get('voice', 'en-US-female')
+    engine = request.GET.get('engine', 'edge-tts')
+    try:
+        speed = float(request.GET.get('speed', 1.0))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': '语速参数错误'}, status=400)
+    
+    if not text or text.strip() == '':
+        return JsonResponse({'success': False, 'message': '文本内容不能为空'}, status=400)
+    if engine not in ENGINE_CONTENT_TYPES:
+        return JsonResponse({'success': False, 'message': '不支持的引擎类型'}, status=400)
+    if voice_key not in VOICE_OPTIONS:
+        voice_key = 'en-US-female'
+    content_type = ENGINE_CONTENT_TYPES[engine]
+    
+    # ETag就是缓存键，客户端已有该音频时无需读取磁盘
+    cache = get_audio_cache()
+    cache_key = make_cache_key(text, voice_key, engine, speed)
+    if etag_matches(request, cache_key):
+        response = HttpResponse(status=304)
+        response['ETag'] = f'"{cache_key}"'
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+    
+    audio_file = cache.open(cache_key)
+    if audio_file is None:
+        try:
+            get_admission_controller().check_rate(get_client_id(request))
+            # stream=1时边生成边返回，<audio>收到第一个音频块就可以开始播放
+            if request.GET.get('stream') == '1':
+                response = stream_response(text, voice_key, engine, speed, cache, cache_key)
+                if response is not None:
+                    response['Content-Disposition'] = 'inline; filename="speech.mp3"'
+                    return response
+            audio_data, engine_used = render_audio(
+                text, voice_key, engine, speed, cache, cache_key, fallback=fallback_enabled()
+            )
+        except AdmissionRejected as e:
+            return admission_response(e)
+        except SynthesisPending:
+            return pending_response(text, voice_key, engine, speed)
+        except SynthesisBusy:
+            return pending_response(text, voice_key, engine, speed, status=503)
+        except Exception as e:
+            print(f"生成音频时出错: {str(e)}")
+            response = JsonResponse({'success': False, 'message': f'生成音频时出错: {str(e)}'}, status=500)
+            response['Cache-Control'] = 'no-store'
+            return response
+        
+        # 降级生成的音频不是该URL对应的内容，不能被浏览器长期缓存
+        if engine_used != engine:
+            response = HttpResponse(audio_data, content_type=ENGINE_CONTENT_TYPES[engine_used])
+            response['Content-Disposition'] = 'inline; filename="speech.mp3"'
+            response['Cache-Control'] = 'no-store'
+            response['X-TTS-Engine'] = engine_used
+            return response
+        
+        # 直接打开缓存文件，避免重复计入命中统计
+        try:
+            audio_file = open(cache.path_for(cache_key), 'rb')
+        except FileNotFoundError:
+            response = JsonResponse({'success': False, 'message': '音频缓存写入失败'}, status=500)
+            response['Cache-Control'] = 'no-store'
+            return response
+    
+    response = ranged_file_response(request, audio_file, content_type, etag=cache_key)
+    response['Content-Disposition'] = 'inline; filename="speech.mp3"'
+    return response
@@ -1,7 +1,16 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest, Least
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+# 复习间隔(天)，第n次复习后间隔REVIEW_INTERVALS[n]天再复习
+REVIEW_INTERVALS = [1, 2, 4, 7, 15, 30, 60, 90]
+
+def review_interval(review_count):
+    """复习review_count次后到下次复习的天数"""
+    return REVIEW_INTERVALS[min(review_count, len(REVIEW_INTERVALS) - 1)]
+
 class Word(models.Model):
     """单词模型"""
     word = models.CharField('单词', max_length=100)
@@ -70,24 +79,67 @@ class WordLearningRecord(models.Model):
     class Meta:
         unique_together = ['word', 'user']
         
-    def calculate_next_review(self):
+    def calculate_next_review(self, now=None):
         """基于艾宾浩斯遗忘曲线计算下次复习时间"""
-        intervals = [1, 2, 4, 7, 15, 30, 60, 90]  # 复习间隔(天)
-        if self.review_count >= len(intervals):
-            days = intervals[-1]
-        else:
-            days = intervals[self.review_count]
-        self.next_review_date = timezone.now() + timezone.timedelta(days=days)
+        now = now or timezone.now()
+        self.next_review_date = now + timezone.timedelta(days=review_interval(self.review_count))
         
-    def update_mastery(self, review_result):
-        """更新掌握程度"""
+    def apply_review(self, review_result, now=None):
+        """按复习结果更新掌握程度和下次复习时间（不保存）"""
         if review_result:  # 复习正确
             self.mastery_level = min(100, self.mastery_level + 10)
         else:  # 复习错误
             self.mastery_level = max(0, self.mastery_level - 20)
         self.review_count += 1
-        self.calculate_next_review()
+        self.calculate_next_review(now)
+        
+    def update_mastery(self, review_result):
+        """更新掌握程度"""
+        self.apply_review(review_result)
         self.save()
+    
+    @classmethod
+    def record_review(cls, word, user, review_result):
+        """记录一次复习结果，返回学习记录ID
+
+        和update_mastery的规则相同，但直接在数据库中用表达式更新，
+        不需要先读出记录，并发提交时也不会丢失更新。
+        """
+        now = timezone.now()
+        record_id = cls.objects.filter(word=word, user=user).values_list('id', flat=True).first()
+        if record_id is None:
+            # 第一次学习：直接按复习一次后的状态创建
+            try:
+                with transaction.atomic():
+                    return cls.objects.create(
+                        word=word,
+                        user=user,
+                        review_count=1,
+                        mastery_level=10 if review_result else 0,
+                        next_review_date=now + timezone.timedelta(days=review_interval(1))
+                    ).id
+            except IntegrityError:
+                record_id = cls.objects.get(word=word, user=user).id
+        
+        if review_result:
+            mastery_level = Least(F('mastery_level') + 10, Value(100))
+        else:
+            mastery_level = Greatest(F('mastery_level') - 20, Value(0))
+        # 下次复习时间取决于复习后的次数，按原次数逐一列出
+        next_review_date = Case(
+            *[
+                When(review_count=count, then=Value(now + timezone.timedelta(days=review_interval(count + 1))))
+                for count in range(len(REVIEW_INTERVALS) - 1)
+            ],
+            default=Value(now + timezone.timedelta(days=REVIEW_INTERVALS[-1]))
+        )
+        cls.objects.filter(id=record_id).update(
+            mastery_level=mastery_level,
+            next_review_date=next_review_date,
+            review_count=F('review_count') + 1,
+            last_review_date=now
+        )
+        return record_id
 
 class ReviewPlan(models.Model):
     """复习计划"""
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import ReviewPlan, WordLearningRecord
+
+# 用户学习概要（掌握程度分布、今日待复习、总单词数、各计划单词数）缓存在Django缓存中，
+# 仪表板和进度页只读一次缓存。学习记录或复习计划变化时在事务提交后删除缓存，下次读取时重新统计。
+
+
+def summary_cache_key(user_id, today=None):
+    """学习概要的缓存键，包含日期，跨天后重新统计今日待复习"""
+    today = today or timezone.localdate()
+    return f'learning_summary:{user_id}:{today.isoformat()}'
+
+
+def build_learning_summary(user, today):
+    """从数据库统计用户的学习概要"""
+    due_today = Q(next_review_date__date=today)
+    records = WordLearningRecord.objects.filter(user=user)
+    summary = records.aggregate(
+        total_words=Count('id'),
+        mastered=Count('id', filter=Q(mastery_level__gte=80)),
+        learning=Count('id', filter=Q(mastery_level__lt=80, mastery_level__gte=40)),
+        weak=Count('id', filter=Q(mastery_level__lt=40)),
+        due_today=Count('id', filter=due_today),
+    )
+
+    # 各计划的单词数用一次分组查询统计
+    plans = list(ReviewPlan.objects.filter(user=user, is_active=True).select_related('word_list').order_by('id'))
+    plan_counts = {}
+    if plans:
+        plan_counts = {
+            row['word__wordlistword__word_list']: row
+            for row in records.filter(
+                word__wordlistword__word_list__in={plan.word_list_id for plan in plans}
+            ).values('word__wordlistword__word_list').annotate(
+                word_count=Count('id'),
+                due_today=Count('id', filter=due_today),
+                first_due_id=Min('id', filter=due_today)
+            ).order_by()
+        }
+    summary['plans'] = []
+    for plan in plans:
+        counts = plan_counts.get(plan.word_list_id, {})
+        summary['plans'].append({
+            'id': plan.id,
+            'word_list_name': plan.word_list.name,
+            'plan_type': plan.plan_type,
+            'plan_type_display': plan.get_plan_type_display(),
+            'start_date': plan.start_date,
+            'word_count': counts.get('word_count', 0),
+            'due_today': counts.get('due_today', 0),
+            'first_due_id': counts.get('first_due_id'),
+        })
+
+    # 仪表板的今日待复习按计划累加，和计划列表一致
+    summary['plan_due_today'] = sum(plan['due_today'] for plan in summary['plans'])
+    summary['first_due_id'] = next(
+        (plan['first_due_id'] for plan in summary['plans'] if plan['first_due_id']), None
+    )
+    return summary
+
+
+def get_learning_summary(user):
+    """读取用户的学习概要，缓存中没有时重新统计"""
+    today = timezone.localdate()
+    key = summary_cache_key(user.pk, today)
+    summary = cache.get(key)
+    if summary is None:
+        summary = build_learning_summary(user, today)
+        cache.set(key, summary, getattr(settings, 'LEARNING_SUMMARY_CACHE_TIMEOUT', 300))
+    return summary
+
+
+def invalidate_learning_summary(*user_ids):
+    """事务提交后删除这些用户的学习概要缓存"""
+    keys = [summary_cache_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_word_list_summaries(word_list):
+    """词书的单词变化后，删除有该词书复习计划的用户的学习概要缓存"""
+    invalidate_learning_summary(*ReviewPlan.objects.filter(
+        word_list=word_list, is_active=True
+    ).values_list('user_id', flat=True).distinct())
@@ -1,3 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from .models import Word, WordList, WordListWord, WordLearningRecord, ReviewPlan
+from .summary import get_learning_summary
+
+
+class LearningSummaryTests(TestCase):
+    """学习概要：仪表板只读一次缓存，学习记录变化后缓存失效"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user('tester', password='password')
+        self.word_list = WordList.objects.create(name='测试词书')
+        now = timezone.now()
+        self.records = []
+        for order, (text, mastery) in enumerate((('apple', 90), ('banana', 50), ('cherry', 10))):
+            word = Word.objects.create(word=text, translation=text)
+            WordListWord.objects.create(word_list=self.word_list, word=word, order=order)
+            self.records.append(WordLearningRecord.objects.create(
+                word=word, user=self.user, mastery_level=mastery, next_review_date=now
+            ))
+        ReviewPlan.objects.create(user=self.user, word_list=self.word_list, plan_type='REVIEW', start_date=now)
+
+    def test_summary_counts(self):
+        summary = get_learning_summary(self.user)
+        self.assertEqual(
+            (summary['total_words'], summary['mastered'], summary['learning'], summary['weak'], summary['due_today']),
+            (3, 1, 1, 1, 3)
+        )
+        self.assertEqual([(plan['word_list_name'], plan['word_count']) for plan in summary['plans']], [('测试词书', 3)])
+        self.assertEqual(summary['first_due_id'], self.records[0].id)
+
+    def test_dashboard_reads_cache_and_review_invalidates(self):
+        self.client.force_login(self.user)
+        url = reverse('vocabulary:review_dashboard')
+        self.client.get(url)
+        # 登录会话和用户各一次，学习概要来自缓存
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, '已掌握: 1')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('vocabulary:review_word', args=[self.records[0].id]), {'result': 'wrong'})
+        summary = get_learning_summary(self.user)
+        self.assertEqual((summary['mastered'], summary['learning']), (0, 2))
@@ -8,6 +8,7 @@ from django.db import models
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from .models import WordList, WordLearningRecord, ReviewPlan
+from .summary import get_learning_summary, invalidate_learning_summary, invalidate_word_list_summaries
 
 # Create your views here.
 
@@ -122,6 +123,7 @@ def add_word_to_list(request):
                 word=word,
                 order=max_order + 1
             )
+            invalidate_word_list_summaries(word_list)
             
             return JsonResponse({
                 'success': True,
@@ -138,27 +140,11 @@ def add_word_to_list(request):
 @login_required
 def review_dashboard(request):
     """复习计划仪表板"""
-    active_plans = ReviewPlan.objects.filter(
-        user=request.user,
-        is_active=True
-    )
-    
-    # 获取今天需要复习的单词
-    today_words = []
-    for plan in active_plans:
-        today_words.extend(plan.get_today_words())
-    
-    # 获取学习进度统计
-    learning_stats = WordLearningRecord.objects.filter(user=request.user).aggregate(
-        total_words=models.Count('id'),
-        mastered_words=models.Count('id', filter=models.Q(mastery_level__gte=80)),
-        in_progress=models.Count('id', filter=models.Q(mastery_level__lt=80))
-    )
+    # 学习进度、今日待复习和各计划单词数都从缓存的学习概要读取
+    summary = get_learning_summary(request.user)
     
     return render(request, 'vocabulary/review_dashboard.html', {
-        'active_plans': active_plans,
-        'today_words': today_words,
-        'learning_stats': learning_stats,
+        'summary': summary,
     })
 
 @login_required
@@ -188,9 +174,10 @@ def create_review_plan(request):
                     user=request.user,
                     next_review_date=timezone.now()
                 )
+        invalidate_learning_summary(request.user.pk)
         
         messages.success(request, '复习计划创建成功！')
-        return redirect('review_dashboard')
+        return redirect('vocabulary:review_dashboard')
     
     word_lists = WordList.objects.all()
     return render(request, 'vocabulary/create_review_plan.html', {
@@ -205,8 +192,9 @@ def review_word(request, record_id):
     if request.method == 'POST':
         result = request.POST.get('result') == 'correct'
         record.update_mastery(result)
+        invalidate_learning_summary(request.user.pk)
         messages.success(request, '复习记录已更新！')
-        return redirect('review_dashboard')
+        return redirect('vocabulary:review_dashboard')
     
     return render(request, 'vocabulary/review_word.html', {
         'record': record
@@ -411,6 +399,7 @@ def remove_word_from_list(request, list_id, word_id):
             
             # 删除关联
             WordListWord.objects.filter(word_list=word_list, word=word).delete()
+            invalidate_word_list_summaries(word_list)
             
             return JsonResponse({
                 'success': True,
@@ -497,6 +486,7 @@ def batch_remove_words(request):
                 word_list=word_list,
                 word_id__in=word_ids
             ).delete()[0]
+            invalidate_word_list_summaries(word_list)
             
             return JsonResponse({
                 'success': True,